@@ -0,0 +1,105 @@
+"""Measure Fido2Manager.discover() cost against the number of attached keys.
+
+Keys are simulated at the HID connection level, so the real CtapHidDevice
+INIT handshake runs against them with a configurable delay. The "reopen"
+column is the previous behaviour of opening every key on each call.
+
+    python benchmarks/bench_discover.py --keys 1 4 16 64 --init-ms 5
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fido2.hid import CtapHidDevice, CAPABILITY, CTAPHID  # noqa: E402
+from fido2.hid.base import HidDescriptor  # noqa: E402
+from dependencies import manager as manager_module  # noqa: E402
+from dependencies.transport import HidDeviceProvider  # noqa: E402
+
+PACKET_SIZE = 64
+TYPE_INIT = 0x80
+
+
+class FakeConnection:
+    """Answers CTAPHID_INIT after a fixed delay, like a key behind a slow hub."""
+
+    def __init__(self, init_delay: float):
+        self.init_delay = init_delay
+        self.opened = True
+        self._response = None
+
+    def write_packet(self, packet: bytes):
+        nonce = packet[7:15]
+        body = nonce + struct.pack(">IBBBBB", 0x1234, 2, 1, 0, 0, CAPABILITY.CBOR)
+        self._response = (struct.pack(">IBH", 0xFFFFFFFF, TYPE_INIT | CTAPHID.INIT, len(body))
+                          + body).ljust(PACKET_SIZE, b"\0")
+
+    def read_packet(self) -> bytes:
+        time.sleep(self.init_delay)
+        return self._response
+
+    def close(self):
+        self.opened = False
+
+
+def descriptors(count):
+    return [HidDescriptor(f"/dev/hidraw{i}", 0x1050, 0x0407, PACKET_SIZE, PACKET_SIZE,
+                          f"Key {i}", None) for i in range(count)]
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--init-ms", type=float, default=2.0,
+                        help="simulated CTAPHID_INIT round trip per key")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'keys':>5} {'first (ms)':>11} {'steady (ms)':>12} {'reopen (ms)':>12} {'opens/call':>11}")
+    for count in args.keys:
+        descs = descriptors(count)
+        opens = []
+
+        def open_connection(descriptor):
+            conn = FakeConnection(args.init_ms / 1000)
+            opens.append(conn)
+            return conn
+
+        class FakeHidProvider(HidDeviceProvider):
+            def list_descriptors(self):
+                return descs
+
+            def open(self, descriptor):
+                return CtapHidDevice(descriptor, open_connection(descriptor))
+
+        mgr = manager_module.Fido2Manager(provider=FakeHidProvider())
+        start = time.perf_counter()
+        mgr.discover()
+        first = (time.perf_counter() - start) * 1000
+        opens.clear()
+        steady = time_calls(mgr.discover, args.repeat)
+        steady_opens = len(opens) / args.repeat
+        mgr.close()
+
+        def reopen():
+            [CtapHidDevice(d, open_connection(d)) for d in descs]
+        reopen_ms = time_calls(reopen, max(1, args.repeat // 4))
+
+        print(f"{count:>5} {first:>11.2f} {steady:>12.3f} {reopen_ms:>12.2f} {steady_opens:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Measure GUI event-loop stalls while device commands are in flight.
+
+Runs MainWindow offscreen against a manager whose device calls sleep for a
+configurable round trip, selects every key a few times and reports the worst
+delay of the event loop (EventLoopMonitor.max_stall_ms).
+
+    python benchmarks/bench_gui_stall.py --keys 8 --latency-ms 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from PyQt5.QtCore import QTimer  # noqa: E402
+from dependencies.manager import Fido2Manager  # noqa: E402
+from dependencies.hotplug import HotplugMonitor, FakeEventSource  # noqa: E402
+
+
+class SlowManager(Fido2Manager):
+    """Fido2Manager whose device round trips are replaced by sleeps."""
+
+    def __init__(self, keys: int, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.keys = [{"path": f"/dev/hidraw{i}", "vendor_id": 0x1050, "product_id": 0x0407,
+                      "product_string": f"Key {i}"} for i in range(keys)]
+
+    def discover(self):
+        time.sleep(self.latency)
+        self.devices = list(self.keys)
+        return list(self.keys)
+
+    def select_device(self, device):
+        time.sleep(self.latency)
+        self._selected_path = device
+        return self.get_info()
+
+    def get_info(self, refresh=False):
+        return {"path": self._selected_path, "versions": ["FIDO_2_0"], "aaguid": "00" * 16,
+                "extensions": [], "options": {"clientPin": True}}
+
+    def has_pin(self):
+        time.sleep(self.latency)
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    from dependencies.ui.mainwindow import MainWindow
+    from dependencies.ui.theme import ThemeManager
+
+    manager = SlowManager(args.keys, args.latency_ms / 1000)
+    win = MainWindow(manager, ThemeManager(app), HotplugMonitor(FakeEventSource()))
+    win.closeEvent = lambda event: None
+    win.start_devices()
+    win.show()
+
+    selections = [i % args.keys for i in range(args.keys * args.rounds)]
+
+    def step():
+        if selections:
+            win.device_table.selectRow(selections.pop(0))
+            QTimer.singleShot(5, step)
+        elif win._busy_workers:
+            QTimer.singleShot(5, step)
+        else:
+            app.quit()
+
+    def begin():
+        win.stall_monitor.reset()
+        step()
+
+    start = time.perf_counter()
+    QTimer.singleShot(200, begin)
+    app.exec_()
+    elapsed = time.perf_counter() - start
+    print(f"keys={args.keys} latency={args.latency_ms:.0f}ms selections={args.keys * args.rounds} "
+          f"wall={elapsed:.2f}s max_stall={win.stall_monitor.max_stall_ms:.1f}ms "
+          f"ticks={win.stall_monitor.samples}")
+    win.hotplug.stop()
+    for worker in list(win.workers.values()) + [win.discovery]:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
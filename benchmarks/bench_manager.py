@@ -0,0 +1,200 @@
+"""Latency and CTAP round trips of the Fido2Manager hot paths.
+
+Runs every operation against in-process virtual authenticators
+(dependencies/emulator.py) with a configurable per-command latency, for each
+combination of key count and enrolled fingerprint count, and reports p50,
+p90 and p99 latency plus the CTAP round trips one call costs.
+
+    python benchmarks/bench_manager.py --keys 1 16 64 --fingerprints 0 5 --latency-ms 1
+    python benchmarks/bench_manager.py --json baseline.json
+    python benchmarks/bench_manager.py --compare baseline.json
+
+With --compare the run exits with status 1 if an operation got slower than
+the baseline by more than --tolerance, or needs more round trips than before.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dependencies.emulator import VirtualDeviceProvider  # noqa: E402
+from dependencies.manager import Fido2Manager  # noqa: E402
+
+PIN = "123456"
+# Timing noise floor: differences below this are never reported as regressions.
+MIN_DELTA_MS = 0.05
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Bench:
+    def __init__(self, keys: int, fingerprints: int, latency: float, repeat: int):
+        self.keys = keys
+        self.fingerprints = fingerprints
+        self.repeat = repeat
+        templates = {i.to_bytes(2, "big"): f"Finger {i}" for i in range(fingerprints)}
+        self.provider = VirtualDeviceProvider(
+            keys, pin=PIN, templates=templates, latency=latency,
+            max_templates=max(5, fingerprints))
+        self.results: List[Dict] = []
+
+    def round_trips(self) -> int:
+        return sum(sum(a.calls.values()) for a in self.provider.authenticators.values())
+
+    def measure(self, op: str, fn: Callable[[int], None], setup: Callable[[int], None] = None):
+        samples = []
+        trips = 0
+        for i in range(self.repeat):
+            if setup:
+                setup(i)
+            before = self.round_trips()
+            start = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - start) * 1000)
+            trips += self.round_trips() - before
+        self.results.append({
+            "op": op,
+            "keys": self.keys,
+            "fingerprints": self.fingerprints,
+            "n": len(samples),
+            "p50_ms": percentile(samples, 50),
+            "p90_ms": percentile(samples, 90),
+            "p99_ms": percentile(samples, 99),
+            "mean_ms": sum(samples) / len(samples),
+            "round_trips": trips / len(samples),
+        })
+
+    def run(self, gui: bool = False) -> List[Dict]:
+        managers = []
+
+        def new_manager(_):
+            managers.append(Fido2Manager(provider=self.provider))
+
+        self.measure("discover_cold", lambda i: managers[-1].discover(), new_manager)
+        for m in managers:
+            m.close()
+
+        manager = Fido2Manager(provider=self.provider)
+        paths = [d["path"] for d in manager.discover()]
+
+        def path(i):
+            return paths[i % len(paths)]
+
+        self.measure("discover_warm", lambda i: manager.discover())
+        self.measure("select_device", lambda i: manager.select_device(path(i)))
+        self.measure("get_info", lambda i: manager.get_info())
+        self.measure("get_info_refresh", lambda i: manager.get_info(refresh=True))
+        self.measure("token_acquire", lambda i: manager._get_bio(PIN),
+                     lambda i: manager.drop_token_sessions())
+        manager._get_bio(PIN)
+        self.measure("list_fingerprints", lambda i: manager.list_fingerprints(PIN))
+        manager.close()
+        if gui:
+            self.run_gui()
+        return self.results
+
+    def run_gui(self):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+        from dependencies.hotplug import HotplugMonitor, FakeEventSource
+        from dependencies.ui.mainwindow import MainWindow
+        from dependencies.ui.theme import ThemeManager
+
+        app = QApplication.instance() or QApplication(sys.argv)
+        manager = Fido2Manager(provider=self.provider)
+        win = MainWindow(manager, ThemeManager(app), HotplugMonitor(FakeEventSource()))
+        win.closeEvent = lambda event: None
+        win.start_devices()
+
+        def settle():
+            while win.discovery.pending or win._busy_workers:
+                app.processEvents()
+                time.sleep(0.0005)
+
+        def refresh(_):
+            win.on_refresh()
+            settle()
+        settle()
+        self.measure("gui_refresh", refresh)
+        win.hotplug.stop()
+        for worker in list(win.workers.values()) + [win.discovery]:
+            worker.stop()
+        manager.close()
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    previous = {(r["op"], r["keys"], r["fingerprints"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        base = previous.get((r["op"], r["keys"], r["fingerprints"]))
+        if base is None:
+            continue
+        name = f"{r['op']} keys={r['keys']} fingerprints={r['fingerprints']}"
+        if r["round_trips"] > base["round_trips"]:
+            regressions.append(
+                f"{name}: {r['round_trips']:g} round trips, was {base['round_trips']:g}")
+        limit = base["p50_ms"] * (1 + tolerance) + MIN_DELTA_MS
+        if r["p50_ms"] > limit:
+            regressions.append(
+                f"{name}: p50 {r['p50_ms']:.3f} ms, was {base['p50_ms']:.3f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--fingerprints", type=int, nargs="+", default=[0, 5])
+    parser.add_argument("--latency-ms", type=float, default=1.0,
+                        help="simulated round trip of every CTAP command")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--gui", action="store_true", help="also time MainWindow refresh")
+    parser.add_argument("--json", metavar="FILE", help="write results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="baseline to check against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative p50 slowdown (default 0.25)")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'op':<18} {'keys':>5} {'fps':>4} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'trips':>6}")
+    for keys in args.keys:
+        for fingerprints in args.fingerprints:
+            for r in Bench(keys, fingerprints, args.latency_ms / 1000, args.repeat).run(args.gui):
+                results.append(r)
+                print(f"{r['op']:<18} {r['keys']:>5} {r['fingerprints']:>4} {r['p50_ms']:>9.3f} "
+                      f"{r['p90_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['round_trips']:>6.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {
+                    "latency_ms": args.latency_ms,
+                    "repeat": args.repeat,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against " + args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Import time and time to first paint of the GUI.
+
+Every run starts a fresh interpreter (offscreen Qt, FIDO2KM_EMULATE virtual
+keys, a device inventory in a temporary directory that is warm from the
+second run on) and reports, in milliseconds from interpreter start:
+
+    import      main.py and everything it pulls in
+    paint       the main window's first paint event
+    devices     the device list showing all virtual keys
+
+    python benchmarks/bench_startup.py --keys 8 --repeat 10
+    python benchmarks/bench_startup.py --importtime
+    python benchmarks/bench_startup.py --json baseline.json
+    python benchmarks/bench_startup.py --compare baseline.json
+
+With --compare the run exits with status 1 if a median got slower than the
+baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("import", "paint", "devices")
+# Timing noise floor: differences below this are never reported as regressions.
+MIN_DELTA_MS = 5.0
+
+# Runs in the child process. The start time is taken by the parent right
+# before spawning, so interpreter start-up is part of every number.
+CHILD = r"""
+import json, os, sys, time
+start = float(sys.argv[1])
+keys = int(os.environ["FIDO2KM_EMULATE"])
+times = {}
+
+def mark(stage):
+    times.setdefault(stage, (time.time() - start) * 1000)
+
+import main
+mark("import")
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and obj is win:
+            mark("paint")
+        return False
+
+app = QApplication(sys.argv)
+win = main.create_window(app)
+paint_filter = FirstPaint()
+win.installEventFilter(paint_filter)
+win.show()
+
+def poll():
+    live = [d for d in win.devices if not d.get("known")]
+    if win.discovery is not None and len(live) >= keys:
+        mark("devices")
+        win.hotplug.stop()
+        for worker in list(win.workers.values()) + [win.discovery]:
+            worker.stop()
+        app.quit()
+    else:
+        QTimer.singleShot(1, poll)
+
+QTimer.singleShot(0, poll)
+QTimer.singleShot(30000, app.quit)
+app.exec_()
+print(json.dumps(times))
+"""
+
+
+def run_once(keys: int, inventory: str) -> Dict[str, float]:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", FIDO2KM_EMULATE=str(keys),
+               FIDO2KM_INVENTORY=inventory)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, repr(time.time())],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def import_profile(top: int) -> List[str]:
+    """Slowest modules imported by main.py, by cumulative time (python -X importtime)."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    return [f"{us / 1000:8.1f} ms  {name}" for us, name in rows[:top]]
+
+
+def compare(results: Dict[str, float], baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for stage, value in results.items():
+        base = baseline["results"].get(stage)
+        if base is not None and value > base * (1 + tolerance) + MIN_DELTA_MS:
+            regressions.append(f"{stage}: {value:.1f} ms, was {base:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=4, help="virtual keys to discover")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true",
+                        help="also list the slowest imports of main.py")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", metavar="FILE", help="write results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="baseline to check against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown of a median (default 0.25)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inventory = os.path.join(tmp, "inventory.sqlite3")
+        runs = [run_once(args.keys, inventory) for _ in range(args.repeat)]
+    results = {}
+    print(f"{'stage':<8} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for stage in STAGES:
+        samples = [r[stage] for r in runs if stage in r]
+        if not samples:
+            print(f"{stage:<8} {'n/a':>10}")
+            continue
+        results[stage] = statistics.median(samples)
+        print(f"{stage:<8} {results[stage]:>10.1f} {min(samples):>8.1f} {max(samples):>8.1f}")
+
+    if args.importtime:
+        print("\ncumulative import time")
+        for line in import_profile(args.top):
+            print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {
+                    "keys": args.keys,
+                    "repeat": args.repeat,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against " + args.compare)
+
+
+if __name__ == "__main__":
+    main()
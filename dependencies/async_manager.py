@@ -0,0 +1,136 @@
+"""asyncio front end for Fido2Manager.
+
+Every coroutine runs the blocking manager call on a thread pool owned by
+the facade or, once a key is selected, on that key's command queue (see
+scheduler.py), so it never overlaps other users of the key. Cancelling a coroutine sets the threading.Event handed to
+python-fido2, which makes the HID layer send CTAPHID_CANCEL, so reset and
+fingerprint captures stop at the authenticator instead of running on in an
+orphaned thread. Calls that have no cancel path in CTAP (getInfo, clientPIN)
+are short and are simply allowed to finish.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .manager import Fido2Manager
+from .scheduler import PRIORITY_COMMAND, PRIORITY_INFO, PRIORITY_PRESENCE
+
+
+DEFAULT_WORKERS = 8
+CANCEL_GRACE = 5.0
+
+
+class AsyncFido2Manager:
+    def __init__(self, manager: Optional[Fido2Manager] = None, max_workers: int = DEFAULT_WORKERS,
+                 cancel_grace: float = CANCEL_GRACE, _executor: Optional[ThreadPoolExecutor] = None):
+        self._owns_manager = manager is None
+        self.manager = manager or Fido2Manager()
+        self.cancel_grace = cancel_grace
+        self._owns_executor = _executor is None
+        self._executor = _executor or ThreadPoolExecutor(
+            max_workers, thread_name_prefix="fido2-async")
+        # One blocking call at a time per bound manager, since it has a single selection.
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncFido2Manager":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        """Wait for running calls, then release the thread pool and device handles."""
+        if self._owns_executor:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, functools.partial(self._executor.shutdown, wait=True, cancel_futures=True))
+        if self._owns_manager:
+            self.manager.close()
+
+    async def _call(self, fn: Callable, *args, event: Optional[threading.Event] = None,
+                    priority: int = PRIORITY_COMMAND):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            path = self.manager.selected_path
+            if path is None:
+                queued = None
+                future = loop.run_in_executor(self._executor, functools.partial(fn, *args))
+            else:
+                # Behind whatever else is using the key, see scheduler.py.
+                queued = self.manager.submit(path, lambda _: fn(*args), priority, event=event)
+                future = asyncio.wrap_future(queued)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if event is not None:
+                    event.set()
+                if queued is not None:
+                    queued.cancel()
+                # Keep the lock until the worker thread has actually unwound.
+                await asyncio.wait({future}, timeout=self.cancel_grace)
+                if future.done() and not future.cancelled():
+                    future.exception()
+                raise
+
+    async def discover(self) -> List[Dict[str, Any]]:
+        return await self._call(self.manager.discover)
+
+    async def select_device(self, device) -> Dict[str, Any]:
+        return await self._call(self.manager.select_device, device)
+
+    async def device(self, path) -> "AsyncFido2Manager":
+        """Return a facade bound to one key, sharing this facade's thread pool.
+
+        Use one per key to run operations on several keys concurrently.
+        """
+        view = await self._call(self.manager.for_device, path)
+        return AsyncFido2Manager(view, cancel_grace=self.cancel_grace, _executor=self._executor)
+
+    async def get_info(self, refresh: bool = False) -> Dict[str, Any]:
+        path = self.manager.selected_path
+        if path is None:
+            return await self._call(self.manager.get_info, refresh, priority=PRIORITY_INFO)
+        # Shared with concurrent requests for the key, so cancelling must not cancel it.
+        return await asyncio.shield(asyncio.wrap_future(self.manager.request_info(path, refresh)))
+
+    async def has_pin(self) -> bool:
+        return await self._call(self.manager.has_pin, priority=PRIORITY_INFO)
+
+    async def support_bio(self) -> bool:
+        return await self._call(self.manager.support_bio, priority=PRIORITY_INFO)
+
+    async def set_pin(self, new_pin: str, current_pin: Optional[str] = None) -> bool:
+        return await self._call(self.manager.set_pin, new_pin, current_pin)
+
+    async def change_pin(self, current_pin: str, new_pin: str) -> bool:
+        return await self._call(self.manager.change_pin, current_pin, new_pin)
+
+    async def reset(self) -> bool:
+        event = threading.Event()
+        return await self._call(functools.partial(self.manager.reset, event=event), event=event,
+                                priority=PRIORITY_PRESENCE)
+
+    async def add_fingerprint(self, pin: str, name: str = "Fingerprint",
+                              on_touch: Optional[Callable[[str], Any]] = None):
+        """Enroll a fingerprint; on_touch is called on the event loop with progress text."""
+        loop = asyncio.get_running_loop()
+        event = threading.Event()
+
+        def touch(message: str):
+            if on_touch is not None:
+                loop.call_soon_threadsafe(on_touch, message)
+
+        return await self._call(
+            self.manager.add_fingerprint, pin, touch, lambda: name, event, event=event,
+            priority=PRIORITY_PRESENCE)
+
+    async def list_fingerprints(self, pin: str):
+        return await self._call(self.manager.list_fingerprints, pin)
+
+    async def remove_fingerprint(self, pin: str, template_id: bytes):
+        return await self._call(self.manager.remove_fingerprint, pin, template_id)
+
+    async def rename_fingerprint(self, pin: str, template_id: bytes, new_name: str):
+        return await self._call(self.manager.rename_fingerprint, pin, template_id, new_name)
@@ -0,0 +1,366 @@
+"""Headless command line front end for Fido2Manager.
+
+Nothing in here may import PyQt5: the CLI is meant to be started many times
+a day from provisioning scripts on machines without a display.
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .export import export_inventory, WRITERS
+from .inventory import jsonable, open_default_inventory
+from .manager import Fido2Manager
+from .mds import open_default_metadata
+from .metrics import CommandMetrics
+
+
+PIN_ENV = "FIDO2KM_PIN"
+NEW_PIN_ENV = "FIDO2KM_NEW_PIN"
+
+
+class CliError(Exception):
+    pass
+
+
+def _emit(args, data, text: str):
+    if args.json:
+        json.dump(jsonable(data), sys.stdout)
+        sys.stdout.write("\n")
+    elif text:
+        print(text)
+
+
+def _status(args, message: str):
+    """Progress messages go to stderr so JSON on stdout stays parseable."""
+    if not args.quiet:
+        print(message, file=sys.stderr, flush=True)
+
+
+def _read_pin(args, attr: str, env: str, prompt: str, confirm: bool = False) -> str:
+    pin = getattr(args, attr, None) or os.environ.get(env)
+    if pin:
+        return pin
+    if not sys.stdin.isatty():
+        raise CliError(f"No PIN given, use --{attr.replace('_', '-')} or {env}")
+    pin = getpass.getpass(prompt)
+    if confirm and getpass.getpass("Confirm " + prompt[0].lower() + prompt[1:]) != pin:
+        raise CliError("PINs do not match")
+    return pin
+
+
+def _select(manager: Fido2Manager, args) -> Dict[str, Any]:
+    devices = manager.discover()
+    if not devices:
+        raise CliError("No FIDO2 device found")
+    if args.device is None:
+        if len(devices) > 1:
+            raise CliError(
+                f"{len(devices)} devices found, choose one with --device")
+        device = devices[0]["path"]
+    elif args.device.isdigit() and int(args.device) < len(devices):
+        device = devices[int(args.device)]["path"]
+    else:
+        device = args.device
+    return manager.select_device(device)
+
+
+def _device_text(index: int, device: Dict[str, Any]) -> str:
+    vid, pid = device.get("vendor_id"), device.get("product_id")
+    ids = f"{vid:04x}:{pid:04x}" if vid is not None and pid is not None else "????:????"
+    return f"{index}: {device.get('product_string') or 'Unknown'} [{ids}] {device.get('path')}"
+
+
+def cmd_list(manager: Fido2Manager, args):
+    devices = manager.discover()
+    _emit(args, devices, "\n".join(
+        _device_text(i, d) for i, d in enumerate(devices)) or "No FIDO2 device found")
+
+
+def cmd_info(manager: Fido2Manager, args):
+    info = _select(manager, args)
+    info["has_pin"] = manager.has_pin()
+    info["bio"] = manager.support_bio()
+    metadata = open_default_metadata()
+    if metadata is not None:
+        model = metadata.lookup(info["aaguid"]) or {}
+        info["model"] = model.get("description")
+        info["certification"] = model.get("certification")
+        metadata.close()
+    lines = [f"{key}: {value}" for key, value in info.items()]
+    _emit(args, info, "\n".join(lines))
+
+
+def cmd_set_pin(manager: Fido2Manager, args):
+    _select(manager, args)
+    if manager.has_pin():
+        raise CliError("A PIN is already set, use change-pin")
+    new_pin = _read_pin(args, "new_pin", NEW_PIN_ENV, "New PIN: ", confirm=True)
+    manager.set_pin(new_pin)
+    _emit(args, {"ok": True}, "PIN set successfully.")
+
+
+def cmd_change_pin(manager: Fido2Manager, args):
+    _select(manager, args)
+    pin = _read_pin(args, "pin", PIN_ENV, "Current PIN: ")
+    new_pin = _read_pin(args, "new_pin", NEW_PIN_ENV, "New PIN: ", confirm=True)
+    manager.change_pin(pin, new_pin)
+    _emit(args, {"ok": True}, "PIN changed successfully.")
+
+
+def cmd_reset(manager: Fido2Manager, args):
+    info = _select(manager, args)
+    if not args.yes:
+        if not sys.stdin.isatty():
+            raise CliError("Refusing to reset without --yes")
+        if input("This erases all credentials and the PIN. Type 'yes' to continue: ") != "yes":
+            raise CliError("Aborted")
+    if args.no_replug:
+        _status(args, "Touch the device to confirm the reset...")
+        manager.reset()
+        _emit(args, {"ok": True}, "Authenticator reset successfully.")
+        return
+
+    from .hotplug import HotplugMonitor
+    from .reset_flow import ResetSession, FAILED, RESETTING, WAITING_REMOVAL
+
+    device = next(d for d in manager.discover() if d["path"] == info["path"])
+
+    def on_change(target):
+        if target.state == WAITING_REMOVAL:
+            _status(args, "Disconnect the device now and reconnect it within 10 seconds...")
+        elif target.state == RESETTING:
+            _status(args, "Touch the device to confirm the reset...")
+
+    monitor = HotplugMonitor(manager.provider.event_source())
+    monitor.start()
+    try:
+        monitor.wait_for_scan()
+        session = ResetSession(manager, monitor, on_change)
+        session.arm([device])
+        session.start()
+        session.wait()
+    finally:
+        monitor.stop()
+    target = session.targets[0]
+    if target.state == FAILED:
+        raise CliError(target.error)
+    _emit(args, {"ok": True, "path": target.new_path}, "Authenticator reset successfully.")
+
+
+def cmd_fp_list(manager: Fido2Manager, args):
+    _select(manager, args)
+    pin = _read_pin(args, "pin", PIN_ENV, "PIN: ")
+    templates = manager.list_fingerprints(pin)
+    data = [{"id": tid.hex(), "name": name} for tid, name in templates.items()]
+    _emit(args, data, "\n".join(f"{d['id']}  {d['name']}" for d in data)
+          or "No fingerprints have been captured.")
+
+
+def cmd_fp_add(manager: Fido2Manager, args):
+    _select(manager, args)
+    manager.can_add_fingerprint()
+    pin = _read_pin(args, "pin", PIN_ENV, "PIN: ")
+    manager.add_fingerprint(pin, lambda msg: _status(args, msg), lambda: args.name)
+    _emit(args, {"ok": True, "name": args.name}, "Fingerprint added successfully.")
+
+
+def cmd_fp_remove(manager: Fido2Manager, args):
+    if args.all and args.template_ids:
+        raise CliError("Give template ids or --all, not both")
+    if not args.all and not args.template_ids:
+        raise CliError("Give the template ids to remove, or --all")
+    _select(manager, args)
+    pin = _read_pin(args, "pin", PIN_ENV, "PIN: ")
+    if args.all:
+        results = manager.remove_all_fingerprints(pin)
+    else:
+        results = manager.remove_fingerprints(pin, [bytes.fromhex(t) for t in args.template_ids])
+    data = [{"id": tid.hex(), "ok": e is None, "error": None if e is None else str(e)}
+            for tid, e in results.items()]
+    failed = [d for d in data if not d["ok"]]
+    _emit(args, {"ok": not failed, "results": data},
+          "\n".join(f"{d['id']}  {'removed' if d['ok'] else 'failed: ' + d['error']}" for d in data)
+          or "No fingerprints have been captured.")
+    return 1 if failed else 0
+
+
+def cmd_fp_rename(manager: Fido2Manager, args):
+    _select(manager, args)
+    pin = _read_pin(args, "pin", PIN_ENV, "PIN: ")
+    manager.rename_fingerprint(pin, bytes.fromhex(args.template_id), args.name)
+    _emit(args, {"ok": True}, "Fingerprint renamed.")
+
+
+def cmd_cred_list(manager: Fido2Manager, args):
+    _select(manager, args)
+    pin = _read_pin(args, "pin", PIN_ENV, "PIN: ")
+    data = []
+    # RPs are fully enumerated before their credentials: the key forgets an
+    # enumeration as soon as it gets another command.
+    for rp in list(manager.iter_relying_parties(pin)):
+        if args.rp and rp["id"] != args.rp:
+            continue
+        for cred in manager.iter_credentials(pin, rp["rp_id_hash"]):
+            item = {"rp_id": rp["id"], "credential_id": cred["credential_id"],
+                    "user_name": cred["user_name"], "display_name": cred["display_name"]}
+            data.append(item)
+            if not args.json:
+                print(f"{rp['id']}  {cred['credential_id'].hex()}  {cred['user_name'] or ''}")
+    if args.json:
+        _emit(args, data, "")
+    elif not data:
+        print("No discoverable credentials.")
+
+
+def cmd_cred_delete(manager: Fido2Manager, args):
+    _select(manager, args)
+    pin = _read_pin(args, "pin", PIN_ENV, "PIN: ")
+    manager.delete_credential(pin, bytes.fromhex(args.credential_id))
+    _emit(args, {"ok": True}, "Credential deleted.")
+
+
+def cmd_export(manager: Fido2Manager, args):
+    # Never prompt: without a PIN the export simply leaves out the PIN protected fields.
+    pin = args.pin or os.environ.get(PIN_ENV) or None
+    summary = export_inventory(
+        manager, args.file, args.format, pin, args.resume,
+        lambda path, state: _status(args, f"{path}: {state}"))
+    failed = [{"path": path, "error": error} for path, error in summary.failed.items()]
+    text = f"{summary.written} written, {summary.skipped} skipped, {len(failed)} failed"
+    if failed:
+        text += "; run again with --resume to retry the failed keys"
+    _emit(args, {"ok": not failed, "written": summary.written, "skipped": summary.skipped,
+                 "failed": failed}, text)
+    return 1 if failed else 0
+
+
+def cmd_inventory(manager: Fido2Manager, args):
+    if manager.inventory is None:
+        raise CliError("The device inventory is disabled or could not be opened")
+    seen_since = time.time() - args.days * 86400 if args.days is not None else None
+    rows = manager.inventory.find(
+        aaguid=args.aaguid, vendor_id=args.vid, product_id=args.pid,
+        product_string=args.product, seen_since=seen_since, limit=args.limit)
+    _emit(args, rows, "\n".join(
+        f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(r['last_seen']))}  {r['aaguid'] or '-':32}  "
+        f"{r['product_string'] or 'Unknown'} ({r['serial_number'] or r['path']})" for r in rows)
+        or "No matching devices.")
+
+
+def _hex_int(value: str) -> int:
+    return int(value, 16)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-d", "--device",
+                        help="device path or index from 'list' (required with several keys)")
+    common.add_argument("--json", action="store_true", help="print JSON on stdout")
+    common.add_argument("-q", "--quiet", action="store_true",
+                        help="suppress progress messages on stderr")
+    common.add_argument("--metrics", metavar="FILE",
+                        help="write CTAP command timings to FILE (.prom for Prometheus, else JSON)")
+    common.add_argument("--inventory", action="store_true",
+                        help="record the keys seen in the device inventory")
+
+    pin_opt = argparse.ArgumentParser(add_help=False)
+    pin_opt.add_argument("--pin", help=f"current PIN (default: ${PIN_ENV} or prompt)")
+    new_pin_opt = argparse.ArgumentParser(add_help=False)
+    new_pin_opt.add_argument("--new-pin", help=f"new PIN (default: ${NEW_PIN_ENV} or prompt)")
+
+    parser = argparse.ArgumentParser(
+        prog="fido2km", description="Manage FIDO2 security keys from the command line.")
+    sub = parser.add_subparsers(dest="command", metavar="command", required=True)
+
+    p = sub.add_parser("list", parents=[common], help="list connected keys")
+    p.set_defaults(func=cmd_list)
+    p = sub.add_parser("info", parents=[common], help="show authenticator info")
+    p.set_defaults(func=cmd_info)
+    p = sub.add_parser("set-pin", parents=[common, new_pin_opt], help="set the initial PIN")
+    p.set_defaults(func=cmd_set_pin)
+    p = sub.add_parser("change-pin", parents=[common, pin_opt, new_pin_opt],
+                       help="change the PIN")
+    p.set_defaults(func=cmd_change_pin)
+    p = sub.add_parser("reset", parents=[common], help="factory-reset the key")
+    p.add_argument("-y", "--yes", action="store_true", help="do not ask for confirmation")
+    p.add_argument("--no-replug", action="store_true",
+                   help="send reset right away (the key must have been plugged in < 10 s ago)")
+    p.set_defaults(func=cmd_reset)
+
+    fp = sub.add_parser("fingerprint", help="manage fingerprint templates")
+    fp_sub = fp.add_subparsers(dest="fp_command", metavar="action", required=True)
+    p = fp_sub.add_parser("list", parents=[common, pin_opt], help="list enrolled fingerprints")
+    p.set_defaults(func=cmd_fp_list)
+    p = fp_sub.add_parser("add", parents=[common, pin_opt], help="enroll a new fingerprint")
+    p.add_argument("--name", default="Fingerprint", help="friendly name of the template")
+    p.set_defaults(func=cmd_fp_add)
+    p = fp_sub.add_parser("remove", parents=[common, pin_opt], help="remove fingerprints")
+    p.add_argument("template_ids", nargs="*", metavar="template_id",
+                   help="template id (hex) as shown by 'fingerprint list'")
+    p.add_argument("--all", action="store_true", help="remove every enrolled fingerprint")
+    p.set_defaults(func=cmd_fp_remove)
+    p = fp_sub.add_parser("rename", parents=[common, pin_opt], help="rename a fingerprint")
+    p.add_argument("template_id", help="template id (hex) as shown by 'fingerprint list'")
+    p.add_argument("name", help="new friendly name")
+    p.set_defaults(func=cmd_fp_rename)
+
+    p = sub.add_parser("export", parents=[common, pin_opt],
+                       help="write an inventory of all attached keys")
+    p.add_argument("file", help="output file, .csv for CSV, JSON Lines otherwise")
+    p.add_argument("--format", choices=sorted(WRITERS), help="override the format from the extension")
+    p.add_argument("--resume", action="store_true",
+                   help="append the keys that FILE does not have yet")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("inventory", parents=[common],
+                       help="query the keys seen before, without touching attached ones")
+    p.add_argument("--aaguid", help="AAGUID as 32 hex digits")
+    p.add_argument("--vid", type=_hex_int, help="USB vendor id (hex)")
+    p.add_argument("--pid", type=_hex_int, help="USB product id (hex)")
+    p.add_argument("--product", help="exact product string")
+    p.add_argument("--days", type=float, help="only keys seen in the last DAYS days")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(func=cmd_inventory)
+
+    cred = sub.add_parser("credential", help="manage discoverable credentials (passkeys)")
+    cred_sub = cred.add_subparsers(dest="cred_command", metavar="action", required=True)
+    p = cred_sub.add_parser("list", parents=[common, pin_opt], help="list stored credentials")
+    p.add_argument("--rp", help="only credentials of this RP ID")
+    p.set_defaults(func=cmd_cred_list)
+    p = cred_sub.add_parser("delete", parents=[common, pin_opt], help="delete a credential")
+    p.add_argument("credential_id", help="credential id (hex) as shown by 'credential list'")
+    p.set_defaults(func=cmd_cred_delete)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    # Opt-in: parallel scripted runs should not all contend for the SQLite file.
+    manager = Fido2Manager(metrics=CommandMetrics() if args.metrics else None,
+                           inventory=open_default_inventory()
+                           if args.inventory or args.func is cmd_inventory else None)
+    try:
+        return args.func(manager, args) or 0
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        if args.json:
+            json.dump({"error": str(e)}, sys.stdout)
+            sys.stdout.write("\n")
+        else:
+            print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        manager.close()
+        if manager.inventory is not None:
+            manager.inventory.close()
+        if args.metrics:
+            manager.metrics.export(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
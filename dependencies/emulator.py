@@ -0,0 +1,595 @@
+"""Software CTAP2 authenticators for running the manager without hardware.
+
+VirtualAuthenticator answers CTAP2 CBOR commands, so the real python-fido2
+Ctap2, ClientPin and FPBioEnrollment code runs against it unchanged. It
+implements getInfo, clientPIN with PIN/UV auth protocols 1 and 2, reset,
+fingerprint enrollment with simulated captures and credential management of
+discoverable credentials. Latency per command, touch
+delay, sample feedback and injected errors are configurable per key.
+
+    provider = VirtualDeviceProvider(64, latency=0.005)
+    manager = Fido2Manager(provider=provider)
+
+Setting FIDO2KM_EMULATE=64 starts the GUI or the CLI against 64 such keys.
+"""
+import os
+import random
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Mapping, Optional
+
+from cryptography.hazmat.primitives.asymmetric import ec
+from fido2 import cbor
+from fido2.ctap import CtapDevice, CtapError
+from fido2.ctap2 import ClientPin
+from fido2.ctap2.base import Ctap2
+from fido2.ctap2.bio import BioEnrollment, FPBioEnrollment
+from fido2.ctap2.credman import CredentialManagement
+from fido2.ctap2.pin import PinProtocolV1, PinProtocolV2
+from fido2.hid import CAPABILITY, CTAPHID, STATUS
+from fido2.hid.base import HidDescriptor
+from fido2.utils import bytes2int, int2bytes, sha256
+
+from .hotplug import FakeEventSource
+from .transport import DeviceProvider
+
+
+VIRTUAL_VID = 0x1209
+VIRTUAL_PID = 0xF1D0
+PIN_RETRIES = 8
+PIN_ATTEMPTS_PER_BOOT = 3
+MIN_PIN_LENGTH = 4
+RESET_WINDOW = 10.0
+MAX_NAME_LENGTH = 64
+MAX_CREDENTIALS = 256
+
+ERR = CtapError.ERR
+FEEDBACK = FPBioEnrollment.FEEDBACK
+CREDMAN = CredentialManagement
+_PROTOCOLS = {PinProtocolV1.VERSION: PinProtocolV1(), PinProtocolV2.VERSION: PinProtocolV2()}
+
+
+class VirtualAuthenticator:
+    """State and command handling of one emulated key.
+
+    latency is the time every command takes, command_latency overrides it per
+    CTAP command byte. touch_delay is how long the simulated user takes to
+    touch the key for reset or to put a finger on the sensor; both waits can
+    be cancelled like on a real key. Queue FEEDBACK codes in sample_feedback
+    to script the outcome of the next captures.
+
+    credentials maps RP IDs to the user names that have a discoverable
+    credential for that RP, e.g. {"example.com": ["alice", "bob"]}.
+    """
+
+    def __init__(self, pin: Optional[str] = None, templates: Optional[Mapping[bytes, str]] = None,
+                 latency: float = 0.0, command_latency: Optional[Mapping[int, float]] = None,
+                 touch_delay: float = 0.0, samples_required: int = 4, max_templates: int = 5,
+                 bio: bool = True, pin_protocols: Iterable[int] = (2, 1),
+                 reset_window: Optional[float] = RESET_WINDOW, token_timeout: Optional[float] = None,
+                 error_rate: float = 0.0, random_errors: Iterable[int] = (ERR.OTHER,),
+                 credentials: Optional[Mapping[str, Iterable[str]]] = None,
+                 max_credentials: int = MAX_CREDENTIALS,
+                 aaguid: Optional[bytes] = None, seed=None):
+        self.aaguid = aaguid or os.urandom(16)
+        self.latency = latency
+        self.command_latency = dict(command_latency or {})
+        self.touch_delay = touch_delay
+        self.samples_required = samples_required
+        self.max_templates = max_templates
+        self.bio = bio
+        self.pin_protocols = list(pin_protocols)
+        self.reset_window = reset_window
+        self.token_timeout = token_timeout
+        self.error_rate = error_rate
+        self.random_errors = list(random_errors)
+        self.sample_feedback: Deque[int] = deque()
+        self.calls: Dict[int, int] = {}
+        self.plugged = True
+        self.generation = 0
+        self.pin_hash = sha256(pin.encode())[:16] if pin else None
+        self.pin_retries = PIN_RETRIES
+        self.templates: Dict[bytes, str] = dict(templates or {})
+        self.max_credentials = max_credentials
+        self.credentials: Dict[str, List[Dict[str, Any]]] = {}
+        for rp_id, users in (credentials or {}).items():
+            for user in users:
+                self.add_credential(rp_id, user)
+        self._faults: Dict[Optional[int], Deque[int]] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._handlers: Dict[int, Callable] = {
+            Ctap2.CMD.GET_INFO: self._get_info,
+            Ctap2.CMD.CLIENT_PIN: self._client_pin,
+            Ctap2.CMD.RESET: self._reset,
+            Ctap2.CMD.BIO_ENROLLMENT: self._bio_enrollment,
+            Ctap2.CMD.CREDENTIAL_MGMT: self._credential_mgmt,
+        }
+        self.power_cycle()
+
+    def power_cycle(self):
+        """Forget everything a real key loses when unplugged."""
+        self.powered_at = time.monotonic()
+        self._key_agreement = ec.generate_private_key(ec.SECP256R1())
+        self._token = os.urandom(32)
+        self._token_permissions = 0
+        self._token_issued_at = None
+        self._boot_attempts = 0
+        self._enrollment = None
+        self._cursor = None
+
+    def add_credential(self, rp_id: str, user_name: str) -> bytes:
+        """Store a discoverable credential as if makeCredential had created it; return its ID."""
+        credential_id = os.urandom(32)
+        self.credentials.setdefault(rp_id, []).append({
+            "id": credential_id,
+            "user": {"id": sha256(f"{rp_id}/{user_name}".encode())[:16],
+                     "name": user_name, "displayName": user_name.title()},
+            # A well-formed but arbitrary P-256 key; nothing is ever signed with it.
+            "public_key": {1: 2, 3: -7, -1: 1, -2: os.urandom(32), -3: os.urandom(32)},
+        })
+        return credential_id
+
+    def inject_failure(self, error: int, command: Optional[int] = None, times: int = 1):
+        """Answer the next times calls of command (of any command if None) with error."""
+        with self._lock:
+            self._faults.setdefault(command, deque()).extend([error] * times)
+
+    def call(self, data: bytes, event=None, on_keepalive=None) -> bytes:
+        """Handle one CTAPHID_CBOR request and return the response frame."""
+        with self._lock:
+            cmd = data[0]
+            self.calls[cmd] = self.calls.get(cmd, 0) + 1
+            if cmd != Ctap2.CMD.CREDENTIAL_MGMT:
+                # Any other command ends an RP or credential enumeration.
+                self._cursor = None
+            try:
+                delay = self.command_latency.get(cmd, self.latency)
+                if delay > 0:
+                    time.sleep(delay)
+                self._raise_injected(cmd)
+                handler = self._handlers.get(cmd)
+                if handler is None:
+                    raise CtapError(ERR.INVALID_COMMAND)
+                try:
+                    request = cbor.decode(data[1:]) if len(data) > 1 else {}
+                except Exception:
+                    raise CtapError(ERR.INVALID_CBOR)
+                response = handler(request, event, on_keepalive)
+            except CtapError as e:
+                return bytes([int(e.code)])
+            return b"\0" + (cbor.encode(response) if response else b"")
+
+    def _raise_injected(self, cmd: int):
+        for key in (cmd, None):
+            queue = self._faults.get(key)
+            if queue:
+                raise CtapError(queue.popleft())
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise CtapError(self._random.choice(self.random_errors))
+
+    def _wait_for_user(self, event, on_keepalive):
+        if on_keepalive is not None:
+            on_keepalive(STATUS.UPNEEDED)
+        if event is not None:
+            if event.wait(self.touch_delay):
+                raise CtapError(ERR.KEEPALIVE_CANCEL)
+        elif self.touch_delay > 0:
+            time.sleep(self.touch_delay)
+
+    def _get_info(self, request, event, on_keepalive):
+        options = {
+            "up": True,
+            "clientPin": self.pin_hash is not None,
+            "pinUvAuthToken": True,
+            "credMgmt": True,
+        }
+        versions = ["FIDO_2_0", "FIDO_2_1"]
+        if self.bio:
+            options["bioEnroll"] = bool(self.templates)
+        return {
+            0x01: versions,
+            0x03: self.aaguid,
+            0x04: options,
+            0x05: 1200,
+            0x06: self.pin_protocols,
+            0x0D: MIN_PIN_LENGTH,
+        }
+
+    # clientPIN
+
+    def _protocol(self, version):
+        if version not in self.pin_protocols:
+            raise CtapError(ERR.MISSING_PARAMETER if version is None else ERR.INVALID_PARAMETER)
+        return _PROTOCOLS[version]
+
+    def _shared_secret(self, protocol, request) -> bytes:
+        peer = request.get(0x03)
+        if not peer:
+            raise CtapError(ERR.MISSING_PARAMETER)
+        try:
+            public_key = ec.EllipticCurvePublicNumbers(
+                bytes2int(peer[-2]), bytes2int(peer[-3]), ec.SECP256R1()).public_key()
+        except (KeyError, ValueError):
+            raise CtapError(ERR.INVALID_PARAMETER)
+        return protocol.kdf(self._key_agreement.exchange(ec.ECDH(), public_key))
+
+    def _verify(self, protocol, key: bytes, message: bytes, param: Optional[bytes]):
+        if param is None:
+            raise CtapError(ERR.MISSING_PARAMETER)
+        if protocol.authenticate(key, message) != param:
+            raise CtapError(ERR.PIN_AUTH_INVALID)
+
+    def _check_pin(self, protocol, secret: bytes, pin_hash_enc: Optional[bytes]):
+        if pin_hash_enc is None:
+            raise CtapError(ERR.MISSING_PARAMETER)
+        if self.pin_retries == 0:
+            raise CtapError(ERR.PIN_BLOCKED)
+        if self._boot_attempts >= PIN_ATTEMPTS_PER_BOOT:
+            raise CtapError(ERR.PIN_AUTH_BLOCKED)
+        self.pin_retries -= 1
+        if protocol.decrypt(secret, pin_hash_enc) != self.pin_hash:
+            self._key_agreement = ec.generate_private_key(ec.SECP256R1())
+            self._boot_attempts += 1
+            if self.pin_retries == 0:
+                raise CtapError(ERR.PIN_BLOCKED)
+            if self._boot_attempts >= PIN_ATTEMPTS_PER_BOOT:
+                raise CtapError(ERR.PIN_AUTH_BLOCKED)
+            raise CtapError(ERR.PIN_INVALID)
+        self.pin_retries = PIN_RETRIES
+        self._boot_attempts = 0
+
+    def _store_pin(self, protocol, secret: bytes, new_pin_enc: Optional[bytes]):
+        if new_pin_enc is None:
+            raise CtapError(ERR.MISSING_PARAMETER)
+        padded = protocol.decrypt(secret, new_pin_enc)
+        pin = padded.split(b"\0", 1)[0]
+        if len(padded) < 64 or len(pin.decode(errors="replace")) < MIN_PIN_LENGTH:
+            raise CtapError(ERR.PIN_POLICY_VIOLATION)
+        self.pin_hash = sha256(pin)[:16]
+        self.pin_retries = PIN_RETRIES
+        self._revoke_token()
+
+    def _revoke_token(self):
+        self._token = os.urandom(32)
+        self._token_permissions = 0
+        self._token_issued_at = None
+
+    def _client_pin(self, request, event, on_keepalive):
+        sub_cmd = request.get(0x02)
+        if sub_cmd == ClientPin.CMD.GET_PIN_RETRIES:
+            return {ClientPin.RESULT.PIN_RETRIES: self.pin_retries}
+        protocol = self._protocol(request.get(0x01))
+        if sub_cmd == ClientPin.CMD.GET_KEY_AGREEMENT:
+            numbers = self._key_agreement.public_key().public_numbers()
+            return {ClientPin.RESULT.KEY_AGREEMENT: {
+                1: 2, 3: -25, -1: 1, -2: int2bytes(numbers.x, 32), -3: int2bytes(numbers.y, 32)}}
+        secret = self._shared_secret(protocol, request)
+        if sub_cmd == ClientPin.CMD.SET_PIN:
+            if self.pin_hash is not None:
+                raise CtapError(ERR.NOT_ALLOWED)
+            self._verify(protocol, secret, request.get(0x05) or b"", request.get(0x04))
+            self._store_pin(protocol, secret, request.get(0x05))
+            return None
+        if self.pin_hash is None:
+            raise CtapError(ERR.PIN_NOT_SET)
+        if sub_cmd == ClientPin.CMD.CHANGE_PIN:
+            self._verify(protocol, secret, (request.get(0x05) or b"") + (request.get(0x06) or b""),
+                         request.get(0x04))
+            self._check_pin(protocol, secret, request.get(0x06))
+            self._store_pin(protocol, secret, request.get(0x05))
+            return None
+        if sub_cmd in (ClientPin.CMD.GET_TOKEN_USING_PIN, ClientPin.CMD.GET_TOKEN_USING_PIN_LEGACY):
+            if sub_cmd == ClientPin.CMD.GET_TOKEN_USING_PIN:
+                permissions = request.get(0x09)
+                if not permissions:
+                    raise CtapError(ERR.MISSING_PARAMETER)
+                if permissions & ClientPin.PERMISSION.BIO_ENROLL and not self.bio:
+                    raise CtapError(ERR.UNAUTHORIZED_PERMISSION)
+            else:
+                permissions = ClientPin.PERMISSION.MAKE_CREDENTIAL | ClientPin.PERMISSION.GET_ASSERTION
+            self._check_pin(protocol, secret, request.get(0x06))
+            # Issuing a token invalidates the one handed out before.
+            self._revoke_token()
+            self._token_permissions = permissions
+            self._token_issued_at = time.monotonic()
+            return {ClientPin.RESULT.PIN_UV_TOKEN: protocol.encrypt(secret, self._token)}
+        raise CtapError(ERR.INVALID_SUBCOMMAND)
+
+    def _verify_token(self, version, param, message: bytes, permission: int):
+        protocol = self._protocol(version)
+        if self._token_issued_at is None:
+            raise CtapError(ERR.PIN_AUTH_INVALID)
+        if self.token_timeout is not None and \
+                time.monotonic() - self._token_issued_at > self.token_timeout:
+            self._revoke_token()
+            raise CtapError(ERR.PIN_AUTH_INVALID)
+        self._verify(protocol, self._token, message, param)
+        if not self._token_permissions & permission:
+            raise CtapError(ERR.UNAUTHORIZED_PERMISSION)
+
+    # reset
+
+    def _reset(self, request, event, on_keepalive):
+        if self.reset_window is not None and time.monotonic() - self.powered_at > self.reset_window:
+            raise CtapError(ERR.NOT_ALLOWED)
+        self._wait_for_user(event, on_keepalive)
+        self.pin_hash = None
+        self.pin_retries = PIN_RETRIES
+        self.templates.clear()
+        self.credentials.clear()
+        self._enrollment = None
+        self._revoke_token()
+        return None
+
+    # bioEnrollment
+
+    def _bio_enrollment(self, request, event, on_keepalive):
+        if not self.bio:
+            raise CtapError(ERR.INVALID_COMMAND)
+        if request.get(0x06):
+            return {BioEnrollment.RESULT.MODALITY: BioEnrollment.MODALITY.FINGERPRINT}
+        modality, sub_cmd = request.get(0x01), request.get(0x02)
+        if modality != BioEnrollment.MODALITY.FINGERPRINT:
+            raise CtapError(ERR.INVALID_PARAMETER)
+        if sub_cmd == FPBioEnrollment.CMD.GET_SENSOR_INFO:
+            return {
+                BioEnrollment.RESULT.FINGERPRINT_KIND: 1,
+                BioEnrollment.RESULT.MAX_SAMPLES_REQUIRED: self.samples_required,
+                BioEnrollment.RESULT.MAX_TEMPLATE_FRIENDLY_NAME: MAX_NAME_LENGTH,
+            }
+        if sub_cmd == FPBioEnrollment.CMD.ENROLL_CANCEL:
+            self._enrollment = None
+            return None
+
+        params = request.get(0x03)
+        message = struct.pack(">BB", modality, sub_cmd)
+        if params is not None:
+            message += cbor.encode(params)
+        self._verify_token(request.get(0x04), request.get(0x05), message,
+                           ClientPin.PERMISSION.BIO_ENROLL)
+        params = params or {}
+
+        if sub_cmd == FPBioEnrollment.CMD.ENROLL_BEGIN:
+            if len(self.templates) >= self.max_templates:
+                raise CtapError(ERR.FP_DATABASE_FULL)
+            template_id = os.urandom(2)
+            while template_id in self.templates:
+                template_id = os.urandom(2)
+            self._enrollment = [template_id, 0]
+            status, remaining = self._capture(event, on_keepalive)
+            return {
+                BioEnrollment.RESULT.TEMPLATE_ID: template_id,
+                BioEnrollment.RESULT.LAST_SAMPLE_STATUS: status,
+                BioEnrollment.RESULT.REMAINING_SAMPLES: remaining,
+            }
+        if sub_cmd == FPBioEnrollment.CMD.ENROLL_CAPTURE_NEXT:
+            if not self._enrollment or params.get(FPBioEnrollment.PARAM.TEMPLATE_ID) != self._enrollment[0]:
+                raise CtapError(ERR.INVALID_PARAMETER)
+            status, remaining = self._capture(event, on_keepalive)
+            return {
+                BioEnrollment.RESULT.LAST_SAMPLE_STATUS: status,
+                BioEnrollment.RESULT.REMAINING_SAMPLES: remaining,
+            }
+        if sub_cmd == FPBioEnrollment.CMD.ENUMERATE_ENROLLMENTS:
+            if not self.templates:
+                raise CtapError(ERR.INVALID_OPTION)
+            return {BioEnrollment.RESULT.TEMPLATE_INFOS: [
+                {BioEnrollment.TEMPLATE_INFO.ID: tid, BioEnrollment.TEMPLATE_INFO.NAME: name}
+                for tid, name in self.templates.items()]}
+
+        template_id = params.get(FPBioEnrollment.PARAM.TEMPLATE_ID)
+        if template_id not in self.templates:
+            raise CtapError(ERR.INVALID_OPTION)
+        if sub_cmd == FPBioEnrollment.CMD.SET_NAME:
+            name = params.get(FPBioEnrollment.PARAM.TEMPLATE_NAME) or ""
+            if len(name) > MAX_NAME_LENGTH:
+                raise CtapError(ERR.INVALID_LENGTH)
+            self.templates[template_id] = name
+            return None
+        if sub_cmd == FPBioEnrollment.CMD.REMOVE_ENROLLMENT:
+            del self.templates[template_id]
+            return None
+        raise CtapError(ERR.INVALID_SUBCOMMAND)
+
+    def _capture(self, event, on_keepalive):
+        try:
+            self._wait_for_user(event, on_keepalive)
+        except CtapError:
+            # A cancelled capture ends the enrollment, like on a real key.
+            self._enrollment = None
+            raise
+        status = self.sample_feedback.popleft() if self.sample_feedback else FEEDBACK.FP_GOOD
+        if status == FEEDBACK.FP_GOOD:
+            self._enrollment[1] += 1
+        remaining = self.samples_required - self._enrollment[1]
+        if remaining == 0:
+            self.templates[self._enrollment[0]] = ""
+            self._enrollment = None
+        return int(status), remaining
+
+    # credentialManagement
+
+    def _credential_mgmt(self, request, event, on_keepalive):
+        sub_cmd, params = request.get(0x01), request.get(0x02)
+        if sub_cmd == CREDMAN.CMD.ENUMERATE_RPS_NEXT:
+            return self._next_from_cursor("rps")
+        if sub_cmd == CREDMAN.CMD.ENUMERATE_CREDS_NEXT:
+            return self._next_from_cursor("creds")
+        self._cursor = None
+        message = struct.pack(">B", sub_cmd)
+        if params is not None:
+            message += cbor.encode(params)
+        self._verify_token(request.get(0x03), request.get(0x04), message,
+                           ClientPin.PERMISSION.CREDENTIAL_MGMT)
+        params = params or {}
+
+        if sub_cmd == CREDMAN.CMD.GET_CREDS_METADATA:
+            count = sum(len(creds) for creds in self.credentials.values())
+            return {
+                CREDMAN.RESULT.EXISTING_CRED_COUNT: count,
+                CREDMAN.RESULT.MAX_REMAINING_COUNT: max(0, self.max_credentials - count),
+            }
+        if sub_cmd == CREDMAN.CMD.ENUMERATE_RPS_BEGIN:
+            if not self.credentials:
+                raise CtapError(ERR.NO_CREDENTIALS)
+            rps = [{CREDMAN.RESULT.RP: {"id": rp_id}, CREDMAN.RESULT.RP_ID_HASH: sha256(rp_id.encode())}
+                   for rp_id in self.credentials]
+            return self._start_cursor("rps", rps, CREDMAN.RESULT.TOTAL_RPS)
+        if sub_cmd == CREDMAN.CMD.ENUMERATE_CREDS_BEGIN:
+            rp_id = self._rp_for_hash(params.get(CREDMAN.PARAM.RP_ID_HASH))
+            creds = [{
+                CREDMAN.RESULT.USER: dict(cred["user"]),
+                CREDMAN.RESULT.CREDENTIAL_ID: {"type": "public-key", "id": cred["id"]},
+                CREDMAN.RESULT.PUBLIC_KEY: cred["public_key"],
+                CREDMAN.RESULT.CRED_PROTECT: 1,
+            } for cred in self.credentials[rp_id]]
+            return self._start_cursor("creds", creds, CREDMAN.RESULT.TOTAL_CREDENTIALS)
+        if sub_cmd in (CREDMAN.CMD.DELETE_CREDENTIAL, CREDMAN.CMD.UPDATE_USER_INFO):
+            descriptor = params.get(CREDMAN.PARAM.CREDENTIAL_ID) or {}
+            rp_id, cred = self._find_credential(descriptor.get("id"))
+            if sub_cmd == CREDMAN.CMD.DELETE_CREDENTIAL:
+                self.credentials[rp_id].remove(cred)
+                if not self.credentials[rp_id]:
+                    del self.credentials[rp_id]
+                return None
+            user = params.get(CREDMAN.PARAM.USER) or {}
+            if user.get("id") != cred["user"]["id"]:
+                raise CtapError(ERR.INVALID_PARAMETER)
+            cred["user"] = dict(user)
+            return None
+        raise CtapError(ERR.INVALID_SUBCOMMAND)
+
+    def _start_cursor(self, kind: str, items: List[Dict], total_key: int):
+        self._cursor = (kind, items, 1)
+        return {**items[0], total_key: len(items)}
+
+    def _next_from_cursor(self, kind: str):
+        if self._cursor is None or self._cursor[0] != kind or self._cursor[2] >= len(self._cursor[1]):
+            raise CtapError(ERR.NOT_ALLOWED)
+        _, items, index = self._cursor
+        self._cursor = (kind, items, index + 1)
+        return items[index]
+
+    def _rp_for_hash(self, rp_id_hash: Optional[bytes]) -> str:
+        if rp_id_hash is None:
+            raise CtapError(ERR.MISSING_PARAMETER)
+        for rp_id in self.credentials:
+            if sha256(rp_id.encode()) == rp_id_hash:
+                return rp_id
+        raise CtapError(ERR.NO_CREDENTIALS)
+
+    def _find_credential(self, credential_id: Optional[bytes]):
+        if credential_id is None:
+            raise CtapError(ERR.MISSING_PARAMETER)
+        for rp_id, creds in self.credentials.items():
+            for cred in creds:
+                if cred["id"] == credential_id:
+                    return rp_id, cred
+        raise CtapError(ERR.NO_CREDENTIALS)
+
+
+class VirtualCtapDevice(CtapDevice):
+    """CtapDevice handle on a VirtualAuthenticator, valid until the key is unplugged."""
+
+    def __init__(self, descriptor: HidDescriptor, authenticator: VirtualAuthenticator):
+        self.descriptor = descriptor
+        self.authenticator = authenticator
+        self._generation = authenticator.generation
+        self._closed = False
+
+    @property
+    def capabilities(self) -> int:
+        return CAPABILITY.CBOR
+
+    def call(self, cmd: int, data: bytes = b"", event=None, on_keepalive=None) -> bytes:
+        if self._closed or not self.authenticator.plugged or \
+                self._generation != self.authenticator.generation:
+            raise OSError(f"{self.descriptor.path} is not connected")
+        if cmd == CTAPHID.PING:
+            return data
+        if cmd != CTAPHID.CBOR:
+            raise CtapError(ERR.INVALID_COMMAND)
+        return self.authenticator.call(data, event, on_keepalive)
+
+    def close(self):
+        self._closed = True
+
+    @classmethod
+    def list_devices(cls):
+        # Virtual keys are only reachable through their VirtualDeviceProvider.
+        return iter(())
+
+
+class VirtualDeviceProvider(DeviceProvider):
+    """Serves any number of VirtualAuthenticators as if they were attached keys.
+
+    Keyword options are passed to every VirtualAuthenticator created by add().
+    plug() and unplug() simulate hotplug, reported through event_source().
+    """
+
+    def __init__(self, count: int = 1, **options):
+        self.options = options
+        self.authenticators: Dict[str, VirtualAuthenticator] = {}
+        self._descriptors: Dict[str, HidDescriptor] = {}
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self._source = FakeEventSource()
+        for _ in range(count):
+            self.add()
+
+    def add(self, authenticator: Optional[VirtualAuthenticator] = None, **options) -> str:
+        """Plug in a new virtual key and return its path."""
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        path = f"virtual:{index}"
+        self.authenticators[path] = authenticator or VirtualAuthenticator(**{**self.options, **options})
+        self._descriptors[path] = HidDescriptor(
+            path, VIRTUAL_VID, VIRTUAL_PID, 64, 64, f"Virtual Key {index}", f"VK{index:06d}")
+        self.plug(path)
+        return path
+
+    def swap(self, path: str, authenticator: Optional[VirtualAuthenticator] = None,
+             **options) -> str:
+        """Plug a different key in at the path of an unplugged one.
+
+        The new key has its own serial number, like a second key getting the
+        device node the OS freed when the first one was removed.
+        """
+        if self.authenticators[path].plugged:
+            raise ValueError(f"{path} is still plugged in")
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        self.authenticators[path] = authenticator or VirtualAuthenticator(**{**self.options, **options})
+        self._descriptors[path] = HidDescriptor(
+            path, VIRTUAL_VID, VIRTUAL_PID, 64, 64, f"Virtual Key {index}", f"VK{index:06d}")
+        self.plug(path)
+        return path
+
+    def plug(self, path: str):
+        authenticator = self.authenticators[path]
+        authenticator.generation += 1
+        authenticator.power_cycle()
+        authenticator.plugged = True
+        self._source.plug(path)
+
+    def unplug(self, path: str):
+        self.authenticators[path].plugged = False
+        self._source.unplug(path)
+
+    def list_descriptors(self) -> List[HidDescriptor]:
+        return [d for path, d in list(self._descriptors.items())
+                if self.authenticators[path].plugged]
+
+    def open(self, descriptor) -> VirtualCtapDevice:
+        authenticator = self.authenticators.get(descriptor.path)
+        if authenticator is None or not authenticator.plugged:
+            raise OSError(f"{descriptor.path} is not connected")
+        return VirtualCtapDevice(self._descriptors[descriptor.path], authenticator)
+
+    def event_source(self) -> FakeEventSource:
+        return self._source
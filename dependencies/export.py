@@ -0,0 +1,225 @@
+"""Stream an inventory of the attached keys to JSON Lines or CSV.
+
+Keys are visited one at a time and every record is written and flushed as
+soon as it is collected, so memory use does not grow with the number of keys
+and an interrupted export leaves a valid file behind. A key that fails or is
+pulled while it is being read is not written; run the export again with
+resume=True to append the keys that are still missing.
+
+    summary = export_inventory(Fido2Manager(), "keys.jsonl", pin="123456")
+    summary = export_inventory(manager, "keys.csv", resume=True)
+
+Without a PIN only what getInfo reports is exported. With one, fingerprint
+names and discoverable credential counts are read too; every key is asked
+with that same PIN, and a wrong one uses up one of that key's retries.
+"""
+import csv
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from fido2.ctap import CtapError
+from fido2.ctap2 import ClientPin
+
+from .inventory import jsonable
+from .manager import Fido2Manager
+
+
+JSONL = "jsonl"
+CSV = "csv"
+
+FIELDS = [
+    "path", "serial_number", "vendor_id", "product_id", "product_string",
+    "aaguid", "versions", "extensions", "options", "has_pin", "bio",
+    "fingerprints", "credentials_existing", "credentials_remaining", "error",
+]
+
+
+class ExportSummary:
+    def __init__(self):
+        self.written = 0
+        self.skipped = 0
+        self.failed: Dict[Any, str] = {}
+        self.cancelled = False
+
+    @property
+    def complete(self) -> bool:
+        return not self.failed and not self.cancelled
+
+    def __repr__(self):
+        return (f"ExportSummary(written={self.written}, skipped={self.skipped}, "
+                f"failed={len(self.failed)}, cancelled={self.cancelled})")
+
+
+def record_key(record: Dict[str, Any]) -> str:
+    """Identify a key across exports: its serial number if it reports one, else its path."""
+    return str(record.get("serial_number") or record["path"])
+
+
+def inventory_record(manager: Fido2Manager, device: Dict[str, Any],
+                     pin: Optional[str] = None) -> Dict[str, Any]:
+    """Collect the record of the key manager is bound to (see Fido2Manager.for_device).
+
+    A CTAP error from the PIN protected part ends up in the record's error
+    field; anything else, like the key being pulled, is raised.
+    """
+    info = manager.get_info()
+    record = {field: None for field in FIELDS}
+    record.update({k: v for k, v in device.items() if k in record})
+    record.update({k: v for k, v in info.items() if k in record})
+    record["has_pin"] = manager.has_pin()
+    record["bio"] = manager.support_bio()
+    if pin and record["has_pin"]:
+        credman = manager.support_credential_management()
+        try:
+            if record["bio"] and credman:
+                # One PIN token exchange for both instead of one each.
+                manager.prepare_token(
+                    pin, ClientPin.PERMISSION.BIO_ENROLL | ClientPin.PERMISSION.CREDENTIAL_MGMT)
+            if record["bio"]:
+                record["fingerprints"] = [
+                    {"id": tid.hex(), "name": name}
+                    for tid, name in manager.list_fingerprints(pin).items()]
+            if credman:
+                metadata = manager.credential_metadata(pin)
+                record["credentials_existing"] = metadata["existing"]
+                record["credentials_remaining"] = metadata["remaining"]
+        except CtapError as e:
+            record["error"] = str(e)
+        finally:
+            manager.drop_token_sessions(device["path"])
+    return record
+
+
+class _Writer(ABC):
+
+    def __init__(self, path: str, resume: bool):
+        self.path = path
+        self.done: Set[str] = set()
+        if resume and os.path.exists(path):
+            self._truncate_partial_line()
+            self.done = set(self._read_keys())
+            self.file = open(path, "a", newline="", encoding="utf-8")
+        else:
+            self.file = open(path, "w", newline="", encoding="utf-8")
+        self._start()
+
+    def _truncate_partial_line(self):
+        # A crash in the middle of a write leaves half a line at the end.
+        end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    end += len(line)
+        if end != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    @abstractmethod
+    def _read_keys(self) -> Iterator[str]:
+        """record_key() of every record already in the file."""
+
+    def _start(self):
+        pass
+
+    @abstractmethod
+    def write(self, record: Dict[str, Any]):
+        """Append one record and flush it."""
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter(_Writer):
+
+    def _read_keys(self) -> Iterator[str]:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield record_key(json.loads(line))
+
+    def write(self, record: Dict[str, Any]):
+        self.file.write(json.dumps(record, default=jsonable) + "\n")
+        self.file.flush()
+
+
+class CsvWriter(_Writer):
+
+    def _read_keys(self) -> Iterator[str]:
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield record_key(row)
+
+    def _start(self):
+        self.writer = csv.DictWriter(self.file, FIELDS, lineterminator="\n")
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, record: Dict[str, Any]):
+        self.writer.writerow({k: _flatten(v) for k, v in record.items()})
+        self.file.flush()
+
+
+WRITERS = {JSONL: JsonlWriter, CSV: CsvWriter}
+
+
+def _flatten(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return ";".join(f"{k}={_flatten(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return ";".join(
+            (v.get("name") or v.get("id", "")) if isinstance(v, dict) else _flatten(v)
+            for v in value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+def format_for(path: str) -> str:
+    return CSV if path.lower().endswith(".csv") else JSONL
+
+
+def export_inventory(manager: Fido2Manager, path: str, fmt: Optional[str] = None,
+                     pin: Optional[str] = None, resume: bool = False,
+                     on_progress: Optional[Callable[[Any, str], None]] = None,
+                     cancel: Optional[threading.Event] = None) -> ExportSummary:
+    """Write one record per attached key to path, as JSONL or CSV (by extension if fmt is None).
+
+    on_progress(path, state) is called with "written", "skipped" or
+    "failed" after each key. Setting cancel stops after the current key.
+    """
+    writer = WRITERS[fmt or format_for(path)](path, resume)
+    report = on_progress or (lambda path, state: None)
+    summary = ExportSummary()
+    try:
+        devices: List[Dict[str, Any]] = manager.discover()
+        for device in devices:
+            if cancel is not None and cancel.is_set():
+                summary.cancelled = True
+                break
+            device_path = device["path"]
+            if resume and record_key(device) in writer.done:
+                summary.skipped += 1
+                report(device_path, "skipped")
+                continue
+            try:
+                record = manager.submit(
+                    device_path, lambda m: inventory_record(m, device, pin)).result()
+            except Exception as e:
+                if not isinstance(e, CtapError):
+                    # Most likely pulled: make the next discover() open it afresh.
+                    manager.forget_device(device_path)
+                summary.failed[device_path] = str(e)
+                report(device_path, "failed")
+                continue
+            writer.write(record)
+            writer.done.add(record_key(record))
+            summary.written += 1
+            report(device_path, "written")
+    finally:
+        writer.close()
+    return summary
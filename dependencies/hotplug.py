@@ -0,0 +1,286 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+import select
+import socket
+import struct
+import sys
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+
+DEVICE_ADDED = "added"
+DEVICE_REMOVED = "removed"
+
+NETLINK_KOBJECT_UEVENT = 15
+_KERNEL_GROUP = 1
+_UDEV_GROUP = 2
+_UDEV_MAGIC = 0xFEEDCAFE
+
+logger = logging.getLogger(__name__)
+
+
+class HotplugEvent:
+    def __init__(self, kind: str, path):
+        self.kind = kind
+        self.path = path
+
+    def __repr__(self):
+        return f"HotplugEvent({self.kind!r}, {self.path!r})"
+
+
+def _list_fido_paths() -> Set:
+    # Imported here so the fake source can be used without a HID backend.
+    from fido2.hid import list_descriptors
+    return {d.path for d in list_descriptors()}
+
+
+class EventSource(ABC):
+    """Tells the monitor when the set of FIDO devices may have changed.
+
+    wait() blocks until the OS reports a change, the source decides a rescan
+    is due, or wake() is called. scan() returns the paths present right now.
+    """
+
+    def scan(self) -> Set:
+        return _list_fido_paths()
+
+    @abstractmethod
+    def wait(self) -> bool:
+        """Block until a rescan is due."""
+
+    def notify(self, changed: bool):
+        """Called by the monitor after every scan."""
+
+    @abstractmethod
+    def wake(self):
+        """Make a blocked wait() return, from any thread."""
+
+    def close(self):
+        pass
+
+
+class PollingEventSource(EventSource):
+    """Rescans on a timer that shortens after a change and backs off while idle."""
+
+    def __init__(self, min_interval: float = 0.25, max_interval: float = 3.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._wakeup = threading.Event()
+
+    def wait(self) -> bool:
+        self._wakeup.wait(self.interval)
+        self._wakeup.clear()
+        return True
+
+    def notify(self, changed: bool):
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+    def wake(self):
+        self._wakeup.set()
+
+
+class NetlinkEventSource(EventSource):
+    """Linux uevent listener that wakes the monitor on hidraw add/remove.
+
+    Both the kernel and the udev multicast groups are joined: the kernel
+    message arrives first, the udev one after rules have set permissions on
+    the node, so a key that could not be opened yet is picked up on the
+    second scan. A periodic rescan covers systems where no events arrive.
+    """
+
+    def __init__(self, settle: float = 0.05, rescan_interval: float = 30.0):
+        self.settle = settle
+        self.rescan_interval = rescan_interval
+        self._sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_KOBJECT_UEVENT)
+        self._sock.bind((0, _KERNEL_GROUP | _UDEV_GROUP))
+        self._sock.setblocking(False)
+        self._wake_r, self._wake_w = os.pipe()
+
+    def wait(self) -> bool:
+        timeout = self.rescan_interval
+        while True:
+            ready, _, _ = select.select([self._sock, self._wake_r], [], [], timeout)
+            if not ready:
+                return True
+            if self._wake_r in ready:
+                os.read(self._wake_r, 64)
+                return True
+            if self._drain():
+                # A replug produces a burst of uevents, gather it into one scan.
+                timeout = self.settle
+                while select.select([self._sock], [], [], timeout)[0]:
+                    self._drain()
+                return True
+
+    def _drain(self) -> bool:
+        relevant = False
+        while True:
+            try:
+                data = self._sock.recv(16384)
+            except BlockingIOError:
+                return relevant
+            if parse_uevent(data).get("SUBSYSTEM") == "hidraw":
+                relevant = True
+
+    def wake(self):
+        os.write(self._wake_w, b"\0")
+
+    def close(self):
+        self._sock.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+
+def parse_uevent(data: bytes) -> Dict[str, str]:
+    """Parse a kernel or udev netlink uevent message into its properties."""
+    if data.startswith(b"libudev\0"):
+        magic, _, props_off, props_len = struct.unpack_from("!I", data, 8) + \
+            struct.unpack_from("=III", data, 12)
+        if magic != _UDEV_MAGIC:
+            return {}
+        body = data[props_off:props_off + props_len]
+    else:
+        # Kernel messages start with "action@devpath" before the properties.
+        body = data.split(b"\0", 1)[1] if b"\0" in data else b""
+    props = {}
+    for field in body.split(b"\0"):
+        key, sep, value = field.partition(b"=")
+        if sep:
+            props[key.decode(errors="replace")] = value.decode(errors="replace")
+    return props
+
+
+class FakeEventSource(EventSource):
+    """In-memory source for exercising hotplug consumers without hardware."""
+
+    def __init__(self, paths: Iterable = ()):
+        self._paths = set(paths)
+        self._cond = threading.Condition()
+        self._pending = False
+
+    def plug(self, path):
+        with self._cond:
+            self._paths.add(path)
+            self._pending = True
+            self._cond.notify_all()
+
+    def unplug(self, path):
+        with self._cond:
+            self._paths.discard(path)
+            self._pending = True
+            self._cond.notify_all()
+
+    def scan(self) -> Set:
+        with self._cond:
+            return set(self._paths)
+
+    def wait(self) -> bool:
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending)
+            self._pending = False
+        return True
+
+    def wake(self):
+        with self._cond:
+            self._pending = True
+            self._cond.notify_all()
+
+
+def default_event_source() -> EventSource:
+    if sys.platform.startswith("linux"):
+        try:
+            return NetlinkEventSource()
+        except OSError:
+            pass
+    return PollingEventSource()
+
+
+class HotplugMonitor:
+    """Background thread that turns event source wake-ups into added/removed events.
+
+    Subscribers are called on the monitor thread with a HotplugEvent. Devices
+    present when the monitor starts are reported as added.
+    """
+
+    def __init__(self, source: Optional[EventSource] = None):
+        self.source = source or default_event_source()
+        self.present: Set = set()
+        self._subscribers: List[Callable[[HotplugEvent], None]] = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._scanned = threading.Event()
+
+    def subscribe(self, callback: Callable[[HotplugEvent], None]) -> Callable[[], None]:
+        """Register callback and return a function that unregisters it."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="hotplug-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self.source.wake()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.source.close()
+
+    def wait_for_scan(self, timeout: Optional[float] = None) -> bool:
+        """Block until the first scan has filled in present."""
+        return self._scanned.wait(timeout)
+
+    def rescan(self):
+        """Ask for an immediate scan, e.g. when the user presses Refresh."""
+        self.source.wake()
+
+    def _run(self):
+        self._scan()
+        self._scanned.set()
+        while self._running:
+            self.source.wait()
+            if not self._running:
+                break
+            self.source.notify(self._scan())
+
+    def _scan(self) -> bool:
+        try:
+            current = self.source.scan()
+        except Exception:
+            logger.warning("Device scan failed", exc_info=True)
+            return False
+        added = current - self.present
+        removed = self.present - current
+        self.present = current
+        for path in removed:
+            self._emit(HotplugEvent(DEVICE_REMOVED, path))
+        for path in added:
+            self._emit(HotplugEvent(DEVICE_ADDED, path))
+        return bool(added or removed)
+
+    def _emit(self, event: HotplugEvent):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Hotplug subscriber failed on %r", event)
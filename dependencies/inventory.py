@@ -0,0 +1,215 @@
+"""Local SQLite store of every key the manager has seen.
+
+Fido2Manager records into a DeviceInventory when it is given one: the
+descriptor of each key on discover(), the getInfo snapshot whenever it is
+read from the key and the number of enrolled fingerprints after listing
+them. The GUI shows what the store knows about the keys attached at the end
+of the previous run before live discovery has finished, and the store can be
+queried by AAGUID, product and last-seen time:
+
+    inventory = DeviceInventory()
+    inventory.find(aaguid="2fc0579f811347eab116bb5a8db9202a", seen_since=time.time() - 7 * 86400)
+
+Keys are identified by serial number when they report one and by device
+path otherwise. A failing write is logged and never breaks the device
+operation that triggered it.
+"""
+import dataclasses
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_ENV = "FIDO2KM_INVENTORY"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    key TEXT PRIMARY KEY,
+    path TEXT,
+    serial_number TEXT,
+    vendor_id INTEGER,
+    product_id INTEGER,
+    product_string TEXT,
+    aaguid TEXT,
+    versions TEXT,
+    options TEXT,
+    info TEXT,
+    fingerprint_count INTEGER,
+    present INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS devices_aaguid ON devices (aaguid);
+CREATE INDEX IF NOT EXISTS devices_product ON devices (vendor_id, product_id);
+CREATE INDEX IF NOT EXISTS devices_product_string ON devices (product_string);
+CREATE INDEX IF NOT EXISTS devices_last_seen ON devices (last_seen);
+"""
+_JSON_COLUMNS = ("versions", "options", "info")
+
+
+def data_dir() -> str:
+    """Per-user directory for the files the GUI and the CLI keep between runs."""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "fido2km")
+
+
+def default_inventory_path() -> Optional[str]:
+    """Where the GUI and the CLI keep their inventory; None if FIDO2KM_INVENTORY is set empty."""
+    path = os.environ.get(INVENTORY_ENV)
+    if path is not None:
+        return path or None
+    return os.path.join(data_dir(), "inventory.sqlite3")
+
+
+def open_default_inventory() -> Optional["DeviceInventory"]:
+    """Open the default store, or return None if it is disabled or cannot be opened."""
+    path = default_inventory_path()
+    if path is None:
+        return None
+    try:
+        return DeviceInventory(path)
+    except (OSError, sqlite3.Error):
+        logger.warning("Device inventory %s is not available", path, exc_info=True)
+        return None
+
+
+def device_key(device: Dict[str, Any]) -> str:
+    return str(device.get("serial_number") or device["path"])
+
+
+def jsonable(value):
+    """value made JSON serializable: bytes as hex, containers converted, the rest as str.
+
+    Use it on the data to dump or as json.dumps(..., default=jsonable).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [jsonable(v) for v in value]
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def _info_dict(info) -> Dict[str, Any]:
+    if dataclasses.is_dataclass(info):
+        return {f.name: getattr(info, f.name) for f in dataclasses.fields(info)}
+    return dict(info)
+
+
+class DeviceInventory:
+    """Thread-safe SQLite inventory; use ":memory:" as path for a throwaway one."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _write(self, statements):
+        """Run (sql, params) pairs in one transaction, logging instead of raising on failure."""
+        try:
+            with self._lock, self._db:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+        except sqlite3.Error:
+            logger.warning("Could not update device inventory %s", self.path, exc_info=True)
+
+    def record_seen(self, devices: List[Dict[str, Any]], now: Optional[float] = None):
+        """Store the result of a discover(): these keys are attached, all others are not."""
+        now = time.time() if now is None else now
+        statements = [("UPDATE devices SET present = 0 WHERE present = 1", ())]
+        for d in devices:
+            statements.append((
+                "INSERT INTO devices (key, path, serial_number, vendor_id, product_id, product_string,"
+                " present, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET path = excluded.path,"
+                " vendor_id = excluded.vendor_id, product_id = excluded.product_id,"
+                " product_string = excluded.product_string, present = 1, last_seen = excluded.last_seen",
+                (device_key(d), str(d["path"]), d.get("serial_number"), d.get("vendor_id"),
+                 d.get("product_id"), d.get("product_string"), now, now)))
+        self._write(statements)
+
+    def record_info(self, device: Dict[str, Any], info, now: Optional[float] = None):
+        """Store a getInfo snapshot (a fido2 Info or a mapping) of a key."""
+        now = time.time() if now is None else now
+        info = _info_dict(info)
+        aaguid = info.get("aaguid")
+        self._write([(
+            "UPDATE devices SET aaguid = ?, versions = ?, options = ?, info = ?, last_seen = ?"
+            " WHERE key = ?",
+            (aaguid.hex() if isinstance(aaguid, (bytes, bytearray)) else aaguid,
+             json.dumps(info.get("versions"), default=jsonable),
+             json.dumps(info.get("options"), default=jsonable),
+             json.dumps(info, default=jsonable), now, device_key(device)))])
+
+    def record_fingerprints(self, device: Dict[str, Any], count: int):
+        self._write([("UPDATE devices SET fingerprint_count = ? WHERE key = ?",
+                      (count, device_key(device)))])
+
+    def last_known(self) -> List[Dict[str, Any]]:
+        """The keys that were attached at the last recorded discover(), most recently seen first."""
+        return self._query("SELECT * FROM devices WHERE present = 1 ORDER BY last_seen DESC, key", ())
+
+    def get(self, device: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM devices WHERE key = ?", (device_key(device),))
+        return rows[0] if rows else None
+
+    def find(self, aaguid: Optional[str] = None, vendor_id: Optional[int] = None,
+             product_id: Optional[int] = None, product_string: Optional[str] = None,
+             seen_since: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Look keys up by any combination of indexed columns, most recently seen first."""
+        where, params = [], []
+        for column, value in (("aaguid", aaguid), ("vendor_id", vendor_id),
+                              ("product_id", product_id), ("product_string", product_string)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if seen_since is not None:
+            where.append("last_seen >= ?")
+            params.append(seen_since)
+        sql = "SELECT * FROM devices"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY last_seen DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def _query(self, sql: str, params) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        result = []
+        for row in rows:
+            item = dict(row)
+            for column in _JSON_COLUMNS:
+                if item[column] is not None:
+                    item[column] = json.loads(item[column])
+            item["present"] = bool(item["present"])
+            result.append(item)
+        return result
@@ -1,46 +1,385 @@
-from typing import List, Optional, Dict, Any, Callable
-from fido2.hid import CtapHidDevice
+from typing import List, Optional, Dict, Any, Callable, Hashable, Iterator, Tuple, Union
+from concurrent.futures import Future
+import copy
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from fido2.ctap import CtapDevice, CtapError
 from fido2.ctap2 import ClientPin
-from fido2.ctap2.base import Ctap2
+from fido2.ctap2.base import Ctap2, Info
+from fido2.ctap2.pin import PinProtocol
 from fido2.ctap2.bio import BioEnrollment, FPBioEnrollment, CaptureError
+from fido2.ctap2.credman import CredentialManagement
+from .transport import DeviceProvider, default_provider
+from .metrics import CommandMetrics, InstrumentedDevice
+from .inventory import DeviceInventory
+from .pool import DEFAULT_IDLE_TTL, SessionPool
+from .retry import RetryPolicy, RetryStats
+from .scheduler import DeviceScheduler, PRIORITY_COMMAND, PRIORITY_INFO
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TOKEN_TTL = 120.0
+
+# Errors an authenticator answers with when it no longer accepts a token we hold.
+TOKEN_REJECTED_ERRORS = (
+    CtapError.ERR.PIN_AUTH_INVALID,
+    CtapError.ERR.PIN_TOKEN_EXPIRED,
+    CtapError.ERR.UNAUTHORIZED_PERMISSION,
+)
+
+# Answers of keys that cannot grant several permissions in one token.
+PERMISSIONS_REFUSED_ERRORS = (
+    CtapError.ERR.UNAUTHORIZED_PERMISSION,
+    CtapError.ERR.INVALID_PARAMETER,
+    CtapError.ERR.UNSUPPORTED_OPTION,
+)
+
+
+SAMPLE_FEEDBACK = {
+    FPBioEnrollment.FEEDBACK.FP_TOO_HIGH: "Finger too high",
+    FPBioEnrollment.FEEDBACK.FP_TOO_LOW: "Finger too low",
+    FPBioEnrollment.FEEDBACK.FP_TOO_LEFT: "Finger too far left",
+    FPBioEnrollment.FEEDBACK.FP_TOO_RIGHT: "Finger too far right",
+    FPBioEnrollment.FEEDBACK.FP_TOO_FAST: "Finger moved too fast",
+    FPBioEnrollment.FEEDBACK.FP_TOO_SLOW: "Finger moved too slow",
+    FPBioEnrollment.FEEDBACK.FP_POOR_QUALITY: "Poor quality sample",
+    FPBioEnrollment.FEEDBACK.FP_TOO_SKEWED: "Finger too skewed",
+    FPBioEnrollment.FEEDBACK.FP_TOO_SHORT: "Finger lifted too early",
+    FPBioEnrollment.FEEDBACK.FP_MERGE_FAILURE: "Sample did not match the previous ones",
+    FPBioEnrollment.FEEDBACK.FP_EXISTS: "This fingerprint is already enrolled",
+    FPBioEnrollment.FEEDBACK.FP_DATABASE_FULL: "No room left for another fingerprint",
+    FPBioEnrollment.FEEDBACK.NO_USER_ACTIVITY: "No finger detected",
+    FPBioEnrollment.FEEDBACK.NO_UP_TRANSITION: "Lift your finger between samples",
+}
+
+
+def sample_message(status: int, remaining: Optional[int]) -> str:
+    """Describe the outcome of one enrollment sample for the user."""
+    if remaining == 0:
+        return "Fingerprint captured."
+    text = SAMPLE_FEEDBACK.get(status)
+    more = f"{remaining} more scans needed. touch sensor now ..."
+    return f"{text}. {more}" if text else more
 
 
 class DeviceNotSelectedError(Exception):
     pass
 
 
-class Fido2Manager:
+class PinTokenSession:
+    """A pinUvAuthToken obtained for one device and a set of permissions.
+
+    The token is kept in a bytearray so it can be wiped in place once the
+    session expires or its device goes away.
+    """
+
+    def __init__(self, path, permissions: ClientPin.PERMISSION, protocol: PinProtocol,
+                 token: bytes, pin: str, ttl: float):
+        self.path = path
+        self.permissions = permissions
+        self.protocol = protocol
+        self.token = bytearray(token)
+        self.expires_at = time.monotonic() + ttl
+        self.bio: Optional[FPBioEnrollment] = None
+        self.credman: Optional[CredentialManagement] = None
+        self._pin_digest = _pin_digest(pin)
+
+    def expired(self) -> bool:
+        return not self.token or time.monotonic() >= self.expires_at
+
+    def covers(self, permissions: ClientPin.PERMISSION, pin: str) -> bool:
+        """Check if this session can serve a request made with the given permissions and PIN."""
+        return (
+            not self.expired()
+            and (self.permissions & permissions) == permissions
+            and hmac.compare_digest(self._pin_digest, _pin_digest(pin))
+        )
+
+    def zeroize(self):
+        for i in range(len(self.token)):
+            self.token[i] = 0
+        self.token = bytearray()
+        self.bio = None
+        self.credman = None
+        self._pin_digest = b""
+
+
+def _pin_digest(pin: str) -> bytes:
+    return hashlib.sha256(pin.encode()).digest()
+
+
+class CredentialCache:
+    """What credential management has read from one key, until it changes.
+
+    Lists are only stored once an enumeration ran to completion.
+    """
+
     def __init__(self):
+        self.metadata: Optional[Dict[str, int]] = None
+        self.rps: Optional[List[Dict[str, Any]]] = None
+        self.credentials: Dict[bytes, List[Dict[str, Any]]] = {}
+
+
+class Fido2Manager:
+    def __init__(self, token_ttl: float = DEFAULT_TOKEN_TTL,
+                 provider: Optional[DeviceProvider] = None,
+                 metrics: Optional[CommandMetrics] = None,
+                 inventory: Optional[DeviceInventory] = None,
+                 max_sessions: Optional[int] = None,
+                 idle_ttl: Optional[float] = DEFAULT_IDLE_TTL,
+                 retry_policy: Optional[RetryPolicy] = None):
+        """max_sessions caps the device handles kept open at once, idle_ttl
+        closes those unused for that many seconds (None for no limit).
+        retry_policy decides how transient errors are retried, see retry.py."""
+        self.provider = provider or default_provider()
+        self.metrics = metrics
+        self.inventory = inventory
         self.devices = []
-        self.selected = None
+        self.enroller = None
+        self.token_ttl = token_ttl
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_stats = RetryStats()
+        self.pool = SessionPool(self._open, max_sessions, idle_ttl)
+        self._descriptors: Dict[Any, Any] = {}
+        self._selected_path = None
+        self.scheduler = DeviceScheduler(self)
+        self._discover_lock = threading.RLock()
+        self._info_cache: Dict[Any, Info] = {}
+        self._token_sessions: Dict[Any, PinTokenSession] = {}
+        self._credential_cache: Dict[Any, CredentialCache] = {}
 
     def discover(self) -> List[Dict[str, Any]]:
-        found = []
-        self.devices = list(CtapHidDevice.list_devices())
-        for dev in self.devices:
-            found.append({
-                "path": dev.descriptor.path,
-                "vendor_id": getattr(dev.descriptor, "vid", None),
-                "product_id": getattr(dev.descriptor, "pid", None),
-                "product_string": getattr(dev.descriptor, "product_name", None),
-            })
-        return found
-
-    def select_device(self, index: int):
+        """Sync the known keys with the ones currently attached.
+
+        No key is opened here: its session is opened by the first command
+        that needs it and reused from the pool afterwards. Keys that went away
+        are forgotten and sessions idle for longer than the pool's TTL closed.
+        """
+        with self._discover_lock:
+            descriptors = {d.path: d for d in self.provider.list_descriptors()}
+            for path in list(self._descriptors):
+                if path not in descriptors:
+                    self.forget_device(path)
+            # Updated in place, for_device() views share this dict.
+            self._descriptors.update(descriptors)
+            self.pool.evict_idle()
+            for path, session in list(self._token_sessions.items()):
+                if session.expired():
+                    self.drop_token_sessions(path)
+            self.devices = list(descriptors.values())
+            described = [self._describe(d) for d in self.devices]
+        if self.inventory is not None:
+            self.inventory.record_seen(described)
+        return described
+
+    def _open(self, descriptor) -> CtapDevice:
+        dev = self.provider.open(descriptor)
+        if self.metrics is not None:
+            dev = InstrumentedDevice(dev, self.metrics)
+        return dev
+
+    def _describe(self, descriptor) -> Dict[str, Any]:
+        return {
+            "path": descriptor.path,
+            "vendor_id": getattr(descriptor, "vid", None),
+            "product_id": getattr(descriptor, "pid", None),
+            "product_string": getattr(descriptor, "product_name", None),
+            "serial_number": getattr(descriptor, "serial_number", None),
+        }
+
+    def forget_device(self, path):
+        """Close the session of a key and drop everything cached about it.
+
+        Call this when the key is known to be unplugged, so that a replug at
+        the same path gets a fresh handle after the next discover().
+        """
+        with self._discover_lock:
+            descriptor = self._descriptors.pop(path, None)
+            if descriptor is not None:
+                self.devices = [d for d in self.devices if d is not descriptor]
+        if self._selected_path == path:
+            self._selected_path = None
+            self.enroller = None
+        self.invalidate_info(path)
+        self.invalidate_credentials(path)
+        self.drop_token_sessions(path)
+        self.pool.discard(path)
+
+    def for_device(self, path) -> "Fido2Manager":
+        """Return a manager bound to one key, for running work on several keys at once.
+
+        The returned manager shares the session pool, info and credential caches
+        and token sessions with this one but has its own selection, so each thread can
+        drive its own key. Call discover() on this manager first.
+        """
+        view = copy.copy(self)
+        view.devices = list(self.devices)
+        view._selected_path = None
+        view.enroller = None
+        view.select_device(path)
+        return view
+
+    def submit(self, path, fn: Callable[["Fido2Manager"], Any], priority: int = PRIORITY_COMMAND,
+               coalesce: Optional[Hashable] = None,
+               event: Optional[threading.Event] = None) -> Future:
+        """Queue fn(manager bound to path) on that key's command queue, see scheduler.py.
+
+        Use this rather than for_device() from threads that may run next to
+        others on the same key; path None queues on this manager itself.
+        """
+        return self.scheduler.submit(path, fn, priority, coalesce, event)
+
+    def request_info(self, path, refresh: bool = False) -> Future:
+        """getInfo of a key as a future; concurrent requests share one round trip."""
+        return self.submit(path, lambda m: m.get_info(refresh), PRIORITY_INFO,
+                           coalesce=("get_info", refresh))
+
+    def cancel(self, path) -> int:
+        """Interrupt the running command of a key and drop its queued user presence ones.
+
+        Then, before anything else queued for the key, forget its PIN token
+        and getInfo snapshot; an interrupted command may have left either stale.
+        """
+        return self.scheduler.cancel(path, cleanup=lambda m: m._after_cancel())
+
+    def _after_cancel(self):
+        # An interrupted enrollment already sent ENROLL_CANCEL while unwinding.
+        self._invalidate_selected()
+        self.drop_token_sessions(self._selected_path)
+
+    def close(self):
+        """Wait for queued commands to be cancelled, then close every open device session."""
+        self.scheduler.close()
+        for path in list(self._descriptors):
+            self.forget_device(path)
+        self.pool.close()
+        self.devices = []
+
+    @property
+    def selected_path(self):
+        """Path of the selected key, None when none is or it was forgotten since."""
+        return self._selected_path if self._selected_path in self._descriptors else None
+
+    @property
+    def selected(self) -> Optional[Tuple[CtapDevice, Ctap2]]:
+        """(device, Ctap2) of the selected key, or None.
+
+        Comes from the session pool, so a session it found broken or evicted
+        is opened again here.
+        """
+        descriptor = self._descriptors.get(self._selected_path)
+        if descriptor is None:
+            return None
+        session = self.pool.acquire(descriptor)
+        return session.device, session.ctap
+
+    def select_device(self, device: Union[int, Any]):
+        """Select a key by its path, or by its index in the last discover() result."""
         if not self.devices:
             raise RuntimeError("No devices discovered")
-        dev = self.devices[index]
-        ctap = Ctap2(dev)
-        self.selected = (dev, ctap)
+        if isinstance(device, int):
+            descriptor = self.devices[device]
+        else:
+            descriptor = self._descriptors.get(device)
+            if descriptor is None:
+                raise RuntimeError(f"Device {device} is not connected")
+        # A new session's Ctap2() already sent getInfo, reuse its answer instead of asking again.
+        info = self._retry("select", lambda: self.pool.acquire(descriptor).take_info())
+        self._selected_path = descriptor.path
+        if info is not None:
+            self._info_cache[descriptor.path] = info
+            if self.inventory is not None:
+                self.inventory.record_info(self._describe(descriptor), info)
         return self.get_info()
 
-    def get_info(self) -> Dict[str, Any]:
-        if not self.selected:
+    def _ctap_info(self, refresh: bool = False) -> Info:
+        """Return the getInfo snapshot of the selected key, querying it only on a cache miss."""
+        path = self._selected_path
+        info = None if refresh else self._info_cache.get(path)
+        if info is None:
+            if path not in self._descriptors:
+                raise DeviceNotSelectedError()
+            info = self._retry("getInfo", lambda: self.selected[1].get_info())
+            self._info_cache[path] = info
+            if self.inventory is not None:
+                self.inventory.record_info(self._describe(self._descriptors[path]), info)
+        return info
+
+    def _retry(self, operation: str, fn: Callable[[], Any], idempotent: bool = True):
+        """Run fn under the retry policy, counting its retries in retry_stats.
+
+        fn must fetch self.selected itself, so that a retry after an I/O error
+        goes to the reopened session.
+        """
+        return self.retry_policy.run(fn, operation, self.retry_stats, idempotent)
+
+    def invalidate_info(self, path=None):
+        """Drop the cached getInfo snapshot of one device, or of all devices when path is None."""
+        if path is None:
+            self._info_cache.clear()
+        else:
+            self._info_cache.pop(path, None)
+
+    def _invalidate_selected(self):
+        if self._selected_path is not None:
+            self.invalidate_info(self._selected_path)
+
+    def drop_token_sessions(self, path=None):
+        """Zeroize and forget the PIN token of one device, or of all devices when path is None."""
+        paths = list(self._token_sessions) if path is None else [path]
+        for p in paths:
+            session = self._token_sessions.pop(p, None)
+            if session:
+                session.zeroize()
+
+    def _token_session(self, pin: str, permissions: ClientPin.PERMISSION) -> PinTokenSession:
+        """Return a live token session for the selected key, acquiring a new one if needed.
+
+        An authenticator only honours the token it issued last, so there is at
+        most one session per device; asking for permissions the current one
+        lacks replaces it.
+        """
+        path = self._selected_path
+        if path not in self._descriptors:
             raise DeviceNotSelectedError()
-        dev, ctap = self.selected
-        info = ctap.get_info()
+        session = self._token_sessions.get(path)
+        if session and session.covers(permissions, pin):
+            return session
+        self.drop_token_sessions(path)
+        client_pin = ClientPin(self.selected[1])
+        token = client_pin.get_pin_token(pin, permissions)
+        session = PinTokenSession(
+            path, permissions, client_pin.protocol, token, pin, self.token_ttl)
+        self._token_sessions[path] = session
+        return session
+
+    def prepare_token(self, pin: str, permissions: ClientPin.PERMISSION) -> bool:
+        """Get one token covering all of permissions, for a caller about to use each of them.
+
+        Returns False if the key refuses the combination; the operations then
+        get a token of their own as usual.
+        """
+        try:
+            self._retry("getPinToken", lambda: self._token_session(pin, permissions))
+        except CtapError as e:
+            if e.code not in PERMISSIONS_REFUSED_ERRORS:
+                raise
+            return False
+        return True
+
+    def refresh_info(self) -> Dict[str, Any]:
+        """Re-read getInfo from the selected key, bypassing the cache."""
+        return self.get_info(refresh=True)
+
+    def get_info(self, refresh: bool = False) -> Dict[str, Any]:
+        info = self._ctap_info(refresh)
         return {
-            "path": dev.descriptor.path,
+            "path": self._selected_path,
             "versions": info.versions,
             "aaguid": getattr(info, "aaguid", b"").hex(),
             "extensions": list(getattr(info, "extensions", [])),
@@ -48,92 +387,362 @@ class Fido2Manager:
         }
 
     def set_pin(self, new_pin: str, current_pin: Optional[str] = None) -> bool:
-        pin = ClientPin(self.selected[1])
-        if current_pin:
-            pin.change_pin(current_pin, new_pin)
-        else:
-            pin.set_pin(new_pin)
+        def run():
+            pin = ClientPin(self.selected[1])
+            if current_pin:
+                pin.change_pin(current_pin, new_pin)
+            else:
+                pin.set_pin(new_pin)
+
+        try:
+            self._retry("changePin" if current_pin else "setPin", run, idempotent=False)
+        finally:
+            self._invalidate_selected()
+            # Changing the PIN revokes every token the key has handed out.
+            self.drop_token_sessions(self._selected_path)
         return True
 
     def change_pin(self, current_pin: str, new_pin: str) -> bool:
         return self.set_pin(new_pin, current_pin)
 
-    def reset(self) -> bool:
-        _, ctap = self.selected
-        if hasattr(ctap, "reset"):
-            ctap.reset(event=None)
-            return True
-        raise RuntimeError("Reset not supported")
+    def reset(self, event=None) -> bool:
+        """Factory reset the selected key, retried only if the key refused to start it."""
+        def run():
+            _, ctap = self.selected
+            if not hasattr(ctap, "reset"):
+                raise RuntimeError("Reset not supported")
+            ctap.reset(event=event)
+
+        try:
+            self._retry("reset", run, idempotent=False)
+        finally:
+            self._invalidate_selected()
+            self.invalidate_credentials(self._selected_path)
+            self.drop_token_sessions(self._selected_path)
+        return True
 
     def has_pin(self) -> bool:
         """Check if the selected key has a PIN set."""
-        if not self.selected:
-            raise DeviceNotSelectedError()
-
-        _, ctap = self.selected
-        info = ctap.get_info()
+        info = self._ctap_info()
         options = getattr(info, "options", {})
         return options.get("clientPin", False)
 
     def support_bio(self) -> bool:
         """Check if the selected key support Biometric."""
-        _, ctap = self.selected
-        info = ctap.get_info()
-        return BioEnrollment.is_supported(info)
+        return BioEnrollment.is_supported(self._ctap_info())
 
     def can_add_fingerprint(self) -> bool:
         if not self.support_bio():
             raise RuntimeError('Device is not support biometric!')
-        _, ctap = self.selected
-        info = ctap.get_info()
+        info = self._ctap_info()
         if not info.options.get("clientPin"):
             raise RuntimeError("PIN not set for the device!")
         return True
 
     def _get_bio(self, pin: str):
-        _, ctap = self.selected
-        client_pin = ClientPin(ctap)
-        pin_token = client_pin.get_pin_token(
-            pin, ClientPin.PERMISSION.BIO_ENROLL)
-        return FPBioEnrollment(ctap, client_pin.protocol, pin_token)
+        session = self._token_session(pin, ClientPin.PERMISSION.BIO_ENROLL)
+        if not self._bound(session.bio):
+            # FPBioEnrollment() queries the modality, so build it once per session.
+            session.bio = FPBioEnrollment(self.selected[1], session.protocol, session.token)
+        return session.bio
+
+    def _bound(self, helper) -> bool:
+        """Check if helper was built on the selected key's current session, without I/O.
+
+        A helper on a session that was reopened since is rebuilt; a dead handle
+        that was not noticed yet fails the next command, and the retry reopens it.
+        """
+        return helper is not None and helper.ctap is self.pool.current_ctap(self._selected_path)
+
+    def _run_bio(self, pin: str, op: Callable[[FPBioEnrollment], Any], operation: str,
+                 idempotent: bool = True):
+        """Run op with a bio enrollment bound to the device's token session."""
+        return self._run_with_token(self._get_bio, pin, op, operation, idempotent)
+
+    def _run_with_token(self, get: Callable[[str], Any], pin: str, op: Callable[[Any], Any],
+                        operation: str, idempotent: bool = True):
+        """Run op on the helper get(pin) returns for the device's token session.
+
+        If the key rejects a reused token (it was power cycled, timed out or
+        another client took a new one), acquire a fresh token and try once more.
+        Transient errors are retried as operation under the retry policy.
+        """
+        def run():
+            try:
+                return op(get(pin))
+            except CtapError as e:
+                if e.code not in TOKEN_REJECTED_ERRORS:
+                    raise
+                self.drop_token_sessions(self._selected_path)
+                return op(get(pin))
+
+        return self._retry(operation, run, idempotent)
+
+    def support_credential_management(self) -> bool:
+        """Check if the selected key can list and delete discoverable credentials."""
+        return CredentialManagement.is_supported(self._ctap_info())
+
+    def _get_credman(self, pin: str) -> CredentialManagement:
+        session = self._token_session(pin, ClientPin.PERMISSION.CREDENTIAL_MGMT)
+        if not self._bound(session.credman):
+            if not self.support_credential_management():
+                raise RuntimeError("Device does not support credential management!")
+            session.credman = CredentialManagement(self.selected[1], session.protocol, session.token)
+        return session.credman
+
+    def _run_credman(self, pin: str, op: Callable[[CredentialManagement], Any], operation: str,
+                     idempotent: bool = True):
+        return self._run_with_token(self._get_credman, pin, op, operation, idempotent)
+
+    def _credentials_of_selected(self) -> CredentialCache:
+        path = self._selected_path
+        if path is None:
+            raise DeviceNotSelectedError()
+        cache = self._credential_cache.get(path)
+        if cache is None:
+            cache = self._credential_cache[path] = CredentialCache()
+        return cache
+
+    def invalidate_credentials(self, path=None):
+        """Drop what was read by credential management from one device, or from all when path is None."""
+        if path is None:
+            self._credential_cache.clear()
+        else:
+            self._credential_cache.pop(path, None)
+
+    def credential_metadata(self, pin: str, refresh: bool = False) -> Dict[str, int]:
+        """Return the number of stored discoverable credentials and how many more fit."""
+        cache = self._credentials_of_selected()
+        if cache.metadata is None or refresh:
+            result = self._run_credman(pin, lambda cm: cm.get_metadata(), "credentialMetadata")
+            cache.metadata = {
+                "existing": result[CredentialManagement.RESULT.EXISTING_CRED_COUNT],
+                "remaining": result[CredentialManagement.RESULT.MAX_REMAINING_COUNT],
+            }
+        return dict(cache.metadata)
+
+    def iter_relying_parties(self, pin: str, refresh: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield the RPs that have discoverable credentials on the selected key.
+
+        Every RP after the first costs one round trip and is yielded as soon as
+        it arrives. A finished enumeration is cached until a delete or reset.
+        The key keeps the enumeration state, so do not send it anything else
+        while the generator is consumed.
+        """
+        cache = self._credentials_of_selected()
+        if cache.rps is not None and not refresh:
+            return (dict(item) for item in cache.rps)
+        return self._enumerate_rps(pin, cache)
+
+    def _enumerate_rps(self, pin: str, cache: CredentialCache) -> Iterator[Dict[str, Any]]:
+        rps = []
+        for result in self._enumerate(
+                pin, lambda cm: cm.enumerate_rps_begin(), CredentialManagement.enumerate_rps_next,
+                CredentialManagement.RESULT.TOTAL_RPS):
+            rp = result[CredentialManagement.RESULT.RP]
+            item = {
+                "id": rp.get("id"),
+                "name": rp.get("name"),
+                "rp_id_hash": result[CredentialManagement.RESULT.RP_ID_HASH],
+            }
+            rps.append(item)
+            yield dict(item)
+        cache.rps = rps
+
+    def iter_credentials(self, pin: str, rp_id_hash: bytes,
+                         refresh: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield the discoverable credentials of one RP, see iter_relying_parties()."""
+        cache = self._credentials_of_selected()
+        if rp_id_hash in cache.credentials and not refresh:
+            return (dict(item) for item in cache.credentials[rp_id_hash])
+        return self._enumerate_credentials(pin, rp_id_hash, cache)
+
+    def _enumerate_credentials(self, pin: str, rp_id_hash: bytes,
+                               cache: CredentialCache) -> Iterator[Dict[str, Any]]:
+        R = CredentialManagement.RESULT
+        credentials = []
+        for result in self._enumerate(
+                pin, lambda cm: cm.enumerate_creds_begin(rp_id_hash),
+                CredentialManagement.enumerate_creds_next, R.TOTAL_CREDENTIALS):
+            user = result.get(R.USER) or {}
+            item = {
+                "rp_id_hash": rp_id_hash,
+                "credential_id": result[R.CREDENTIAL_ID]["id"],
+                "user_id": user.get("id"),
+                "user_name": user.get("name"),
+                "display_name": user.get("displayName"),
+                "public_key": result.get(R.PUBLIC_KEY),
+                "cred_protect": result.get(R.CRED_PROTECT),
+            }
+            credentials.append(item)
+            yield dict(item)
+        cache.credentials[rp_id_hash] = credentials
+
+    def _enumerate(self, pin: str, begin: Callable[[CredentialManagement], Any],
+                   next_: Callable[[CredentialManagement], Any], total_key: int):
+        # The key ties its enumeration to the token that began it and ends it
+        # on any other command, so the rest goes through that same helper even
+        # if the token session expires meanwhile; a new token would break it.
+        credman = None
+
+        def start(cm: CredentialManagement):
+            nonlocal credman
+            credman = cm
+            return begin(cm)
+
+        try:
+            first = self._run_credman(pin, start, "enumerateBegin")
+        except CtapError as e:
+            if e.code == CtapError.ERR.NO_CREDENTIALS:
+                return
+            raise
+        yield first
+        for _ in range(1, first.get(total_key, 1)):
+            yield next_(credman)
+
+    def delete_credential(self, pin: str, credential_id: bytes):
+        """Delete one discoverable credential from the selected key."""
+        try:
+            self._run_credman(
+                pin, lambda cm: cm.delete_cred({"type": "public-key", "id": credential_id}),
+                "deleteCredential", idempotent=False)
+        finally:
+            self.invalidate_credentials(self._selected_path)
 
     def cancel_enroll(self):
         if self.enroller:
             self.enroller.cancel()
 
+    def enroll_fingerprint(self, pin: str,
+                           on_sample: Optional[Callable[[int, Optional[int]], Any]] = None,
+                           event: Optional[threading.Event] = None) -> bytes:
+        """Capture samples until a new template is complete and return its id.
+
+        on_sample(last_enroll_sample_status, remaining) is called after every
+        sample, including rejected ones, which do not end the enrollment.
+        Setting event cancels the capture in progress through CTAPHID_CANCEL
+        and discards the unfinished template.
+        Starting and cancelling the enrollment are retried when the key
+        refused them; the captures that follow wait for the user and are not.
+        """
+        def begin():
+            self.enroller = self._get_bio(pin).enroll()
+            return self.enroller.capture(event)
+
+        def started() -> bool:
+            return self.enroller is not None and self.enroller.template_id is not None
+
+        self.enroller = None
+        template_id = None
+        retried = False
+        try:
+            while template_id is None:
+                if event is not None and event.is_set():
+                    raise CtapError(CtapError.ERR.KEEPALIVE_CANCEL)
+                try:
+                    if not started():
+                        template_id = self._retry("enrollBegin", begin, idempotent=False)
+                    else:
+                        template_id = self.enroller.capture(event)
+                    status = FPBioEnrollment.FEEDBACK.FP_GOOD
+                except CaptureError as e:
+                    status = e.code
+                except CtapError as e:
+                    # A stale token is rejected before the first sample is taken,
+                    # so enrollment can simply start over with a fresh one.
+                    if (retried or started()
+                            or e.code not in TOKEN_REJECTED_ERRORS):
+                        raise
+                    retried = True
+                    self.drop_token_sessions(self._selected_path)
+                    continue
+                if callable(on_sample):
+                    on_sample(status, self.enroller.remaining)
+                if status == FPBioEnrollment.FEEDBACK.FP_DATABASE_FULL:
+                    raise CaptureError(status)
+        except BaseException:
+            if started():
+                try:
+                    self._retry("enrollCancel", lambda: self._get_bio(pin).enroll_cancel(),
+                                idempotent=False)
+                except Exception:
+                    logger.warning("Could not cancel the unfinished enrollment", exc_info=True)
+            raise
+        finally:
+            self.enroller = None
+            # bioEnroll in getInfo flips once the first template exists.
+            self._invalidate_selected()
+        return template_id
+
     def add_fingerprint(self, pin: str, on_touch: Optional[Callable[[str], Any]], on_save: Optional[Callable[[], str]], event=None):
         if not callable(on_touch):
             def _on_touch(s: str):
                 return
             on_touch = _on_touch
 
-        bio = self._get_bio(pin)
-        self.enroller = bio.enroll()
-
-        template_id = None
         on_touch("Press your fingerprint against the sensor now...")
-        while template_id is None:
-            try:
-                template_id = self.enroller.capture(event)
-                if self.enroller.remaining > 0:
-                    on_touch(str(self.enroller.remaining) +
-                             " more scans needed. touch sensor now ...")
-            except CaptureError as e:
-                raise e
-        self.enroller = None
+        template_id = self.enroll_fingerprint(
+            pin, lambda status, remaining: on_touch(sample_message(status, remaining)), event)
         f_name = "Fingerprint"
         if callable(on_save):
             f_name = on_save()
-        bio.set_name(template_id, f_name)
+        self.rename_fingerprint(pin, template_id, f_name)
+        return template_id
 
     def list_fingerprints(self, pin: str):
-        bio = self._get_bio(pin)
-        return bio.enumerate_enrollments()
+        fingerprints = self._run_bio(pin, lambda bio: bio.enumerate_enrollments(), "listFingerprints")
+        if self.inventory is not None:
+            self.inventory.record_fingerprints(
+                self._describe(self._descriptors[self._selected_path]), len(fingerprints))
+        return fingerprints
 
     def remove_fingerprint(self, pin: str, template_id: bytes):
-        bio = self._get_bio(pin)
-        bio.remove_enrollment(template_id)
+        try:
+            self._run_bio(pin, lambda bio: bio.remove_enrollment(template_id), "removeFingerprint",
+                          idempotent=False)
+        finally:
+            self._invalidate_selected()
 
     def rename_fingerprint(self, pin: str, template_id: bytes, new_name: str):
-        bio = self._get_bio(pin)
-        bio.set_name(template_id, new_name)
+        self._run_bio(pin, lambda bio: bio.set_name(template_id, new_name), "setName")
+
+    def _run_bio_batch(self, pin: str, template_ids, op: Callable[[FPBioEnrollment, bytes], Any],
+                       operation: str, idempotent: bool = True) -> Dict[bytes, Optional[Exception]]:
+        """Apply op to each template under the device's single token session.
+
+        Returns the error of every template, None where op succeeded. A CTAP
+        error only fails its own template; anything else (the key went away)
+        is reported for the template it hit and all the remaining ones.
+        """
+        results: Dict[bytes, Optional[Exception]] = {}
+        template_ids = list(template_ids)
+        for i, template_id in enumerate(template_ids):
+            try:
+                self._run_bio(pin, lambda bio: op(bio, template_id), operation, idempotent)
+                results[template_id] = None
+            except CtapError as e:
+                results[template_id] = e
+            except Exception as e:
+                for rest in template_ids[i:]:
+                    results[rest] = e
+                break
+        return results
+
+    def remove_fingerprints(self, pin: str, template_ids) -> Dict[bytes, Optional[Exception]]:
+        """Remove several templates with one PIN token; see _run_bio_batch for the result."""
+        try:
+            return self._run_bio_batch(
+                pin, template_ids, lambda bio, template_id: bio.remove_enrollment(template_id),
+                "removeFingerprint", idempotent=False)
+        finally:
+            self._invalidate_selected()
+
+    def rename_fingerprints(self, pin: str, names: Dict[bytes, str]) -> Dict[bytes, Optional[Exception]]:
+        """Rename several templates with one PIN token; see _run_bio_batch for the result."""
+        return self._run_bio_batch(
+            pin, names, lambda bio, template_id: bio.set_name(template_id, names[template_id]),
+            "setName")
+
+    def remove_all_fingerprints(self, pin: str) -> Dict[bytes, Optional[Exception]]:
+        """Wipe every template of the selected key, enumerating and removing with one token."""
+        return self.remove_fingerprints(pin, self.list_fingerprints(pin))
@@ -0,0 +1,228 @@
+"""Offline AAGUID lookup in a FIDO Metadata Service (MDS3) BLOB.
+
+The BLOB from https://mds3.fidoalliance.org/ is a JWT of several MB. It is
+parsed once into a compact index file and only that file is used afterwards:
+it is memory-mapped, and a lookup hashes the AAGUID into a fixed-size open
+addressing table and decodes the one small record it points to.
+
+Index layout, little endian:
+
+    header   magic, entry count, slot count, BLOB size and mtime, metadata record
+    slots    slot count x (AAGUID, record offset, record length), length 0 = empty
+    records  one compact JSON object per entry: description, status, certification, icon
+
+    metadata = open_default_metadata()
+    model = metadata.lookup(info["aaguid"]) if metadata else None
+
+The index is rebuilt when the BLOB next to it changes. Give a trust root
+(the FIDO Alliance root certificate, DER or PEM) to have the BLOB signature
+verified while building; without one the content is taken as is.
+"""
+import base64
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Optional, Union
+
+from .inventory import data_dir
+
+
+logger = logging.getLogger(__name__)
+
+MDS_BLOB_ENV = "FIDO2KM_MDS_BLOB"
+MDS_ROOT_ENV = "FIDO2KM_MDS_ROOT"
+
+MAGIC = b"F2KMMDS1"
+# magic, entries, slots, blob size, blob mtime (ns), metadata offset, metadata length
+HEADER = struct.Struct("<8sIIQqII")
+# AAGUID, record offset, record length
+SLOT = struct.Struct("<16sII")
+
+
+class MetadataError(Exception):
+    pass
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _load_root(path: str) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"-----BEGIN" in data:
+        from cryptography import x509
+        from cryptography.hazmat.primitives.serialization import Encoding
+        data = x509.load_pem_x509_certificate(data).public_bytes(Encoding.DER)
+    return data
+
+
+def _summary(entry: Dict[str, Any]) -> Dict[str, Any]:
+    statement = entry.get("metadataStatement") or {}
+    reports = sorted(entry.get("statusReports") or [],
+                     key=lambda r: r.get("effectiveDate") or "")
+    certified = [r["status"] for r in reports if r.get("status", "").startswith("FIDO_CERTIFIED")]
+    return {
+        "aaguid": entry.get("aaguid"),
+        "description": statement.get("description"),
+        "status": reports[-1].get("status") if reports else None,
+        "certification": certified[-1] if certified else None,
+        "icon": statement.get("icon"),
+    }
+
+
+def _slot_of(aaguid: bytes, slots: int) -> int:
+    return int.from_bytes(aaguid[:8], "little") & (slots - 1)
+
+
+def build_index(blob_path: str, index_path: str, trust_root: Optional[bytes] = None) -> int:
+    """Parse the BLOB at blob_path and write its index to index_path; return the entry count."""
+    with open(blob_path, "rb") as f:
+        blob = f.read().strip()
+    stat = os.stat(blob_path)
+    if trust_root is not None:
+        # Verification only; python-fido2 checks the x5c chain and the signature.
+        from fido2.mds3 import parse_blob
+        parse_blob(blob, trust_root)
+    try:
+        payload = json.loads(_b64url(blob.split(b".")[1]))
+    except (IndexError, ValueError) as e:
+        raise MetadataError(f"{blob_path} is not an MDS3 BLOB: {e}")
+
+    meta = json.dumps({"no": payload.get("no"), "nextUpdate": payload.get("nextUpdate")}).encode()
+    entries = {}
+    for entry in payload.get("entries", []):
+        aaguid = entry.get("aaguid")
+        if aaguid:
+            entries[bytes.fromhex(aaguid.replace("-", ""))] = _summary(entry)
+    del payload, blob
+
+    slots = 1
+    while slots < max(2 * len(entries), 16):
+        slots *= 2
+    table = [(b"\0" * 16, 0, 0)] * slots
+    records = bytearray()
+    base = HEADER.size + slots * SLOT.size
+    for aaguid, summary in entries.items():
+        record = json.dumps(summary, separators=(",", ":")).encode()
+        index = _slot_of(aaguid, slots)
+        while table[index][2]:
+            index = (index + 1) & (slots - 1)
+        table[index] = (aaguid, base + len(records), len(record))
+        records += record
+    meta_offset = base + len(records)
+
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".mds-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(entries), slots, stat.st_size, stat.st_mtime_ns,
+                                meta_offset, len(meta)))
+            for slot in table:
+                f.write(SLOT.pack(*slot))
+            f.write(records)
+            f.write(meta)
+        os.replace(tmp, index_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(entries)
+
+
+class MetadataIndex:
+    """Read-only view of an index file built by build_index()."""
+
+    def __init__(self, index_path: str):
+        self.path = index_path
+        with open(index_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise MetadataError(f"{index_path} is truncated")
+        (magic, self.entries, self.slots, self.blob_size, self.blob_mtime_ns,
+         self._meta_offset, self._meta_length) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or not self.slots or self.slots & (self.slots - 1):
+            self._map.close()
+            raise MetadataError(f"{index_path} is not an MDS index")
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def close(self):
+        self._map.close()
+
+    @property
+    def blob_info(self) -> Dict[str, Any]:
+        """Serial number ("no") and "nextUpdate" date of the BLOB the index was built from."""
+        return json.loads(self._map[self._meta_offset:self._meta_offset + self._meta_length])
+
+    def matches(self, blob_path: str) -> bool:
+        """Check if this index was built from the BLOB as it is on disk now."""
+        try:
+            stat = os.stat(blob_path)
+        except OSError:
+            return False
+        return stat.st_size == self.blob_size and stat.st_mtime_ns == self.blob_mtime_ns
+
+    def lookup(self, aaguid: Union[bytes, str, None]) -> Optional[Dict[str, Any]]:
+        """Return description, status, certification and icon (a data: URL) of an AAGUID."""
+        if not aaguid:
+            return None
+        if isinstance(aaguid, str):
+            try:
+                aaguid = bytes.fromhex(aaguid.replace("-", ""))
+            except ValueError:
+                return None
+        aaguid = bytes(aaguid)
+        if len(aaguid) != 16:
+            return None
+        index = _slot_of(aaguid, self.slots)
+        for _ in range(self.slots):
+            key, offset, length = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+            if not length:
+                return None
+            if key == aaguid:
+                return json.loads(self._map[offset:offset + length])
+            index = (index + 1) & (self.slots - 1)
+        return None
+
+
+def default_blob_path() -> str:
+    return os.environ.get(MDS_BLOB_ENV) or os.path.join(data_dir(), "mds3.jwt")
+
+
+def open_metadata(blob_path: str, index_path: Optional[str] = None,
+                  trust_root: Optional[bytes] = None) -> Optional[MetadataIndex]:
+    """Open the index of blob_path, (re)building it first if the BLOB changed.
+
+    An existing index is still used when the BLOB has been removed. Returns
+    None if there is neither.
+    """
+    index_path = index_path or os.path.splitext(blob_path)[0] + ".idx"
+    index = None
+    if os.path.exists(index_path):
+        try:
+            index = MetadataIndex(index_path)
+        except (OSError, ValueError, MetadataError):
+            logger.warning("Ignoring unreadable MDS index %s", index_path, exc_info=True)
+    if not os.path.exists(blob_path) or (index is not None and index.matches(blob_path)):
+        return index
+    if index is not None:
+        index.close()
+    build_index(blob_path, index_path, trust_root)
+    return MetadataIndex(index_path)
+
+
+def open_default_metadata() -> Optional[MetadataIndex]:
+    """open_metadata() on the default BLOB location; errors are logged, not raised."""
+    blob_path = default_blob_path()
+    try:
+        root = os.environ.get(MDS_ROOT_ENV)
+        return open_metadata(blob_path, trust_root=_load_root(root) if root else None)
+    except Exception:
+        logger.warning("FIDO metadata from %s is not available", blob_path, exc_info=True)
+        return None
@@ -0,0 +1,255 @@
+"""Per-command CTAP instrumentation.
+
+Fido2Manager wraps every device handle it opens in an InstrumentedDevice when
+it is given a CommandMetrics. Each CTAPHID call is then recorded under its
+command name (getInfo, clientPin.GET_KEY_AGREEMENT, bioEnrollment.ENROLL_BEGIN,
+reset, ...) and device path, with a latency histogram and error codes. The
+collected data is available from snapshot(), as JSON, or in the Prometheus
+text format for the node_exporter textfile collector.
+
+Without a CommandMetrics no wrapper is installed at all; a disabled one costs
+a single attribute check per call.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fido2 import cbor
+from fido2.ctap import CtapDevice, CtapError
+from fido2.ctap2 import ClientPin
+from fido2.ctap2.base import Ctap2
+from fido2.ctap2.bio import FPBioEnrollment
+from fido2.hid import CTAPHID
+
+
+# Upper bounds in seconds, from a fast getInfo up to a user taking their time to touch.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_CBOR_COMMANDS = {
+    Ctap2.CMD.MAKE_CREDENTIAL: "makeCredential",
+    Ctap2.CMD.GET_ASSERTION: "getAssertion",
+    Ctap2.CMD.GET_INFO: "getInfo",
+    Ctap2.CMD.CLIENT_PIN: "clientPin",
+    Ctap2.CMD.RESET: "reset",
+    Ctap2.CMD.GET_NEXT_ASSERTION: "getNextAssertion",
+    Ctap2.CMD.BIO_ENROLLMENT: "bioEnrollment",
+    Ctap2.CMD.CREDENTIAL_MGMT: "credentialManagement",
+    Ctap2.CMD.SELECTION: "selection",
+    Ctap2.CMD.LARGE_BLOBS: "largeBlobs",
+    Ctap2.CMD.CONFIG: "config",
+    Ctap2.CMD.BIO_ENROLLMENT_PRE: "bioEnrollment",
+    Ctap2.CMD.CREDENTIAL_MGMT_PRE: "credentialManagement",
+}
+_SUB_COMMAND_KEY = {"clientPin": 0x02, "bioEnrollment": 0x02, "credentialManagement": 0x01}
+_SUB_COMMAND_NAMES = {
+    "clientPin": {c.value: c.name for c in ClientPin.CMD},
+    "bioEnrollment": {c.value: c.name for c in FPBioEnrollment.CMD},
+    "credentialManagement": {
+        0x01: "GET_CREDS_METADATA", 0x02: "ENUMERATE_RPS_BEGIN", 0x03: "ENUMERATE_RPS_NEXT",
+        0x04: "ENUMERATE_CREDS_BEGIN", 0x05: "ENUMERATE_CREDS_NEXT", 0x06: "DELETE_CREDENTIAL",
+        0x07: "UPDATE_USER_INFO"},
+}
+
+
+def command_name(cmd: int, data: bytes) -> str:
+    """Name a CTAPHID request the way the CTAP spec does, including the subcommand."""
+    if cmd != CTAPHID.CBOR or not data:
+        try:
+            return CTAPHID(cmd).name
+        except ValueError:
+            return f"ctaphid.0x{cmd:02x}"
+    name = _CBOR_COMMANDS.get(data[0], f"cbor.0x{data[0]:02x}")
+    key = _SUB_COMMAND_KEY.get(name)
+    if key is None or len(data) < 2:
+        return name
+    try:
+        params = cbor.decode(data[1:])
+    except Exception:
+        return name
+    if name == "bioEnrollment" and params.get(0x06):
+        return "bioEnrollment.GET_MODALITY"
+    sub_cmd = params.get(key)
+    if sub_cmd is None:
+        return name
+    return f"{name}.{_SUB_COMMAND_NAMES[name].get(sub_cmd, sub_cmd)}"
+
+
+def _error_name(code: int) -> str:
+    try:
+        return CtapError.ERR(code).name
+    except ValueError:
+        return f"0x{code:02X}"
+
+
+class CommandStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.errors: Dict[str, int] = {}
+
+    def add(self, elapsed: float, error: Optional[str]):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.buckets[bisect.bisect_left(BUCKETS, elapsed)] += 1
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a latency quantile as the upper bound of its histogram bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class CommandMetrics:
+    """Thread-safe store of CTAP command statistics keyed by command and device."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.time()
+        self._stats: Dict[Tuple[str, Any], CommandStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, command: str, device, elapsed: float, error: Optional[str] = None):
+        with self._lock:
+            stats = self._stats.get((command, device))
+            if stats is None:
+                stats = self._stats[(command, device)] = CommandStats()
+            stats.add(elapsed, error)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.started = time.time()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return one dict per (command, device) pair, latencies in milliseconds."""
+        with self._lock:
+            items = [(key, self._copy(stats)) for key, stats in self._stats.items()]
+        rows = []
+        for (command, device), stats in sorted(items, key=lambda item: (item[0][0], str(item[0][1]))):
+            rows.append({
+                "command": command,
+                "device": device,
+                "count": stats.count,
+                "errors": dict(stats.errors),
+                "total_ms": stats.total * 1000,
+                "mean_ms": stats.total / stats.count * 1000,
+                "p50_ms": stats.quantile(0.5) * 1000,
+                "p95_ms": stats.quantile(0.95) * 1000,
+                "max_ms": stats.max * 1000,
+                "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], stats.buckets)),
+            })
+        return rows
+
+    @staticmethod
+    def _copy(stats: CommandStats) -> CommandStats:
+        copy = CommandStats()
+        copy.count, copy.total, copy.max = stats.count, stats.total, stats.max
+        copy.buckets = list(stats.buckets)
+        copy.errors = dict(stats.errors)
+        return copy
+
+    def to_json(self) -> str:
+        return json.dumps({"started": self.started, "commands": self.snapshot()},
+                          indent=2, default=str)
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP fido2km_ctap_command_duration_seconds Latency of CTAP commands.",
+            "# TYPE fido2km_ctap_command_duration_seconds histogram",
+        ]
+        errors = []
+        for row in self.snapshot():
+            labels = f'command="{_escape(row["command"])}",device="{_escape(row["device"])}"'
+            cumulative = 0
+            for bound, n in row["buckets"].items():
+                cumulative += n
+                lines.append(
+                    f'fido2km_ctap_command_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"fido2km_ctap_command_duration_seconds_sum{{{labels}}} "
+                         f"{row['total_ms'] / 1000:.6f}")
+            lines.append(f"fido2km_ctap_command_duration_seconds_count{{{labels}}} {row['count']}")
+            for code, n in row["errors"].items():
+                errors.append(
+                    f'fido2km_ctap_command_errors_total{{{labels},error="{_escape(code)}"}} {n}')
+        lines.append("# HELP fido2km_ctap_command_errors_total CTAP commands that failed, by error.")
+        lines.append("# TYPE fido2km_ctap_command_errors_total counter")
+        lines.extend(errors)
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Write a .prom file in the Prometheus text format, anything else as JSON.
+
+        The file is replaced atomically so a collector never reads half of it.
+        """
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class InstrumentedDevice(CtapDevice):
+    """Times every call of the wrapped device and records it in a CommandMetrics."""
+
+    def __init__(self, device: CtapDevice, metrics: CommandMetrics):
+        self.device = device
+        self.descriptor = device.descriptor
+        self.metrics = metrics
+
+    @property
+    def capabilities(self) -> int:
+        return self.device.capabilities
+
+    def call(self, cmd: int, data: bytes = b"", event=None, on_keepalive=None) -> bytes:
+        if not self.metrics.enabled:
+            return self.device.call(cmd, data, event, on_keepalive)
+        start = time.perf_counter()
+        try:
+            response = self.device.call(cmd, data, event, on_keepalive)
+        except CtapError as e:
+            self._record(cmd, data, start, _error_name(e.code))
+            raise
+        except Exception as e:
+            self._record(cmd, data, start, e.__class__.__name__)
+            raise
+        error = None
+        if cmd == CTAPHID.CBOR and response and response[0] != 0:
+            error = _error_name(response[0])
+        self._record(cmd, data, start, error)
+        return response
+
+    def _record(self, cmd: int, data: bytes, start: float, error: Optional[str]):
+        elapsed = time.perf_counter() - start
+        self.metrics.record(command_name(cmd, data), self.descriptor.path, elapsed, error)
+
+    def close(self):
+        self.device.close()
+
+    @classmethod
+    def list_devices(cls):
+        return iter(())
@@ -0,0 +1,239 @@
+"""Open CTAP sessions of the attached keys, reused across commands.
+
+Fido2Manager opens the HID channel of a key (CTAPHID INIT, then the getInfo
+Ctap2() sends) the first time the key is used and keeps the session in a
+SessionPool for every later call:
+
+    pool = SessionPool(provider.open, max_size=32, idle_ttl=300)
+    ctap = pool.acquire(descriptor).ctap
+    pool.stats()
+
+Sessions are closed when they have been idle for longer than idle_ttl
+(evict_idle(), which discover() calls) and, least recently used first, when
+opening another would exceed max_size. A session whose handle raised an
+OSError, or that was idle for longer than health_interval and does not echo
+a CTAPHID PING, is closed and opened again by the next acquire().
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from fido2.ctap import CtapDevice
+from fido2.ctap2.base import Ctap2, Info
+from fido2.hid import CTAPHID
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TTL = 300.0
+DEFAULT_HEALTH_INTERVAL = 30.0
+PING_DATA = b"fido2km"
+
+
+class PooledDevice(CtapDevice):
+    """Handle of a pooled session; tracks use and marks the session broken on I/O errors."""
+
+    def __init__(self, device: CtapDevice, session: "PooledSession"):
+        self.device = device
+        self.descriptor = device.descriptor
+        self.session = session
+
+    @property
+    def capabilities(self) -> int:
+        return self.device.capabilities
+
+    def call(self, cmd: int, data: bytes = b"", event=None, on_keepalive=None) -> bytes:
+        session = self.session
+        session.active += 1
+        try:
+            return self.device.call(cmd, data, event, on_keepalive)
+        except OSError:
+            session.broken = True
+            raise
+        finally:
+            session.active -= 1
+            session.last_used = time.monotonic()
+
+    def close(self):
+        self.device.close()
+
+    @classmethod
+    def list_devices(cls):
+        return iter(())
+
+
+class PooledSession:
+    def __init__(self, descriptor, device: CtapDevice):
+        self.descriptor = descriptor
+        self.path = descriptor.path
+        self.device = PooledDevice(device, self)
+        self.opened_at = self.last_used = time.monotonic()
+        self.active = 0
+        self.broken = False
+        self._ctap: Optional[Ctap2] = None
+        self._info: Optional[Info] = None
+
+    @property
+    def ctap(self) -> Ctap2:
+        """The Ctap2 of this session, created (and getInfo sent) on first use."""
+        if self._ctap is None:
+            self._ctap = Ctap2(self.device)
+            self._info = self._ctap.info
+        return self._ctap
+
+    def take_info(self) -> Optional[Info]:
+        """The getInfo answer Ctap2() got when it was created, once; None after that."""
+        self.ctap
+        info, self._info = self._info, None
+        return info
+
+    def idle_for(self, now: float) -> float:
+        return 0.0 if self.active else now - self.last_used
+
+    def close(self):
+        try:
+            self.device.close()
+        except Exception:
+            logger.debug("Error closing %s", self.path, exc_info=True)
+
+
+class SessionPool:
+    """Thread-safe LRU pool of PooledSessions keyed by device path."""
+
+    def __init__(self, open_device: Callable[[Any], CtapDevice],
+                 max_size: Optional[int] = None, idle_ttl: Optional[float] = DEFAULT_IDLE_TTL,
+                 health_interval: Optional[float] = DEFAULT_HEALTH_INTERVAL):
+        self.open_device = open_device
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.health_interval = health_interval
+        self._sessions: "collections.OrderedDict[Any, PooledSession]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, path) -> bool:
+        return path in self._sessions
+
+    def acquire(self, descriptor) -> PooledSession:
+        """Return the live session of a key, opening or reopening it if needed."""
+        path = descriptor.path
+        with self._lock:
+            session = self._sessions.get(path)
+            if session is not None:
+                self._sessions.move_to_end(path)
+        if session is not None:
+            if self._healthy(session):
+                self._counters["reused"] += 1
+                return session
+            self._counters["reopened"] += 1
+            self.discard(path, session)
+        return self._open(descriptor)
+
+    def _healthy(self, session: PooledSession) -> bool:
+        if session.broken:
+            return False
+        if self.health_interval is None or session.active:
+            return True
+        if session.idle_for(time.monotonic()) < self.health_interval:
+            return True
+        self._counters["health_checks"] += 1
+        try:
+            return session.device.call(CTAPHID.PING, PING_DATA) == PING_DATA
+        except Exception:
+            logger.debug("Health check of %s failed", session.path, exc_info=True)
+            return False
+
+    def _open(self, descriptor) -> PooledSession:
+        session = PooledSession(descriptor, self.open_device(descriptor))
+        evicted = []
+        with self._lock:
+            current = self._sessions.get(session.path)
+            if current is None:
+                self._sessions[session.path] = session
+                self._counters["opened"] += 1
+                evicted = self._over_size(session)
+        if current is not None:
+            # Another thread opened the same key meanwhile, keep theirs.
+            session.close()
+            return current
+        for old in evicted:
+            self._counters["evicted_lru"] += 1
+            old.close()
+        return session
+
+    def _over_size(self, keep: PooledSession) -> List[PooledSession]:
+        """Remove idle sessions but keep, least recently used first, until max_size holds.
+
+        Call with the lock held.
+        """
+        evicted = []
+        if self.max_size is None:
+            return evicted
+        for path, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_size:
+                break
+            if session is not keep and not session.active:
+                evicted.append(self._sessions.pop(path))
+        return evicted
+
+    def current_ctap(self, path) -> Optional[Ctap2]:
+        """Ctap2 of the open, unbroken session of path, if it has one; never touches the key.
+
+        Counts as a use for the LRU order, like acquire().
+        """
+        with self._lock:
+            session = self._sessions.get(path)
+            if session is not None:
+                self._sessions.move_to_end(path)
+        if session is None or session.broken:
+            return None
+        return session._ctap
+
+    def discard(self, path, session: Optional[PooledSession] = None):
+        """Close the session of path (only if it is still session, when given)."""
+        with self._lock:
+            current = self._sessions.get(path)
+            if current is None or (session is not None and current is not session):
+                current = None
+            else:
+                del self._sessions[path]
+        if current is not None:
+            self._counters["closed"] += 1
+            current.close()
+
+    def evict_idle(self, now: Optional[float] = None) -> List[Any]:
+        """Close sessions unused for longer than idle_ttl; return their paths."""
+        if self.idle_ttl is None:
+            return []
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            evicted = [s for s in self._sessions.values() if s.idle_for(now) > self.idle_ttl]
+            for session in evicted:
+                del self._sessions[session.path]
+        for session in evicted:
+            self._counters["evicted_idle"] += 1
+            session.close()
+        return [s.path for s in evicted]
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._counters["closed"] += 1
+            session.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters since creation plus the number of open and busy sessions."""
+        stats = {name: self._counters[name] for name in (
+            "opened", "reused", "reopened", "health_checks",
+            "evicted_idle", "evicted_lru", "closed")}
+        with self._lock:
+            stats["open"] = len(self._sessions)
+            stats["active"] = sum(1 for s in self._sessions.values() if s.active)
+        return stats
@@ -0,0 +1,115 @@
+"""Run the same job on many attached keys at once.
+
+A job is any callable that takes a Fido2Manager bound to one key (see
+Fido2Manager.for_device) and returns a result. Jobs are queued on each
+key's command queue (see Fido2Manager.submit), at most max_workers keys at a
+time; an exception on one key is recorded in its DeviceResult and never
+stops the others.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .manager import Fido2Manager
+
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+DEFAULT_WORKERS = 8
+
+
+class DeviceResult:
+    def __init__(self, path, state: str, value: Any = None, error: Optional[BaseException] = None,
+                 elapsed: float = 0.0):
+        self.path = path
+        self.state = state
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.state == DONE
+
+    def __repr__(self):
+        return f"DeviceResult({self.path!r}, {self.state!r})"
+
+
+class ProvisioningEngine:
+    def __init__(self, manager: Fido2Manager, max_workers: int = DEFAULT_WORKERS):
+        self.manager = manager
+        self.max_workers = max_workers
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Skip keys whose job has not started yet; running jobs finish normally."""
+        self._cancelled.set()
+
+    def run(self, job: Callable[[Fido2Manager], Any], paths: Optional[Iterable] = None,
+            on_progress: Optional[Callable[[DeviceResult], None]] = None) -> List[DeviceResult]:
+        """Run job on every key in paths (all attached keys by default).
+
+        Keys are discovered only when paths is None; given paths must come
+        from an earlier discover() of this manager. on_progress is called
+        from worker threads with a STARTED result when a key is picked up and
+        with its final result when it is done. Results come back in the order
+        of paths.
+        """
+        self._cancelled.clear()
+        if paths is None:
+            paths = [d["path"] for d in self.manager.discover()]
+        paths = list(paths)
+        report = on_progress or (lambda result: None)
+
+        def run_one(path) -> DeviceResult:
+            if self._cancelled.is_set():
+                result = DeviceResult(path, SKIPPED)
+                report(result)
+                return result
+            report(DeviceResult(path, STARTED))
+            start = time.monotonic()
+            try:
+                value = self.manager.submit(path, job).result()
+                result = DeviceResult(path, DONE, value, elapsed=time.monotonic() - start)
+            except Exception as e:
+                result = DeviceResult(path, FAILED, error=e, elapsed=time.monotonic() - start)
+            report(result)
+            return result
+
+        results: Dict[Any, DeviceResult] = {}
+        workers = max(1, min(self.max_workers, len(paths)))
+        with ThreadPoolExecutor(workers, thread_name_prefix="provision") as pool:
+            futures = {pool.submit(run_one, path): path for path in paths}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return [results[path] for path in paths]
+
+
+def collect_info(manager: Fido2Manager) -> Dict[str, Any]:
+    info = manager.get_info()
+    info["has_pin"] = manager.has_pin()
+    info["bio"] = manager.support_bio()
+    return info
+
+
+def set_pin(new_pin: str, current_pin: Optional[str] = None) -> Callable[[Fido2Manager], bool]:
+    """Job that sets new_pin, or changes it from current_pin on keys that already have one."""
+    def job(manager: Fido2Manager) -> bool:
+        if manager.has_pin():
+            if not current_pin:
+                raise RuntimeError("PIN already set")
+            return manager.change_pin(current_pin, new_pin)
+        return manager.set_pin(new_pin)
+    return job
+
+
+def list_fingerprints(pin: str) -> Callable[[Fido2Manager], Dict[str, Any]]:
+    def job(manager: Fido2Manager) -> Dict[str, Any]:
+        if not manager.support_bio():
+            return {}
+        return {tid.hex(): name for tid, name in manager.list_fingerprints(pin).items()}
+    return job
@@ -0,0 +1,194 @@
+"""Factory reset as an explicit, hotplug-driven state machine.
+
+CTAP only accepts authenticatorReset shortly after the key powers up, so the
+user has to unplug and replug it. Each key in a ResetSession moves through
+
+    ARMED -> WAITING_REMOVAL -> WAITING_INSERTION -> RESETTING -> DONE
+                                                               \\-> FAILED
+
+driven by HotplugMonitor events: reset is sent as soon as the key shows up
+again rather than on the next tick of a timer. Timeouts or errors move a key
+to FAILED. Several keys can be reset in one session.
+"""
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .manager import Fido2Manager
+from .hotplug import HotplugMonitor, HotplugEvent, DEVICE_ADDED, DEVICE_REMOVED
+from .scheduler import PRIORITY_PRESENCE
+
+
+ARMED = "armed"
+WAITING_REMOVAL = "waiting for removal"
+WAITING_INSERTION = "waiting for insertion"
+RESETTING = "resetting"
+DONE = "done"
+FAILED = "failed"
+
+FINAL_STATES = (DONE, FAILED)
+REPLUG_TIMEOUT = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+class ResetTarget:
+    def __init__(self, device: Dict[str, Any]):
+        self.path = device["path"]
+        self.vendor_id = device.get("vendor_id")
+        self.product_id = device.get("product_id")
+        self.serial_number = device.get("serial_number")
+        self.product_string = device.get("product_string")
+        self.state = ARMED
+        self.new_path = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self._timer: Optional[threading.Timer] = None
+
+    def matches(self, device: Dict[str, Any]) -> bool:
+        """Check if a newly inserted device is this key coming back.
+
+        When both sides report a serial number, vendor, product and serial
+        must all match, even at the same path: the OS reuses device nodes, so
+        another key may show up where this one left. Without a serial only
+        the same path is proof; another key of the same model must never be
+        reset in its place.
+        """
+        if self.serial_number and device.get("serial_number"):
+            return ((device.get("vendor_id"), device.get("product_id"), device["serial_number"])
+                    == (self.vendor_id, self.product_id, self.serial_number))
+        return device["path"] == self.path
+
+    def __repr__(self):
+        return f"ResetTarget({self.path!r}, {self.state!r})"
+
+
+class ResetSession:
+    """Reset one or more keys through the unplug/replug dance.
+
+    on_change is called with the ResetTarget after every state change, from
+    the hotplug, timer or key's command queue thread. The caller must keep the monitor
+    running for the lifetime of the session.
+    """
+
+    def __init__(self, manager: Fido2Manager, monitor: HotplugMonitor,
+                 on_change: Optional[Callable[[ResetTarget], None]] = None,
+                 timeout: float = REPLUG_TIMEOUT):
+        self.manager = manager
+        self.monitor = monitor
+        self.on_change = on_change or (lambda target: None)
+        self.timeout = timeout
+        self.targets: List[ResetTarget] = []
+        self.finished = threading.Event()
+        self._lock = threading.RLock()
+        self._unsubscribe = None
+
+    def arm(self, devices: Iterable[Dict[str, Any]]):
+        for device in devices:
+            self.targets.append(ResetTarget(device))
+
+    def start(self):
+        if not self.targets:
+            raise RuntimeError("No device armed for reset")
+        self._unsubscribe = self.monitor.subscribe(self._on_event)
+        with self._lock:
+            for target in self.targets:
+                if target.path in self.monitor.present:
+                    self._enter(target, WAITING_REMOVAL)
+                else:
+                    # Already unplugged, go straight to waiting for it to come back.
+                    self.manager.forget_device(target.path)
+                    self._enter(target, WAITING_INSERTION)
+
+    def cancel(self):
+        with self._lock:
+            for target in self.targets:
+                if target.state == RESETTING:
+                    # Stops a reset waiting for the touch; _reset_done reports it.
+                    target.cancel_event.set()
+                elif target.state not in FINAL_STATES:
+                    self._fail(target, "Cancelled")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.finished.wait(timeout)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.targets) and not self.finished.is_set()
+
+    def _enter(self, target: ResetTarget, state: str, error: Optional[str] = None):
+        if target._timer:
+            target._timer.cancel()
+            target._timer = None
+        target.state = state
+        target.error = error
+        if state in (WAITING_REMOVAL, WAITING_INSERTION):
+            target._timer = threading.Timer(self.timeout, self._on_timeout, (target, state))
+            target._timer.daemon = True
+            target._timer.start()
+        self.on_change(target)
+        if all(t.state in FINAL_STATES for t in self.targets):
+            if self._unsubscribe:
+                self._unsubscribe()
+                self._unsubscribe = None
+            self.finished.set()
+
+    def _fail(self, target: ResetTarget, error: str):
+        self._enter(target, FAILED, error)
+
+    def _on_timeout(self, target: ResetTarget, state: str):
+        with self._lock:
+            if target.state != state:
+                return
+            if state == WAITING_REMOVAL:
+                self._fail(target, f"Device was not disconnected within {self.timeout:g} seconds.")
+            else:
+                self._fail(target, f"Device was not reconnected within {self.timeout:g} seconds.")
+
+    def _on_event(self, event: HotplugEvent):
+        with self._lock:
+            if event.kind == DEVICE_REMOVED:
+                for target in self.targets:
+                    if target.state == WAITING_REMOVAL and target.path == event.path:
+                        self.manager.forget_device(target.path)
+                        self._enter(target, WAITING_INSERTION)
+                return
+            waiting = [t for t in self.targets if t.state == WAITING_INSERTION]
+            if not waiting or event.kind != DEVICE_ADDED:
+                return
+        try:
+            devices = self.manager.discover()
+        except Exception:
+            logger.warning("Discovery after %r failed", event, exc_info=True)
+            return
+        device = next((d for d in devices if d["path"] == event.path), None)
+        if device is None:
+            return
+        with self._lock:
+            waiting = [t for t in self.targets if t.state == WAITING_INSERTION]
+            candidates = [t for t in waiting if t.matches(device)]
+            # Prefer the key that left from this very path, then any compatible one.
+            target = next((t for t in candidates if t.path == event.path), None) or \
+                next(iter(candidates), None)
+            if target is None:
+                for t in waiting:
+                    t.error = "Wrong device reconnected, waiting for the right one"
+                    self.on_change(t)
+                return
+            target.new_path = event.path
+            self._enter(target, RESETTING)
+        event = target.cancel_event
+        future = self.manager.submit(
+            target.new_path, lambda m: m.reset(event=event), PRIORITY_PRESENCE, event=event)
+        future.add_done_callback(lambda f: self._reset_done(target, f))
+
+    def _reset_done(self, target: ResetTarget, future: Future):
+        error = future.exception() if not future.cancelled() else RuntimeError("Cancelled")
+        with self._lock:
+            if error is not None and target.cancel_event.is_set():
+                self._fail(target, "Cancelled")
+            elif error is not None:
+                self._fail(target, str(error) or error.__class__.__name__)
+            else:
+                self._enter(target, DONE)
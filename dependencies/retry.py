@@ -0,0 +1,149 @@
+"""Retry transient CTAP and HID failures with exponential backoff.
+
+Fido2Manager runs its device operations through a RetryPolicy. A failure
+is retried only if classify() calls it transient:
+
+    TRANSIENT    the key or the HID link hiccuped: CHANNEL_BUSY, TIMEOUT,
+                 LOCK_REQUIRED, INVALID_SEQ, INVALID_CHANNEL, or an OSError
+                 from the handle (the session pool reopens it for the retry)
+    FATAL        everything else: wrong or blocked PIN, user cancel, touch
+                 timeout, unsupported command...
+
+Of the transient errors, only the CTAPHID ones (busy, timeout, lock, sequence,
+channel) prove that the key never started the command. Operations that must
+not run twice, like changing a PIN, removing a template or a factory reset,
+are retried on those alone. Fingerprint samples after the first are never
+retried, the user has already touched the sensor.
+
+Delays grow from initial_delay by multiplier up to max_delay. Each delay is
+shortened by a random fraction up to jitter, so keys on one hub do not retry
+in lockstep. No retry starts after deadline seconds:
+
+    policy = RetryPolicy(attempts=4, initial_delay=0.005, deadline=1.0)
+    policy.run(lambda: ctap.get_info(), "getInfo", stats)
+
+Nested runs on one thread do not multiply: only the outermost operation
+retries.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fido2.ctap import CtapError
+
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+# The authenticator (or its HID layer) refused the message before acting on it.
+UNPROCESSED_ERRORS = (
+    CtapError.ERR.CHANNEL_BUSY,
+    CtapError.ERR.TIMEOUT,
+    CtapError.ERR.LOCK_REQUIRED,
+    CtapError.ERR.INVALID_SEQ,
+    CtapError.ERR.INVALID_CHANNEL,
+)
+
+
+def classify(error: BaseException) -> str:
+    if isinstance(error, CtapError):
+        return TRANSIENT if error.code in UNPROCESSED_ERRORS else FATAL
+    if isinstance(error, OSError):
+        return TRANSIENT
+    return FATAL
+
+
+def unprocessed(error: BaseException) -> bool:
+    """Check if error proves the key did not execute the command."""
+    return isinstance(error, CtapError) and error.code in UNPROCESSED_ERRORS
+
+
+class RetryStats:
+    """Thread-safe per-operation counts: calls, retries, recovered and failed after retrying."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, operation: str, retries: int, ok: bool):
+        with self._lock:
+            stats = self._stats.setdefault(
+                operation, {"calls": 0, "retries": 0, "recovered": 0, "failed": 0})
+            stats["calls"] += 1
+            stats["retries"] += retries
+            if retries:
+                stats["recovered" if ok else "failed"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {op: dict(stats) for op, stats in sorted(self._stats.items())}
+
+    def total(self, key: str = "retries") -> int:
+        with self._lock:
+            return sum(stats[key] for stats in self._stats.values())
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_running = threading.local()
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 4, initial_delay: float = 0.005,
+                 max_delay: float = 0.25, multiplier: float = 2.0, jitter: float = 0.5,
+                 deadline: Optional[float] = 1.0):
+        """attempts counts the first try; attempts=1 turns retrying off."""
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before retry number retry (0 based)."""
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** retry)
+        return delay * (1 - self.jitter * random.random())
+
+    def run(self, fn: Callable[[], Any], operation: str, stats: Optional[RetryStats] = None,
+            idempotent: bool = True):
+        """Call fn, retrying transient failures; with idempotent False only unprocessed ones."""
+        if getattr(_running, "active", False):
+            return fn()
+        _running.active = True
+        start = time.monotonic()
+        retries = 0
+        try:
+            while True:
+                try:
+                    result = fn()
+                except Exception as e:
+                    retryable = unprocessed(e) if not idempotent else classify(e) == TRANSIENT
+                    if not retryable or retries + 1 >= self.attempts:
+                        raise
+                    delay = self.delay(retries)
+                    if self.deadline is not None and time.monotonic() - start + delay > self.deadline:
+                        raise
+                    retries += 1
+                    logger.debug("%s failed (%s), retry %d in %.0f ms",
+                                 operation, e, retries, delay * 1000)
+                    time.sleep(delay)
+                    continue
+                if stats is not None:
+                    stats.record(operation, retries, True)
+                return result
+        except BaseException:
+            if stats is not None:
+                stats.record(operation, retries, False)
+            raise
+        finally:
+            _running.active = False
+
+
+NO_RETRY = RetryPolicy(attempts=1)
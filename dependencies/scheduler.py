@@ -0,0 +1,196 @@
+"""One ordered command queue per key, so no two threads talk to a key at once.
+
+Fido2Manager.submit() queues a callable for one key and returns a
+concurrent.futures.Future. Every key has its own queue, drained by a thread
+of its own that is started when work arrives and ends when the queue is
+empty; keys never wait for each other. Within a queue, commands run by
+priority class, in submission order inside a class:
+
+    PRIORITY_CANCEL     cleanup after a cancel, ahead of everything else
+    PRIORITY_INFO       cheap queries such as getInfo
+    PRIORITY_COMMAND    PIN, fingerprint and credential management
+    PRIORITY_PRESENCE   long operations waiting for the user, like captures and reset
+
+A running command is never preempted. cancel() sets its threading.Event,
+which python-fido2 turns into CTAPHID_CANCEL, drops the user presence
+commands still queued for the key and queues the given cleanup at
+PRIORITY_CANCEL, so it runs as soon as the interrupted command has unwound.
+
+Commands given the same coalesce key while one is queued or running share
+its future, so concurrent getInfo requests cost one round trip:
+
+    future = manager.submit(path, lambda m: m.get_info(), PRIORITY_INFO, coalesce="get_info")
+    info = future.result()
+
+The queue of path None runs commands on the shared manager itself (discover
+and the like); the queue of a key passes a manager bound to that key (see
+Fido2Manager.for_device), created on its first command and again after the
+key was forgotten.
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+PRIORITY_CANCEL = 0
+PRIORITY_INFO = 1
+PRIORITY_COMMAND = 2
+PRIORITY_PRESENCE = 3
+
+
+class _Task:
+    def __init__(self, fn: Callable[[Any], Any], priority: int, seq: int,
+                 coalesce: Optional[Hashable], event: Optional[threading.Event]):
+        self.fn = fn
+        self.priority = priority
+        self.seq = seq
+        self.coalesce = coalesce
+        self.event = event
+        self.future: Future = Future()
+
+    def __lt__(self, other: "_Task") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _DeviceQueue:
+    def __init__(self, path):
+        self.path = path
+        self.heap: List[_Task] = []
+        self.running: Optional[_Task] = None
+        self.thread: Optional[threading.Thread] = None
+        self.coalesced: Dict[Hashable, _Task] = {}
+        self.view = None
+
+
+class DeviceScheduler:
+    """Per-key priority queues in front of a Fido2Manager."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._queues: Dict[Any, _DeviceQueue] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._closed = False
+
+    def submit(self, path, fn: Callable[[Any], Any], priority: int = PRIORITY_COMMAND,
+               coalesce: Optional[Hashable] = None,
+               event: Optional[threading.Event] = None) -> Future:
+        """Queue fn(manager) for the key at path and return its future.
+
+        event, if given, is set by cancel() while fn runs; pass the same
+        event to the manager call so that it can stop at the authenticator.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            queue = self._queues.get(path)
+            if queue is None:
+                queue = self._queues[path] = _DeviceQueue(path)
+            if coalesce is not None and coalesce in queue.coalesced:
+                return queue.coalesced[coalesce].future
+            task = self._push(queue, fn, priority, coalesce, event)
+        return task.future
+
+    def _push(self, queue: _DeviceQueue, fn: Callable[[Any], Any], priority: int,
+              coalesce: Optional[Hashable] = None,
+              event: Optional[threading.Event] = None) -> _Task:
+        """Queue a task and start the queue's thread if needed; call with the lock held."""
+        task = _Task(fn, priority, next(self._seq), coalesce, event)
+        heapq.heappush(queue.heap, task)
+        if coalesce is not None:
+            queue.coalesced[coalesce] = task
+        if queue.thread is None:
+            queue.thread = threading.Thread(
+                target=self._drain, args=(queue,), name=f"device-{queue.path}", daemon=True)
+            queue.thread.start()
+        return task
+
+    def cancel(self, path, cleanup: Optional[Callable[[Any], Any]] = None) -> int:
+        """Interrupt the running command of a key and drop its queued user presence commands.
+
+        Returns the number of commands dropped. The running command stops
+        only if it was submitted with an event and honours it. If anything
+        was interrupted or dropped, cleanup(manager) is queued at
+        PRIORITY_CANCEL, ahead of whatever else is waiting for the key.
+        """
+        with self._lock:
+            queue = self._queues.get(path)
+            if queue is None or self._closed:
+                return 0
+            interrupted = queue.running is not None
+            if interrupted and queue.running.event is not None:
+                queue.running.event.set()
+            dropped = [t for t in queue.heap if t.priority >= PRIORITY_PRESENCE]
+            queue.heap = [t for t in queue.heap if t.priority < PRIORITY_PRESENCE]
+            heapq.heapify(queue.heap)
+            for task in dropped:
+                self._uncoalesce(queue, task)
+            if cleanup is not None and (interrupted or dropped):
+                self._push(queue, cleanup, PRIORITY_CANCEL)
+        for task in dropped:
+            task.future.cancel()
+        return len(dropped)
+
+    def pending(self, path) -> int:
+        """Number of queued and running commands of a key."""
+        with self._lock:
+            queue = self._queues.get(path)
+            if queue is None:
+                return 0
+            return len(queue.heap) + (queue.running is not None)
+
+    def _uncoalesce(self, queue: _DeviceQueue, task: _Task):
+        if task.coalesce is not None and queue.coalesced.get(task.coalesce) is task:
+            del queue.coalesced[task.coalesce]
+
+    def _drain(self, queue: _DeviceQueue):
+        while True:
+            with self._lock:
+                if not queue.heap:
+                    queue.running = None
+                    queue.thread = None
+                    return
+                task = heapq.heappop(queue.heap)
+                queue.running = task
+            if not task.future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._uncoalesce(queue, task)
+                continue
+            try:
+                result = task.fn(self._view(queue))
+            except BaseException as e:
+                with self._lock:
+                    self._uncoalesce(queue, task)
+                task.future.set_exception(e)
+            else:
+                with self._lock:
+                    self._uncoalesce(queue, task)
+                task.future.set_result(result)
+
+    def _view(self, queue: _DeviceQueue):
+        if queue.path is None:
+            return self.manager
+        if queue.view is None or queue.view.selected_path is None:
+            queue.view = self.manager.for_device(queue.path)
+        return queue.view
+
+    def close(self, timeout: Optional[float] = None):
+        """Cancel queued commands, interrupt running ones and wait for them to finish."""
+        with self._lock:
+            self._closed = True
+            queues = list(self._queues.values())
+            dropped = []
+            for queue in queues:
+                dropped.extend(queue.heap)
+                queue.heap = []
+                queue.coalesced.clear()
+                if queue.running is not None and queue.running.event is not None:
+                    queue.running.event.set()
+            threads = [q.thread for q in queues if q.thread is not None]
+        for task in dropped:
+            task.future.cancel()
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
@@ -0,0 +1,51 @@
+"""Where Fido2Manager finds keys and how it opens them.
+
+The manager only needs descriptors that carry a path, and CtapDevice handles
+that Ctap2() can talk to. HidDeviceProvider is the real USB HID backend;
+emulator.VirtualDeviceProvider serves software authenticators so the manager
+and UI can be exercised without hardware.
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import List
+
+from fido2.ctap import CtapDevice
+from fido2.hid import CtapHidDevice, list_descriptors, open_connection
+
+
+EMULATE_ENV = "FIDO2KM_EMULATE"
+
+
+class DeviceProvider(ABC):
+    @abstractmethod
+    def list_descriptors(self) -> List:
+        """Return a descriptor (with at least a .path) per attached key."""
+
+    @abstractmethod
+    def open(self, descriptor) -> CtapDevice:
+        """Open a session on the key of descriptor."""
+
+    @abstractmethod
+    def event_source(self):
+        """Return a hotplug EventSource watching the keys of this provider."""
+
+
+class HidDeviceProvider(DeviceProvider):
+    def list_descriptors(self) -> List:
+        return list_descriptors()
+
+    def open(self, descriptor) -> CtapDevice:
+        return CtapHidDevice(descriptor, open_connection(descriptor))
+
+    def event_source(self):
+        from .hotplug import default_event_source
+        return default_event_source()
+
+
+def default_provider() -> DeviceProvider:
+    """Real HID keys, or N virtual ones when FIDO2KM_EMULATE=N is set."""
+    count = os.environ.get(EMULATE_ENV)
+    if count:
+        from .emulator import VirtualDeviceProvider
+        return VirtualDeviceProvider(int(count))
+    return HidDeviceProvider()
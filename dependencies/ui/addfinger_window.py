@@ -1,118 +1,141 @@
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QMessageBox, QInputDialog
-from PyQt5.QtCore import QThread, pyqtSignal, QMetaObject, Qt, Q_ARG
-from typing import Callable
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
+from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtSvg import QSvgWidget
 from threading import Event
-from ..manager import Fido2Manager
-from .icon import LogoIcon, FingerprintWidget
-
-
-class FingerprintWorker(QThread):
-    touch_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal()
-    error_signal = pyqtSignal(str)
-    save_request_signal = pyqtSignal()
-    save_name_signal = pyqtSignal(str)
-    exit_event = Event()
-
-    def __init__(self, manager: Fido2Manager, pin: str):
-        super().__init__()
-        self.exit_event.clear()
-        self.manager = manager
-        self.pin = pin
-        self.fingerprint_name = "Fingerprint"
-        self._save_callback_done = False
-        self._save_name_received = None
-
-    def run(self):
-        try:
-            self.manager.add_fingerprint(
-                self.pin, self._on_touch_callback, self._on_save_callback, self.exit_event)
-            self.finished_signal.emit()
-        except Exception as e:
-            self.error_signal.emit(str(e))
-
-    def _on_touch_callback(self, message: str):
-        self.touch_signal.emit(message)
+import os
+from ..manager import sample_message
+from ..scheduler import PRIORITY_PRESENCE
+from .icon import LogoIcon, icon_path
+from .worker import DeviceCommandWorker
 
-    def _on_save_callback(self):
-        self._save_callback_done = False
-        self._save_name_received = None
-        self.save_request_signal.emit()
 
-        while not self._save_callback_done:
-            self.msleep(100)
+class FingerprintWidget(QSvgWidget):
+    def __init__(self):
+        super().__init__(os.path.join(icon_path, "fingerprint-scan.svg"))
 
-        return self._save_name_received or "Fingerprint"
 
-    def set_save_name(self, name: str):
-        self._save_name_received = name
-        self._save_callback_done = True
+class AddFingerWindow(QDialog):
+    """Enrolls one fingerprint on the key's command worker.
 
+    Capture runs as a single worker command; each sample is reported through
+    sample_captured. The name can be typed and confirmed at any point, the
+    template is named as soon as both the capture and the name are ready.
+    Closing the dialog cancels the capture through the CTAP cancel path and
+    waits for the worker to report back instead of killing anything.
+    """
+    sample_captured = pyqtSignal(int, object)
 
-class AddFingerWindow(QDialog):
-    def __init__(self, manager: Fido2Manager, pin: str, parent=None):
+    def __init__(self, worker: DeviceCommandWorker, pin: str, parent=None):
         super().__init__(parent)
-        self.__initWindow()
-        self.manager = manager
+        self.worker = worker
         self.pin = pin
-        self.worker = None
+        self.cancel_event = Event()
+        self.capturing = False
+        self.template_id = None
+        self.name = None
+        self.saved = False
+        self.name_confirmed = False
+        self.settled = False
+        self._closing = False
+        self.__initWindow()
+        self.sample_captured.connect(self.on_sample)
 
     def __initWindow(self):
         self.setWindowTitle("Add Fingerprint")
         self.setWindowFlags(self.windowFlags() & ~
                             Qt.WindowContextHelpButtonHint)
-        self.setFixedSize(300, 300)
+        self.setFixedSize(300, 340)
         self.setWindowIcon(LogoIcon())
 
         vbox = QVBoxLayout(self)
 
         self.fingerprint = FingerprintWidget()
         self.label = QLabel("")
+        self.label.setWordWrap(True)
+        self.name_edit = QLineEdit("Fingerprint")
+        self.name_edit.setPlaceholderText("Fingerprint name")
+        self.name_edit.returnPressed.connect(self.on_name_confirmed)
+        self.save_btn = QPushButton("Save")
+        self.save_btn.clicked.connect(self.on_name_confirmed)
 
         vbox.addWidget(self.fingerprint)
         vbox.addWidget(self.label)
+        hbox = QHBoxLayout()
+        hbox.addWidget(self.name_edit)
+        hbox.addWidget(self.save_btn)
+        vbox.addLayout(hbox)
 
     def showEvent(self, event):
         super().showEvent(event)
-        self.start_fingerprint_operation()
+        if not self.capturing and self.template_id is None:
+            self.start_fingerprint_operation()
 
     def start_fingerprint_operation(self):
-        self.worker = FingerprintWorker(self.manager, self.pin)
-        self.worker.touch_signal.connect(self.on_touch_message)
-        self.worker.finished_signal.connect(self.on_operation_finished)
-        self.worker.error_signal.connect(self.on_operation_error)
-        self.worker.save_request_signal.connect(
-            self.on_save_requested)
-        self.worker.start()
-
-    def on_touch_message(self, message: str):
-        self.label.setText(message)
-
-    def on_save_requested(self):
-        name, ok = QInputDialog.getText(
-            self,
-            "Fingerprint Name",
-            "Enter a name for this fingerprint:",
-            text="Fingerprint"
-        )
-
-        if ok and name:
-            self.worker.set_save_name(name)
+        self.capturing = True
+        self.label.setText("Press your fingerprint against the sensor now...")
+        self.worker.submit(
+            lambda m: m.enroll_fingerprint(
+                self.pin, self.sample_captured.emit, self.cancel_event),
+            self.on_captured, self.on_operation_error,
+            priority=PRIORITY_PRESENCE, event=self.cancel_event)
+
+    def on_sample(self, status: int, remaining):
+        self.label.setText(sample_message(status, remaining))
+
+    def on_captured(self, template_id: bytes):
+        self.capturing = False
+        self.template_id = template_id
+        if self._closing or self.name_confirmed:
+            self._save()
         else:
-            self.worker.set_save_name("Fingerprint")
-
-    def on_operation_finished(self):
-        QMessageBox.information(
-            self, "Success", "Fingerprint added successfully!")
+            self.label.setText("Fingerprint captured. Enter a name and press Save.")
+            self.name_edit.setFocus()
+
+    def on_name_confirmed(self):
+        self.name_confirmed = True
+        self.name_edit.setEnabled(False)
+        self.save_btn.setEnabled(False)
+        if self.template_id is not None:
+            self._save()
+        else:
+            self.label.setText("The name will be saved once capture completes.")
+
+    def _save(self):
+        self.name = name = self.name_edit.text().strip() or "Fingerprint"
+        self.worker.submit(
+            lambda m: m.rename_fingerprint(self.pin, self.template_id, name),
+            self.on_operation_finished, self.on_operation_error)
+
+    def on_operation_finished(self, _):
+        self.settled = True
+        self.saved = True
+        if not self._closing:
+            QMessageBox.information(
+                self, "Success", "Fingerprint added successfully!")
         self.close()
 
-    def on_operation_error(self, error_message: str):
-        self.label.setText(f"Error: {error_message}")
-
-    def closeEvent(self, event):
-        if self.worker and self.worker.isRunning():
-            self.worker.exit_event.set()
-            self.manager.cancel_enroll()
-            self.worker.terminate()
-            self.worker.wait()
-        super().closeEvent(event)
+    def on_operation_error(self, error: Exception):
+        self.capturing = False
+        self.settled = True
+        if self._closing:
+            self.close()
+            return
+        self.label.setText(f"Error: {error}")
+        self.name_edit.setEnabled(False)
+        self.save_btn.setEnabled(False)
+
+    def _busy(self) -> bool:
+        return self.capturing or (self.template_id is not None and not self.settled)
+
+    def reject(self):
+        # Reached from Escape and, through QDialog.closeEvent, from the close button.
+        if self._busy():
+            # Let the worker unwind; the dialog closes when it reports back.
+            self._closing = True
+            self.cancel_event.set()
+            self.label.setText("Cancelling...")
+            if self.template_id is not None and not self.name_confirmed:
+                self.name_confirmed = True
+                self._save()
+            return
+        super().reject()
@@ -0,0 +1,222 @@
+import base64
+from typing import Any, Dict, List, Optional
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtGui import QBrush, QIcon, QPixmap
+
+COLUMNS = ["Device", "VID:PID", "AAGUID", "PIN", "Biometrics", "Last operation"]
+DEVICE, VIDPID, AAGUID, PIN, BIO, STATUS = range(len(COLUMNS))
+
+PathRole = Qt.UserRole
+
+
+class DeviceRow:
+    def __init__(self, device: Dict[str, Any]):
+        self.device = device
+        self.path = device.get("path")
+        self.aaguid: Optional[str] = None
+        self.options: Optional[Dict[str, Any]] = None
+        self.status = ""
+        self.inventory_row: Optional[Dict[str, Any]] = None
+        self.looked_up = False
+
+
+class DeviceTableModel(QAbstractTableModel):
+    """Attached keys, one row per device path, updated in place.
+
+    set_devices() takes a discover() result and diffs it against the rows:
+    keys that went away are removed, new ones appended and changed ones
+    updated, so views keep their selection, scroll position and sort order,
+    and an unchanged result repaints nothing. What is learned about a key
+    later (its getInfo, the outcome of the last command) is merged in with
+    update().
+    """
+
+    def __init__(self, inventory=None, parent=None):
+        super().__init__(parent)
+        self.inventory = inventory
+        self.metadata = None
+        self._rows: List[DeviceRow] = []
+        self._index: Dict[Any, int] = {}
+        self._icons: Dict[str, QIcon] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section < len(COLUMNS):
+            return COLUMNS[section]
+        return None
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            return self._text(row, column)
+        if role == Qt.DecorationRole and column == DEVICE:
+            return self._icon(self.model_of(row.device))
+        if role == Qt.ForegroundRole and row.device.get("known"):
+            return QBrush(Qt.gray)
+        if role == Qt.ToolTipRole and column == DEVICE:
+            return str(row.path)
+        if role == PathRole:
+            return row.path
+        return None
+
+    def _text(self, row: DeviceRow, column: int) -> str:
+        device = row.device
+        if column == DEVICE:
+            label = device.get("product_string") or "Unknown"
+            model = self.model_of(device)
+            if model.get("description") and model["description"] != label:
+                label = f"{model['description']} ({label})"
+            if device.get("known"):
+                label += " (last seen)"
+            return label
+        if column == VIDPID:
+            vid, pid = device.get("vendor_id"), device.get("product_id")
+            return f"{vid:04x}:{pid:04x}" if vid is not None and pid is not None else ""
+        if column == AAGUID:
+            return self._aaguid(row) or ""
+        options = self._options(row)
+        if column == PIN:
+            if options is None:
+                return ""
+            return "Set" if options.get("clientPin") else "Not set"
+        if column == BIO:
+            if options is None:
+                return ""
+            if "bioEnroll" not in options:
+                return "No"
+            return "Enrolled" if options["bioEnroll"] else "Supported"
+        if column == STATUS:
+            return row.status
+        return ""
+
+    def _known(self, row: DeviceRow) -> Dict[str, Any]:
+        """What the inventory remembers of the key, looked up once per row."""
+        if row.device.get("known"):
+            return row.device
+        if not row.looked_up and self.inventory is not None:
+            row.looked_up = True
+            row.inventory_row = self.inventory.get(row.device)
+        return row.inventory_row or {}
+
+    def _aaguid(self, row: DeviceRow) -> Optional[str]:
+        return row.aaguid or row.device.get("aaguid") or self._known(row).get("aaguid")
+
+    def _options(self, row: DeviceRow) -> Optional[Dict[str, Any]]:
+        if row.options is not None:
+            return row.options
+        return self._known(row).get("options")
+
+    def model_of(self, device: Dict[str, Any]) -> Dict[str, Any]:
+        """MDS entry of a key (description, certification, icon), {} if unknown."""
+        if self.metadata is None:
+            return {}
+        aaguid = device.get("aaguid")
+        if not aaguid:
+            row = self._index.get(device.get("path"))
+            aaguid = row is not None and self._aaguid(self._rows[row])
+        if not aaguid:
+            return {}
+        return self.metadata.lookup(aaguid) or {}
+
+    def _icon(self, model: Dict[str, Any]) -> QIcon:
+        url = model.get("icon") or ""
+        if url not in self._icons:
+            pixmap = QPixmap()
+            if url.startswith("data:") and "," in url:
+                try:
+                    pixmap.loadFromData(base64.b64decode(url.split(",", 1)[1]))
+                except ValueError:
+                    pass
+            self._icons[url] = QIcon(pixmap)
+        return self._icons[url]
+
+    def set_metadata(self, metadata):
+        self.metadata = metadata
+        if self._rows:
+            self.dataChanged.emit(self.index(0, DEVICE), self.index(len(self._rows) - 1, DEVICE))
+
+    def device(self, row: int) -> Optional[Dict[str, Any]]:
+        return self._rows[row].device if 0 <= row < len(self._rows) else None
+
+    def row_of(self, path) -> int:
+        return self._index.get(path, -1)
+
+    def set_devices(self, devices: List[Dict[str, Any]]):
+        """Make the rows match devices with as few row changes as possible."""
+        wanted = {d.get("path"): d for d in devices}
+        row = len(self._rows) - 1
+        while row >= 0:
+            if self._rows[row].path in wanted:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and self._rows[row].path not in wanted:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row + 1, last)
+            del self._rows[row + 1:last + 1]
+            self.endRemoveRows()
+        self._reindex()
+
+        for i, row in enumerate(self._rows):
+            device = wanted[row.path]
+            if device != row.device:
+                if row.device.get("known") and not device.get("known"):
+                    row.looked_up = False
+                row.device = device
+                self._row_changed(i)
+
+        added = [d for path, d in wanted.items() if path not in self._index]
+        if added:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            self._rows.extend(DeviceRow(d) for d in added)
+            self._reindex()
+            self.endInsertRows()
+
+    def update(self, path, aaguid: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+               has_pin: Optional[bool] = None, status: Optional[str] = None):
+        """Merge what was learned about a key into its row; unknown paths are ignored.
+
+        options replaces the getInfo options shown, has_pin only the PIN state.
+        """
+        i = self._index.get(path)
+        if i is None:
+            return
+        row = self._rows[i]
+        before = (row.aaguid, row.options, row.status)
+        if aaguid is not None:
+            row.aaguid = aaguid
+        if options is not None:
+            row.options = dict(options)
+        if has_pin is not None:
+            row.options = {**(self._options(row) or {}), "clientPin": has_pin}
+        if status is not None:
+            row.status = status
+        if (row.aaguid, row.options, row.status) != before:
+            self._row_changed(i)
+
+    def _row_changed(self, row: int):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+    def _reindex(self):
+        self._index = {row.path: i for i, row in enumerate(self._rows)}
+
+
+class DeviceFilterModel(QSortFilterProxyModel):
+    """Sorts the device table by any column and filters it on every column."""
+
+    def __init__(self, source: DeviceTableModel, parent=None):
+        super().__init__(parent)
+        self.setSourceModel(source)
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.setDynamicSortFilter(True)
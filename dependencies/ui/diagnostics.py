@@ -0,0 +1,121 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QLabel,
+    QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox
+)
+from PyQt5.QtCore import Qt, QTimer
+from .icon import LogoIcon
+from ..metrics import CommandMetrics
+
+COLUMNS = ["Command", "Device", "Count", "Errors", "Mean ms", "p50 ms", "p95 ms", "Max ms"]
+
+
+class DiagnosticsWindow(QDialog):
+    """Live table of the CTAP command metrics collected by the manager."""
+
+    def __init__(self, metrics: CommandMetrics, stall_monitor=None, parent=None, pool=None,
+                 retry_stats=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.stall_monitor = stall_monitor
+        self.pool = pool
+        self.retry_stats = retry_stats
+        self.__initWindow()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def __initWindow(self):
+        self.setWindowTitle("Diagnostics")
+        self.setWindowFlags(self.windowFlags() & ~
+                            Qt.WindowContextHelpButtonHint)
+        self.setWindowIcon(LogoIcon())
+        self.resize(760, 420)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSortingEnabled(True)
+
+        self.summary = QLabel("")
+        self.record_box = QCheckBox("Record")
+        self.record_box.setChecked(self.metrics.enabled)
+        self.record_box.toggled.connect(self.on_record)
+        self.reset_btn = QPushButton("Reset")
+        self.reset_btn.clicked.connect(self.on_reset)
+        self.export_btn = QPushButton("Export...")
+        self.export_btn.clicked.connect(self.on_export)
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.record_box)
+        buttons.addWidget(self.summary)
+        buttons.addStretch()
+        buttons.addWidget(self.reset_btn)
+        buttons.addWidget(self.export_btn)
+        buttons.addWidget(self.close_btn)
+
+        vbox = QVBoxLayout(self)
+        vbox.addWidget(self.table)
+        vbox.addLayout(buttons)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start(1000)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        rows = self.metrics.snapshot()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            errors = ", ".join(f"{code} x{n}" for code, n in row["errors"].items())
+            values = [row["command"], str(row["device"]), row["count"], errors,
+                      row["mean_ms"], row["p50_ms"], row["p95_ms"], row["max_ms"]]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem()
+                if isinstance(value, float):
+                    item.setData(Qt.DisplayRole, round(value, 2))
+                else:
+                    item.setData(Qt.DisplayRole, value)
+                self.table.setItem(i, col, item)
+        self.table.setSortingEnabled(True)
+        calls = sum(row["count"] for row in rows)
+        failed = sum(sum(row["errors"].values()) for row in rows)
+        text = f"{calls} commands, {failed} failed"
+        if self.stall_monitor is not None:
+            text += f", GUI max stall {self.stall_monitor.max_stall_ms:.0f} ms"
+        if self.pool is not None:
+            stats = self.pool.stats()
+            text += (f", {stats['open']} sessions open ({stats['opened']} opened,"
+                     f" {stats['reused']} reused, {stats['reopened']} reopened)")
+        if self.retry_stats is not None:
+            text += (f", {self.retry_stats.total()} retries"
+                     f" ({self.retry_stats.total('recovered')} recovered)")
+        self.summary.setText(text)
+
+    def on_record(self, checked: bool):
+        self.metrics.enabled = checked
+
+    def on_reset(self):
+        self.metrics.reset()
+        if self.stall_monitor is not None:
+            self.stall_monitor.reset()
+        if self.retry_stats is not None:
+            self.retry_stats.reset()
+        self.refresh()
+
+    def on_export(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Metrics", "fido2km-metrics.json",
+            "JSON (*.json);;Prometheus text file (*.prom)")
+        if not path:
+            return
+        try:
+            self.metrics.export(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Export failed", str(e))
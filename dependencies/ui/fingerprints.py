@@ -1,16 +1,102 @@
-from PyQt5.QtWidgets import QVBoxLayout, QListWidget, QPushButton, QHBoxLayout,  QDialog, QMessageBox
-from PyQt5.QtCore import Qt
+from typing import Dict, List, Optional
+from PyQt5.QtWidgets import (
+    QVBoxLayout, QListView, QPushButton, QHBoxLayout, QDialog, QMessageBox, QLabel,
+    QStackedWidget, QInputDialog, QLineEdit
+)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
 from dependencies.ui.icon import LogoIcon
-from ..manager import Fido2Manager
 from .addfinger_window import AddFingerWindow
+from .worker import DeviceCommandWorker
+
+TemplateIdRole = Qt.UserRole
+
+
+class FingerprintModel(QAbstractListModel):
+    """Enrolled templates of one key, in enumeration order, keyed by template ID.
+
+    The model is filled once from list_fingerprints() and then updated in place
+    from the results of add, remove and rename.
+    """
+
+    def __init__(self, fingerprints: Optional[Dict[bytes, str]] = None, parent=None):
+        super().__init__(parent)
+        self._ids: List[bytes] = []
+        self._names: Dict[bytes, str] = {}
+        if fingerprints:
+            self.reset(fingerprints)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._ids):
+            return None
+        template_id = self._ids[index.row()]
+        if role == Qt.DisplayRole:
+            return self._names[template_id] or "(unnamed)"
+        if role == Qt.EditRole:
+            return self._names[template_id] or ""
+        if role == Qt.ToolTipRole:
+            return template_id.hex()
+        if role == TemplateIdRole:
+            return template_id
+        return None
+
+    def reset(self, fingerprints: Dict[bytes, str]):
+        self.beginResetModel()
+        self._ids = list(fingerprints)
+        self._names = dict(fingerprints)
+        self.endResetModel()
+
+    def template_id(self, index: QModelIndex) -> Optional[bytes]:
+        return index.data(TemplateIdRole) if index.isValid() else None
+
+    def index_of(self, template_id: bytes) -> QModelIndex:
+        try:
+            return self.index(self._ids.index(template_id))
+        except ValueError:
+            return QModelIndex()
+
+    def add(self, template_id: bytes, name: str):
+        if template_id in self._names:
+            self.rename(template_id, name)
+            return
+        row = len(self._ids)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._ids.append(template_id)
+        self._names[template_id] = name
+        self.endInsertRows()
+
+    def remove(self, template_id: bytes):
+        index = self.index_of(template_id)
+        if not index.isValid():
+            return
+        self.beginRemoveRows(QModelIndex(), index.row(), index.row())
+        del self._ids[index.row()]
+        del self._names[template_id]
+        self.endRemoveRows()
+
+    def rename(self, template_id: bytes, name: str):
+        index = self.index_of(template_id)
+        if not index.isValid():
+            return
+        self._names[template_id] = name
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
 
 
 class FingerprintsWindow(QDialog):
-    def __init__(self, manager: Fido2Manager, pin: str, parent=None, ):
+    def __init__(self, worker: DeviceCommandWorker, pin: str, parent=None, fingerprints=None):
         super().__init__(parent)
         self.pin = pin
-        self.manager = manager
+        self.worker = worker
+        self.busy = False
+        self.model = FingerprintModel(parent=self)
         self.__initWindow()
+        self.worker.busy_changed.connect(self._on_busy)
+        if fingerprints is None:
+            self._listFingerprints()
+        else:
+            self.model.reset(fingerprints)
 
     def __initWindow(self):
         self.setWindowTitle("Fingerprints")
@@ -21,68 +107,157 @@ class FingerprintsWindow(QDialog):
 
         self.vLayout = QVBoxLayout()
 
-        self.fingerprint_list = QListWidget()
+        self.fingerprint_list = QListView()
+        self.fingerprint_list.setModel(self.model)
+        self.fingerprint_list.setEditTriggers(QListView.NoEditTriggers)
+        self.fingerprint_list.setSelectionMode(QListView.ExtendedSelection)
+        self.fingerprint_list.selectionModel().selectionChanged.connect(
+            lambda *_: self._update_buttons())
+        self.empty_label = QLabel("No fingerprints have been captured.")
+        self.empty_label.setAlignment(Qt.AlignCenter)
+        self.empty_label.setEnabled(False)
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.fingerprint_list)
+        self.stack.addWidget(self.empty_label)
+        for changed in (self.model.modelReset, self.model.rowsInserted, self.model.rowsRemoved):
+            changed.connect(self._update_view)
 
         self.delete_btn = QPushButton("Delete")
+        self.wipe_btn = QPushButton("Delete All")
+        self.rename_btn = QPushButton("Rename")
+        self.refresh_btn = QPushButton("Refresh")
         self.add_btn = QPushButton("Add")
 
         self.add_btn.clicked.connect(self._addFingerprint)
         self.delete_btn.clicked.connect(self._deleteFingerprint)
+        self.wipe_btn.clicked.connect(self._deleteAllFingerprints)
+        self.rename_btn.clicked.connect(self._renameFingerprint)
+        self.refresh_btn.clicked.connect(self._listFingerprints)
 
-        self.vLayout.addWidget(self.fingerprint_list)
+        self.vLayout.addWidget(self.stack)
 
         hbox = QHBoxLayout()
         hbox.addWidget(self.delete_btn)
+        hbox.addWidget(self.wipe_btn)
+        hbox.addWidget(self.rename_btn)
         hbox.addStretch()
+        hbox.addWidget(self.refresh_btn)
         hbox.addWidget(self.add_btn)
 
         self.vLayout.addLayout(hbox)
 
         self.setLayout(self.vLayout)
-        self._listFingerprints()
+        self._update_view()
 
-    def _listFingerprints(self):
-        self.fingerprints = self.manager.list_fingerprints(self.pin)
-        self.fingerprint_list.clear()
-        self.fingerprint_list.itemClicked.connect(self._on_select_item)
-        self.delete_btn.setEnabled(False)
-
-        if not self.fingerprints:
-            self.fingerprint_list.addItem("No fingerprints have been captured.")
-            self.fingerprint_list.item(0).setFlags(Qt.NoItemFlags)  
-            self.fingerprint_list.item(0).setForeground(Qt.gray)
-        else:
-            for v in self.fingerprints.values():
-                self.fingerprint_list.addItem(v)
+    def _on_busy(self, busy: bool):
+        self.busy = busy
+        self._update_buttons()
+
+    def _update_view(self):
+        self.stack.setCurrentWidget(
+            self.fingerprint_list if self.model.rowCount() else self.empty_label)
+        self._update_buttons()
 
-    def _on_select_item(self):
-        self.delete_btn.setEnabled(True)
+    def _update_buttons(self):
+        selected = bool(self._selected())
+        self.add_btn.setEnabled(not self.busy)
+        self.refresh_btn.setEnabled(not self.busy)
+        self.wipe_btn.setEnabled(not self.busy and self.model.rowCount() > 0)
+        self.delete_btn.setEnabled(not self.busy and selected)
+        self.rename_btn.setEnabled(not self.busy and selected)
+
+    def _selected(self) -> List[bytes]:
+        """Template IDs of the selected rows, in list order."""
+        rows = sorted(self.fingerprint_list.selectionModel().selectedRows(), key=lambda i: i.row())
+        return [self.model.template_id(index) for index in rows]
+
+    def _listFingerprints(self):
+        self.worker.submit(
+            lambda m: m.list_fingerprints(self.pin), self.model.reset,
+            lambda e: self.show_error("Error", str(e)))
 
     def _addFingerprint(self):
-        self.addfinger_window = AddFingerWindow(self.manager, self.pin, self)
+        self.addfinger_window = AddFingerWindow(self.worker, self.pin, self)
         self.addfinger_window.exec_()
-        self._listFingerprints()
+        if self.addfinger_window.saved:
+            self.model.add(self.addfinger_window.template_id, self.addfinger_window.name)
+        elif self.addfinger_window.template_id is not None:
+            # Captured but naming failed: the device is the only reliable source now.
+            self._listFingerprints()
 
     def show_error(self, title, msg):
         QMessageBox.critical(self, title, msg)
 
     def _deleteFingerprint(self):
-        row = self.fingerprint_list.currentRow()
-        if row < 0:
+        keys = self._selected()
+        if not keys:
             self.show_error("No Fingerprint",
                             "Select a fingerprint to remove it")
             return
 
+        what = "fingerprint" if len(keys) == 1 else f"{len(keys)} fingerprints"
+        reply = QMessageBox.question(
+            self, "Delete Fingerprint", f"Are you sure you want to delete {what}?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        self._submit_batch(
+            lambda m: m.remove_fingerprints(self.pin, keys), self.model.remove,
+            "Delete failed", "Fingerprint successfully deleted.")
+
+    def _deleteAllFingerprints(self):
         reply = QMessageBox.question(
-            self, "Delete Fingerprint", "Are you sure you want to delete fingerprint?",
+            self, "Delete All Fingerprints",
+            "Are you sure you want to delete every fingerprint on this key?",
             QMessageBox.Yes | QMessageBox.No, QMessageBox.No
         )
         if reply != QMessageBox.Yes:
             return
-        key = list(self.fingerprints.keys())[
-            self.fingerprint_list.currentRow()]
+        self._submit_batch(
+            lambda m: m.remove_all_fingerprints(self.pin), self.model.remove,
+            "Delete failed", "All fingerprints deleted.")
+
+    def _renameFingerprint(self):
+        keys = self._selected()
+        if not keys:
+            return
+        current = self.model.index_of(keys[0]).data(Qt.EditRole)
+        label = "Name:" if len(keys) == 1 else f"Name ({len(keys)} fingerprints are numbered):"
+        name, ok = QInputDialog.getText(
+            self, "Rename Fingerprint", label, QLineEdit.Normal, current)
+        name = name.strip()
+        if not ok or not name:
+            return
+        if len(keys) == 1:
+            names = {keys[0]: name}
+        else:
+            names = {key: f"{name} {i}" for i, key in enumerate(keys, 1)}
+        self._submit_batch(
+            lambda m: m.rename_fingerprints(self.pin, names),
+            lambda key: self.model.rename(key, names[key]), "Rename failed", None)
+
+    def _submit_batch(self, fn, on_success, title: str, done_message: Optional[str]):
+        """Run a batch manager call and apply each template that succeeded to the model.
+
+        Templates that failed are listed with their error and the list is
+        enumerated again, since the key is the only reliable source then.
+        """
+        def finished(results: Dict[bytes, Optional[Exception]]):
+            failed = []
+            for key, error in results.items():
+                if error is None:
+                    on_success(key)
+                else:
+                    name = self.model.index_of(key).data() or key.hex()
+                    failed.append(f"{name}: {error}")
+            if failed:
+                self.show_error(title, "\n".join(failed))
+                self._listFingerprints()
+            elif done_message:
+                QMessageBox.information(self, "Success", done_message)
 
-        self.manager.remove_fingerprint(self.pin, key)
-        QMessageBox.information(
-            self, "Success", "Fingerprint successfully deleted.")
-        self._listFingerprints()
+        def error(e):
+            self.show_error(title, str(e))
+            self._listFingerprints()
+        self.worker.submit(fn, finished, error)
@@ -1,7 +1,6 @@
 import sys
 import os
 from PyQt5.QtGui import QIcon
-from PyQt5.QtSvg import QSvgWidget
 
 
 icon_path = ''
@@ -23,7 +22,3 @@ class FingerIcon(QIcon):
     def __init__(self):
         super().__init__(os.path.join(icon_path, "fingerprint-scan.svg"))
 
-
-class FingerprintWidget(QSvgWidget):
-    def __init__(self):
-        super().__init__(os.path.join(icon_path, "fingerprint-scan.svg"))
@@ -1,53 +1,110 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
 from PyQt5.QtWidgets import (
-    QMainWindow, QListWidget, QTextEdit, QPushButton, QLabel,
-    QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QInputDialog, QLineEdit, QAction, QMenu, QListWidgetItem
+    QApplication, QMainWindow, QTableView, QTextEdit, QPushButton, QLabel,
+    QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QInputDialog, QLineEdit, QAction, QActionGroup, QMenu,
+    QFileDialog, QAbstractItemView, QHeaderView
 )
-from PyQt5.QtCore import QTimer, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, QObject, QModelIndex, pyqtSignal
+from .devicetable import DeviceTableModel, DeviceFilterModel
 from .icon import LogoIcon
 from .theme import ThemeManager
-from ..manager import Fido2Manager
-from .fingerprints import FingerprintsWindow
-import time
+from ..hotplug import HotplugMonitor, HotplugEvent, DEVICE_ADDED
+from ..inventory import DeviceInventory
+from ..mds import MetadataIndex, open_default_metadata
+from .worker import DeviceCommandWorker, EventLoopMonitor
 
+# python-fido2 (and cryptography behind it), the SVG module and the dialogs are
+# imported when first needed so that the window can paint before they load.
+if TYPE_CHECKING:
+    from ..manager import Fido2Manager
+    from ..reset_flow import ResetTarget
 
-class DeviceDiscoverer(QThread):
-    devices_found = pyqtSignal(list)
 
-    def __init__(self, manager):
-        super().__init__()
-        self.manager = manager
-        self._running = True
+COLUMN_WIDTHS = [200, 80, 110, 60, 80, 120]
+# How long closing the window waits for a cancelled export to stop.
+EXPORT_STOP_TIMEOUT = 0.5
 
-    def run(self):
-        while self._running:
-            try:
-                devices = self.manager.discover()
-                self.devices_found.emit(devices)
-            except:
-                pass
-            time.sleep(3)
 
-    def stop(self):
-        self._running = False
-        self.quit()
-        self.wait()
+class HotplugBridge(QObject):
+    """Re-emits HotplugMonitor events as Qt signals on the GUI thread."""
+    device_added = pyqtSignal(object)
+    device_removed = pyqtSignal(object)
+
+    def __init__(self, monitor: HotplugMonitor, parent=None):
+        super().__init__(parent)
+        self._unsubscribe = monitor.subscribe(self._on_event)
+
+    def _on_event(self, event: HotplugEvent):
+        if event.kind == DEVICE_ADDED:
+            self.device_added.emit(event.path)
+        else:
+            self.device_removed.emit(event.path)
+
+    def close(self):
+        self._unsubscribe()
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, manager: Fido2Manager, theme: ThemeManager):
+    reset_changed = pyqtSignal(object)
+    export_progress = pyqtSignal(object, str)
+    export_finished = pyqtSignal(object)
+
+    def __init__(self, manager: Optional[Fido2Manager], theme: ThemeManager,
+                 hotplug: HotplugMonitor = None, inventory: Optional[DeviceInventory] = None):
+        """manager may be None, a default one is then created after the first paint.
+
+        The keys inventory remembers from the last run are listed until live
+        discovery has finished.
+        """
         super().__init__()
         self.manager = manager
+        self.inventory = inventory if inventory is not None else getattr(manager, "inventory", None)
         self.theme = theme
+        self.hotplug = hotplug
+        self.hotplug_bridge = None
         self.setWindowTitle("FIDO2 Key Manager")
         self.setWindowIcon(LogoIcon())
-        self.resize(800, 600)
+        self.resize(1000, 600)
 
         self.last_selected_path = None
         self.reset_pending = False
-        self.reset_start_time = 0
+        self.reset_session = None
         self.devices = []
-
-        self.device_list = QListWidget()
+        self.workers = {}
+        self._busy_workers = set()
+        self.discovery = None
+        self.stall_monitor = EventLoopMonitor(parent=self)
+        self.diagnostics_window = None
+        self.export_thread = None
+        self.export_cancel = threading.Event()
+        self.export_count = 0
+        self._start_scheduled = False
+        self.metadata: Optional[MetadataIndex] = None
+
+        self.device_model = DeviceTableModel(self.inventory, self)
+        self.device_proxy = DeviceFilterModel(self.device_model, self)
+        self.device_filter = QLineEdit()
+        self.device_filter.setPlaceholderText("Filter devices...")
+        self.device_filter.setClearButtonEnabled(True)
+        self.device_table = QTableView()
+        self.device_table.setModel(self.device_proxy)
+        self.device_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.device_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.device_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.device_table.setSortingEnabled(True)
+        self.device_table.sortByColumn(-1, Qt.AscendingOrder)
+        self.device_table.setWordWrap(False)
+        self.device_table.verticalHeader().hide()
+        # Fixed widths: sizing to contents would measure every row on each change.
+        self.device_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.device_table.horizontalHeader().setStretchLastSection(True)
+        for column, width in enumerate(COLUMN_WIDTHS):
+            self.device_table.setColumnWidth(column, width)
         self.refresh_btn = QPushButton("Refresh")
         self.info_view = QTextEdit()
         self.info_view.setReadOnly(True)
@@ -59,7 +116,8 @@ class MainWindow(QMainWindow):
 
         left = QVBoxLayout()
         left.addWidget(QLabel("Connected Devices:"))
-        left.addWidget(self.device_list)
+        left.addWidget(self.device_filter)
+        left.addWidget(self.device_table)
         left.addWidget(self.refresh_btn)
 
         right = QVBoxLayout()
@@ -82,7 +140,7 @@ class MainWindow(QMainWindow):
         lw.setLayout(left)
         rw = QWidget()
         rw.setLayout(right)
-        main_layout.addWidget(lw, 1)
+        main_layout.addWidget(lw, 3)
         main_layout.addWidget(rw, 2)
 
         cw = QWidget()
@@ -92,19 +150,71 @@ class MainWindow(QMainWindow):
         self.create_menubar()
 
         self.refresh_btn.clicked.connect(self.on_refresh)
-        self.device_list.currentRowChanged.connect(self.on_select_device)
-        self.device_list.itemClicked.connect(self.on_select_device)
+        self.device_filter.textChanged.connect(self.device_proxy.setFilterFixedString)
+        self.device_table.selectionModel().currentRowChanged.connect(self.on_select_device)
         self.set_pin_btn.clicked.connect(self.on_set_pin)
         self.reset_btn.clicked.connect(self.on_reset)
         self.exit_btn.clicked.connect(self.on_exit)
         self.finger_btn.clicked.connect(self.on_fingerprints)
-
+        self.reset_changed.connect(self.on_reset_changed)
+        self.export_progress.connect(self.on_export_progress)
+        self.export_finished.connect(self.on_export_finished)
+
+        # A hub replug reports many devices at once, rediscover once per burst.
+        self._discover_timer = QTimer(self)
+        self._discover_timer.setSingleShot(True)
+        self._discover_timer.timeout.connect(self.on_devices_changed)
+        self.set_busy(True)
+        self._show_last_known()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.discovery is None and not self._start_scheduled:
+            # Device work starts once the user can see the window.
+            self._start_scheduled = True
+            QTimer.singleShot(0, self.start_devices)
+
+    def start_devices(self):
+        """Create the manager if needed, then start discovery and hotplug monitoring."""
+        if self.discovery is not None:
+            return
+        if self.manager is None:
+            try:
+                from ..manager import Fido2Manager
+                from ..metrics import CommandMetrics
+                self.manager = Fido2Manager(metrics=CommandMetrics(), inventory=self.inventory)
+            except Exception:
+                QMessageBox.critical(
+                    self, "Missing dependency",
+                    "python-fido2 is required. Install with: pip install python-fido2")
+                QApplication.exit(1)
+                return
+        if self.hotplug is None:
+            self.hotplug = HotplugMonitor(self.manager.provider.event_source())
+        self.discovery = DeviceCommandWorker(self.manager, parent=self)
+        self.discovery.busy_changed.connect(
+            lambda busy: self._on_worker_busy(self.discovery, busy))
+        self.hotplug_bridge = HotplugBridge(self.hotplug, self)
+        self.hotplug_bridge.device_added.connect(self._schedule_discover)
+        self.hotplug_bridge.device_removed.connect(self._schedule_discover)
+        self.diagnostics_action.setEnabled(self.manager.metrics is not None)
+        self.set_busy(False)
+
+        # Opening the metadata may have to index a new MDS BLOB first; the
+        # discovery worker does it before its first discover.
+        self.discovery.submit(lambda m: open_default_metadata(), self._set_metadata)
         self.on_refresh()
+        self.hotplug.start()
+        self.stall_monitor.start()
 
     def create_menubar(self):
         menubar = self.menuBar()
 
         file_menu = menubar.addMenu("File")
+        export_action = QAction("Export Inventory...", self)
+        export_action.triggered.connect(self.on_export)
+        file_menu.addAction(export_action)
+        file_menu.addSeparator()
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.on_exit)
         file_menu.addAction(exit_action)
@@ -112,26 +222,88 @@ class MainWindow(QMainWindow):
         view_menu = menubar.addMenu("View")
         theme_menu = QMenu("Theme", self)
 
-        dark_action = QAction("Dark", self)
+        theme_group = QActionGroup(self)
+        dark_action = QAction("Dark", theme_group, checkable=True)
+        dark_action.setChecked(self.theme.dark)
         dark_action.triggered.connect(lambda: self.switch_theme(True))
-        light_action = QAction("Light", self)
+        light_action = QAction("Light", theme_group, checkable=True)
+        light_action.setChecked(not self.theme.dark)
         light_action.triggered.connect(lambda: self.switch_theme(False))
 
         theme_menu.addAction(dark_action)
         theme_menu.addAction(light_action)
         view_menu.addMenu(theme_menu)
 
+        tools_menu = menubar.addMenu("Tools")
+        provision_action = QAction("Provision All Devices...", self)
+        provision_action.triggered.connect(self.on_provision)
+        tools_menu.addAction(provision_action)
+        reset_all_action = QAction("Reset All Devices...", self)
+        reset_all_action.triggered.connect(self.on_reset_all)
+        tools_menu.addAction(reset_all_action)
+        tools_menu.addSeparator()
+        self.diagnostics_action = QAction("Diagnostics...", self)
+        self.diagnostics_action.triggered.connect(self.on_diagnostics)
+        self.diagnostics_action.setEnabled(False)
+        tools_menu.addAction(self.diagnostics_action)
+
         help_menu = menubar.addMenu("Help")
         about_action = QAction("About", self)
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
 
-    def switch_theme(self, dark: bool):
-        if dark:
-            self.theme.apply_dark()
+    def on_provision(self):
+        from .provision_window import ProvisionWindow
+        self.provision_window = ProvisionWindow(self.manager, self, discovery=self.discovery)
+        self.provision_window.exec_()
+        self.on_devices_changed()
+
+    def on_diagnostics(self):
+        from .diagnostics import DiagnosticsWindow
+        if self.diagnostics_window is None:
+            self.diagnostics_window = DiagnosticsWindow(
+                self.manager.metrics, self.stall_monitor, self, pool=self.manager.pool,
+                retry_stats=self.manager.retry_stats)
+        self.diagnostics_window.show()
+        self.diagnostics_window.raise_()
+
+    def worker_for(self, path) -> DeviceCommandWorker:
+        """Return the command worker of a key, starting one on first use."""
+        worker = self.workers.get(path)
+        if worker is None:
+            worker = DeviceCommandWorker(self.manager, path, self)
+            worker.busy_changed.connect(
+                lambda busy, w=worker: self._on_worker_busy(w, busy))
+            self.workers[path] = worker
+        return worker
+
+    def _drop_stale_workers(self, devices):
+        present = {d.get('path') for d in devices}
+        for path in list(self.workers):
+            if path not in present:
+                worker = self.workers.pop(path)
+                self._on_worker_busy(worker, False)
+                worker.stop(wait=False)
+                worker.deleteLater()
+
+    def _on_worker_busy(self, worker, busy: bool):
+        if busy:
+            self._busy_workers.add(worker)
+        else:
+            self._busy_workers.discard(worker)
+        self.set_busy(bool(self._busy_workers))
+
+    def set_busy(self, busy: bool):
+        for btn in (self.set_pin_btn, self.reset_btn, self.finger_btn, self.refresh_btn):
+            btn.setEnabled(not busy)
+        if busy:
+            self.statusBar().showMessage("Working...")
         else:
-            self.theme.restore_system()
-        self.is_dark = dark
+            self.statusBar().clearMessage()
+
+    def switch_theme(self, dark: bool):
+        if dark != self.theme.dark:
+            self.theme.set_dark(dark)
 
     def show_about(self):
         QMessageBox.information(
@@ -147,10 +319,93 @@ class MainWindow(QMainWindow):
         )
         if reply != QMessageBox.Yes:
             event.ignore()
+            return
+        if self.reset_session:
+            self.reset_session.cancel()
+        if self.export_thread:
+            # An export stuck on a busy key must not freeze the window; the
+            # daemon thread finishes on its own once the manager is closed.
+            self.export_cancel.set()
+            self.export_thread.join(EXPORT_STOP_TIMEOUT)
+        if self.discovery is not None:
+            self.hotplug_bridge.close()
+            self.hotplug.stop()
+            for worker in list(self.workers.values()) + [self.discovery]:
+                worker.stop()
+            self.manager.close()
+        if self.metadata is not None:
+            self.metadata.close()
+        if self.inventory is not None:
+            self.inventory.close()
 
     def on_exit(self):
         self.close()
 
+    def on_export(self):
+        if self.discovery is None:
+            return
+        if self.export_thread:
+            QMessageBox.information(self, "Export Inventory", "An export is already running.")
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Inventory", "fido2-inventory.jsonl",
+            "JSON Lines (*.jsonl);;CSV (*.csv)", options=QFileDialog.DontConfirmOverwrite)
+        if not path:
+            return
+        resume = False
+        if os.path.exists(path):
+            box = QMessageBox(QMessageBox.Question, "Export Inventory",
+                              f"{os.path.basename(path)} already exists.", parent=self)
+            box.setInformativeText("Resume adds only the keys that are not in the file yet.")
+            resume_btn = box.addButton("Resume", QMessageBox.AcceptRole)
+            overwrite_btn = box.addButton("Overwrite", QMessageBox.DestructiveRole)
+            box.addButton(QMessageBox.Cancel)
+            box.exec_()
+            if box.clickedButton() not in (resume_btn, overwrite_btn):
+                return
+            resume = box.clickedButton() is resume_btn
+        pin, ok = QInputDialog.getText(
+            self, "Export Inventory",
+            "PIN of the keys (leave empty to skip fingerprints and credentials):",
+            QLineEdit.Password)
+        if not ok:
+            return
+
+        from ..export import export_inventory
+        self.export_cancel.clear()
+        self.export_count = 0
+        self.statusBar().showMessage("Exporting inventory...")
+
+        def run():
+            try:
+                result = export_inventory(self.manager, path, pin=pin or None, resume=resume,
+                                          on_progress=self.export_progress.emit,
+                                          cancel=self.export_cancel)
+            except Exception as e:
+                result = e
+            self.export_finished.emit(result)
+        self.export_thread = threading.Thread(target=run, name="inventory-export", daemon=True)
+        self.export_thread.start()
+
+    def on_export_progress(self, path, state: str):
+        self.export_count += 1
+        self.device_model.update(path, status=f"Export: {state}")
+        self.statusBar().showMessage(f"Exporting inventory... {self.export_count} key(s), {path} {state}")
+
+    def on_export_finished(self, result):
+        self.export_thread = None
+        self.statusBar().clearMessage()
+        if isinstance(result, Exception):
+            self.show_error("Export failed", str(result))
+            return
+        text = f"{result.written} key(s) written, {result.skipped} skipped."
+        if result.failed:
+            text += "\n\nNot exported, export again and choose Resume to add them:\n" + "\n".join(
+                f"{path}: {error}" for path, error in result.failed.items())
+            QMessageBox.warning(self, "Export Inventory", text)
+        else:
+            QMessageBox.information(self, "Export Inventory", text)
+
     def show_error(self, title, msg):
         QMessageBox.critical(self, title, msg)
 
@@ -158,46 +413,109 @@ class MainWindow(QMainWindow):
         QMessageBox.information(self, title, msg)
 
     def update_device_list(self, devices):
-        current_idx = self.device_list.currentRow()
-        current_path = None
-        if current_idx >= 0 and current_idx < len(self.devices):
-            current_path = self.devices[current_idx].get('path')
-
+        """Apply a discover() result to the table, changing only the rows that differ."""
+        current = self._current_device()
+        present = {d.get('path') for d in devices}
+        if current is not None and current.get('path') not in present:
+            # Otherwise the view would move the selection to a neighbouring key.
+            self.device_table.selectionModel().clear()
+            current = None
+
+        self._drop_stale_workers(devices)
         self.devices = devices
-        self.device_list.blockSignals(True)
-        self.device_list.clear()
-        for d in devices:
-            label = f"{d.get('product_string') or 'Unknown'}"
-            self.device_list.addItem(label)
-        self.device_list.blockSignals(False)
-
-        if current_path:
-            for i, d in enumerate(devices):
-                if d.get('path') == current_path:
-                    self.device_list.setCurrentRow(i)
-                    break
-
-        if not self.reset_pending:
-            self.info_view.setPlainText(f"Found {len(devices)} device(s)")
+        self.device_model.set_devices(devices)
+
+        if current is not None and current.get("known"):
+            # The remembered row just went live, read the key itself.
+            self.on_select_device(self.device_table.currentIndex())
+        elif current is None and not self.reset_pending:
+            self._set_info_text(f"Found {len(devices)} device(s)")
+
+    def _current_device(self) -> Optional[dict]:
+        index = self.device_table.currentIndex()
+        if not index.isValid():
+            return None
+        return self.device_model.device(self.device_proxy.mapToSource(index).row())
+
+    def _set_info_text(self, text: str):
+        if self.info_view.toPlainText() != text:
+            self.info_view.setPlainText(text)
+
+    def _show_last_known(self):
+        """List the keys that were attached last time, greyed out, until discovery replaces them."""
+        if self.inventory is None:
+            return
+        known = self.inventory.last_known()
+        if not known:
+            return
+        self.devices = [{**row, "known": row} for row in known]
+        self.device_model.set_devices(self.devices)
+        self.info_view.setPlainText(
+            f"{len(known)} device(s) attached last time, looking for devices...")
+
+    def _set_metadata(self, metadata: Optional[MetadataIndex]):
+        self.metadata = metadata
+        if metadata is not None:
+            self.device_model.set_metadata(metadata)
+
+    def _model_text(self, device) -> str:
+        model = self.device_model.model_of(device)
+        if not model:
+            return ""
+        return (f"Model: {model.get('description')}\n"
+                f"Certification: {model.get('certification') or 'not certified'}\n")
+
+    def _show_known_info(self, row):
+        info = row.get("info") or {}
+        seen = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["last_seen"]))
+        self.info_view.setPlainText(
+            self._model_text(row) +
+            f"Path: {row['path']}\n"
+            f"Versions: {row.get('versions')}\n"
+            f"AAGUID: {row.get('aaguid')}\n"
+            f"Extensions: {info.get('extensions')}\n"
+            f"Options: {row.get('options')}\n"
+            f"Fingerprints: {'unknown' if row.get('fingerprint_count') is None else row['fingerprint_count']}\n"
+            f"Last seen: {seen} (not queried yet)"
+        )
+
+    def _schedule_discover(self, _path=None):
+        self._discover_timer.start(0)
+
+    def on_devices_changed(self):
+        def failed(e):
+            if not self.reset_pending:
+                self.info_view.setPlainText(f"Discover failed: {e}")
+        self.discovery.submit(lambda m: m.discover(), self.update_device_list, failed)
 
     def on_refresh(self):
-        try:
-            devices = self.manager.discover()
-            self.update_device_list(devices)
-        except Exception as e:
-            self.show_error("Discover failed", str(e))
-
-    def on_select_device(self, idx: int | QListWidgetItem):
-        try:
-            if (isinstance(idx, QListWidgetItem)):
-                idx = self.device_list.currentRow()
-
-            if idx < 0 or idx >= len(self.devices):
+        def refresh(m: Fido2Manager):
+            m.invalidate_info()
+            return m.discover()
+        self.discovery.submit(
+            refresh, self.update_device_list,
+            lambda e: self.show_error("Discover failed", str(e)))
+
+    def on_select_device(self, index: QModelIndex, _previous: QModelIndex = None):
+        if not index.isValid():
+            return
+        device = self.device_model.device(self.device_proxy.mapToSource(index).row())
+        if device is None:
+            return
+        if device.get("known"):
+            self._show_known_info(device["known"])
+            return
+        path = device.get('path')
+        self.last_selected_path = path
+
+        def show(info):
+            if path != self.last_selected_path:
                 return
-            device = self.devices[idx]
-            self.last_selected_path = device.get('path')
-            info = self.manager.select_device(idx)
+            has_pin = info['options'].get("clientPin", False)
+            self.device_model.update(path, aaguid=info['aaguid'], options=info['options'],
+                                     has_pin=has_pin, status="Ready")
             pretty = (
+                self._model_text(info) +
                 f"Path: {info['path']}\n"
                 f"Versions: {info['versions']}\n"
                 f"AAGUID: {info['aaguid']}\n"
@@ -205,24 +523,33 @@ class MainWindow(QMainWindow):
                 f"Options: {info['options']}"
             )
             self.info_view.setPlainText(pretty)
-            if self.manager.has_pin():
+            if has_pin:
                 self.set_pin_btn.setText("Change PIN")
             else:
                 self.set_pin_btn.setText("Set PIN")
-        except Exception as e:
-            self.show_error("Select device failed", str(e))
+
+        self.info_view.setPlainText("Reading device info...")
+        self.worker_for(path).request_info(show, self._failed(path, "Select device failed"))
+
+    def _failed(self, path, title: str):
+        """Error handler that records the error as the key's last operation and reports it."""
+        def failed(e):
+            self.device_model.update(path, status=f"Failed: {e}")
+            self.show_error(title, str(e))
+        return failed
 
     def on_set_pin(self):
-        if self.device_list.currentRow() < 0:
+        if self._current_device() is None or not self.last_selected_path:
             self.show_error("No Device", "Please select a device first.")
             return
-        try:
-            if self.manager.has_pin():
+
+        def choose(has_pin):
+            if has_pin:
                 self.on_change_pin()
             else:
                 self.on_set_new_pin()
-        except Exception as err:
-            self.show_error("Error", str(err))
+        self.worker_for(self.last_selected_path).submit(
+            lambda m: m.has_pin(), choose, lambda e: self.show_error("Error", str(e)))
 
     def on_set_new_pin(self):
         new_pin, ok = QInputDialog.getText(
@@ -234,12 +561,15 @@ class MainWindow(QMainWindow):
         if not ok2 or confirm != new_pin:
             self.show_error("PIN Error", "PINs do not match.")
             return
-        try:
-            self.manager.set_pin(new_pin)
+
+        path = self.last_selected_path
+
+        def done(_):
+            self.device_model.update(path, has_pin=True, status="PIN set")
             self.show_info("Success", "PIN set successfully.")
             self.set_pin_btn.setText("Change PIN")
-        except Exception as e:
-            self.show_error("Set PIN failed", str(e))
+        self.worker_for(path).submit(
+            lambda m: m.set_pin(new_pin), done, self._failed(path, "Set PIN failed"))
 
     def on_change_pin(self):
         cur, ok = QInputDialog.getText(
@@ -255,20 +585,36 @@ class MainWindow(QMainWindow):
         if not ok3 or confirm != new_pin:
             self.show_error("PIN Error", "New PINs do not match.")
             return
-        try:
-            self.manager.change_pin(cur, new_pin)
+        path = self.last_selected_path
+
+        def done(_):
+            self.device_model.update(path, status="PIN changed")
             self.show_info("Success", "PIN changed successfully.")
-        except Exception as e:
-            self.show_error("Change PIN failed", str(e))
+        self.worker_for(path).submit(
+            lambda m: m.change_pin(cur, new_pin), done, self._failed(path, "Change PIN failed"))
 
     def on_reset(self):
-        if self.device_list.currentRow() < 0:
+        if self._current_device() is None or not self.last_selected_path:
             self.show_error("No Device", "Please select a device first.")
             return
+        device = next(
+            (d for d in self.devices if d.get('path') == self.last_selected_path), None)
+        if device:
+            self.start_reset([device])
+
+    def on_reset_all(self):
+        # Rows remembered from the inventory are not plugged in and cannot be replugged.
+        devices = [d for d in self.devices if not d.get("known")]
+        if not devices:
+            self.show_error("No Device", "No devices connected.")
+            return
+        self.start_reset(devices)
 
+    def start_reset(self, devices):
+        what = "the authenticator" if len(devices) == 1 else f"{len(devices)} authenticators"
         confirm = QMessageBox.question(
             self, "Reset Authenticator",
-            "This will factory-reset the authenticator.\n"
+            f"This will factory-reset {what}.\n"
             "You must disconnect and reconnect the device within 10 seconds.\n"
             "Continue?",
             QMessageBox.Yes | QMessageBox.No
@@ -276,108 +622,70 @@ class MainWindow(QMainWindow):
         if confirm != QMessageBox.Yes:
             return
 
+        from ..reset_flow import ResetSession
         self.reset_pending = True
-        self.reset_start_time = time.time()
-        self.info_view.setPlainText(
-            "Please DISCONNECT the device now and RECONNECT it within 10 seconds..."
-        )
-
+        self.reset_session = ResetSession(
+            self.manager, self.hotplug, self.reset_changed.emit)
+        self.reset_session.arm(devices)
         self.setEnabled(False)
+        self.reset_session.start()
 
-        QTimer.singleShot(1000, self.check_disconnect_for_reset)
-
-    def check_disconnect_for_reset(self):
-        if not self.reset_pending:
+    def on_reset_changed(self, target: ResetTarget):
+        from ..reset_flow import WAITING_REMOVAL, WAITING_INSERTION, FAILED
+        session = self.reset_session
+        if session is None or target not in session.targets:
             return
-
-        try:
-            elapsed = time.time() - self.reset_start_time
-            if elapsed > 10:
-                self.reset_pending = False
-                self.show_error(
-                    "Reset Timeout", "Device was not disconnected within 10 seconds.")
-                self.on_refresh()
-                self.setEnabled(True)
-                return
-            current_devices = self.manager.discover()
-            if any(dev.get('path') == self.last_selected_path for dev in current_devices):
-                self.info_view.setPlainText(
-                    "Waiting for device to be disconnected...")
-                QTimer.singleShot(1000, self.check_disconnect_for_reset)
-                return
-            else:
-                self.waiting_for_disconnect = False
-                self.info_view.setPlainText(
-                    "Device disconnected. Please RECONNECT within 10 seconds...")
-                self.reset_start_time = time.time()
-                QTimer.singleShot(1000, self.check_reconnect_for_reset)
-        except Exception as e:
-            self.info_view.setPlainText(
-                f"Error while checking disconnect: {str(e)}")
-            QTimer.singleShot(1000, self.check_disconnect_for_reset)
-
-    def check_reconnect_for_reset(self):
-        if not self.reset_pending or self.waiting_for_disconnect:
-            self.setEnabled(True)
-            return
-
-        elapsed = time.time() - self.reset_start_time
-        if elapsed > 10:
+        self.device_model.update(target.path, status=f"Reset: {target.state}")
+        lines = []
+        for t in session.targets:
+            name = t.product_string or t.path
+            line = f"{name}: {t.state}"
+            if t.error:
+                line += f" ({t.error})"
+            lines.append(line)
+        if any(t.state == WAITING_REMOVAL for t in session.targets):
+            lines.insert(0, "Please DISCONNECT the device now and RECONNECT it within 10 seconds...\n")
+        elif any(t.state == WAITING_INSERTION for t in session.targets):
+            lines.insert(0, "Device disconnected. Please RECONNECT within 10 seconds...\n")
+        self.info_view.setPlainText("\n".join(lines))
+
+        if session.finished.is_set():
+            self.reset_session = None
             self.reset_pending = False
-            self.show_error("Reset Timeout",
-                            "Device was not reconnected within 10 seconds.")
-            self.on_refresh()
             self.setEnabled(True)
-            return
-
-        try:
-            current_devices = self.manager.discover()
-            if len(current_devices) == 0:
-                remaining = int(10 - elapsed)
-                self.info_view.setPlainText(
-                    f"Waiting for reconnection... ({remaining}s left)")
-                QTimer.singleShot(1000, self.check_reconnect_for_reset)
-                return
-
-            reconnected = None
-            for dev in current_devices:
-                if dev.get('path') == self.last_selected_path:
-                    reconnected = dev
-                    break
-
-            if not reconnected:
-                remaining = int(10 - elapsed)
-                self.info_view.setPlainText(
-                    f"Wrong device reconnected. Waiting for correct one... ({remaining}s left)"
-                )
-                QTimer.singleShot(1000, self.check_reconnect_for_reset)
-                return
-
-            self.reset_pending = False
-            self.manager.select_device(self.devices.index(reconnected))
-            self.manager.reset()
-            self.show_info("Success", "Authenticator reset successfully!")
+            failed = [t for t in session.targets if t.state == FAILED]
+            if failed:
+                self.show_error("Reset failed", "\n".join(
+                    f"{t.product_string or t.path}: {t.error}" for t in failed))
+            else:
+                self.show_info("Success", "Authenticator reset successfully!")
             self.on_refresh()
-            self.setEnabled(True)
-
-        except Exception as e:
-            remaining = int(10 - elapsed)
-            self.info_view.setPlainText(
-                f"Error during reset check: {str(e)}\nRetrying... ({remaining}s left)"
-            )
-            QTimer.singleShot(1000, self.check_reconnect_for_reset)
 
     def on_fingerprints(self):
-        try:
-            if self.device_list.currentRow() < 0:
-                self.show_error("No Device", "Please select a device first.")
+        if self._current_device() is None or not self.last_selected_path:
+            self.show_error("No Device", "Please select a device first.")
+            return
+        path = self.last_selected_path
+        worker = self.worker_for(path)
+
+        def failed(err):
+            self._failed(path, "Error")(err)
+            self.manager.drop_token_sessions(path)
+
+        def open_window(fingerprints):
+            from .fingerprints import FingerprintsWindow
+            self.fingerprint_window = FingerprintsWindow(
+                worker, pin, self, fingerprints)
+            self.fingerprint_window.exec_()
+            self.manager.drop_token_sessions(path)
+
+        def ask_pin(_):
+            nonlocal pin
+            pin, ok = QInputDialog.getText(
+                self, "Enter PIN", "PIN:", QLineEdit.Password)
+            if not ok:
                 return
-            if self.manager.can_add_fingerprint():
-                pin, _ = QInputDialog.getText(
-                    self, "Enter PIN", "PIN:", QLineEdit.Password)
-                self.manager.list_fingerprints(pin)
-                self.fingerprint_window = FingerprintsWindow(
-                    self.manager, pin, self)
-                self.fingerprint_window.exec_()
-        except Exception as err:
-            self.show_error("Error", str(err))
+            worker.submit(lambda m: m.list_fingerprints(pin), open_window, failed)
+
+        pin = None
+        worker.submit(lambda m: m.can_add_fingerprint(), ask_pin, failed)
@@ -0,0 +1,173 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QComboBox, QLineEdit, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QProgressBar, QMessageBox
+)
+from PyQt5.QtCore import Qt, pyqtSignal
+import threading
+from typing import Optional
+from .icon import LogoIcon
+from .worker import DeviceCommandWorker
+from ..manager import Fido2Manager
+from ..provisioning import (
+    ProvisioningEngine, DeviceResult, STARTED, DONE, FAILED,
+    collect_info, set_pin, list_fingerprints
+)
+
+JOBS = ["Collect info", "Set / change PIN", "List fingerprints"]
+
+
+class ProvisionWindow(QDialog):
+    progress = pyqtSignal(object)
+    run_finished = pyqtSignal()
+
+    def __init__(self, manager: Fido2Manager, parent=None,
+                 discovery: Optional[DeviceCommandWorker] = None):
+        """discovery is the worker the keys are discovered on, a new one by default."""
+        super().__init__(parent)
+        self.manager = manager
+        self.discovery = discovery or DeviceCommandWorker(manager, parent=self)
+        self.engine = ProvisioningEngine(manager)
+        self.rows = {}
+        self.thread = None
+        self._closed = False
+        self.__initWindow()
+        self.progress.connect(self.on_progress)
+        self.run_finished.connect(self.on_finished)
+
+    def __initWindow(self):
+        self.setWindowTitle("Provision All Devices")
+        self.setWindowFlags(self.windowFlags() & ~
+                            Qt.WindowContextHelpButtonHint)
+        self.setWindowIcon(LogoIcon())
+        self.resize(640, 420)
+
+        self.job_box = QComboBox()
+        self.job_box.addItems(JOBS)
+        self.job_box.currentIndexChanged.connect(self._update_fields)
+        self.pin_edit = QLineEdit()
+        self.pin_edit.setEchoMode(QLineEdit.Password)
+        self.new_pin_edit = QLineEdit()
+        self.new_pin_edit.setEchoMode(QLineEdit.Password)
+
+        form = QFormLayout()
+        form.addRow("Job:", self.job_box)
+        form.addRow("Current PIN:", self.pin_edit)
+        form.addRow("New PIN:", self.new_pin_edit)
+
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Device", "Status", "Result"])
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.progress_bar = QProgressBar()
+        self.run_btn = QPushButton("Run")
+        self.close_btn = QPushButton("Close")
+        self.run_btn.clicked.connect(self.on_run)
+        self.close_btn.clicked.connect(self.close)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.progress_bar)
+        buttons.addWidget(self.run_btn)
+        buttons.addWidget(self.close_btn)
+
+        vbox = QVBoxLayout(self)
+        vbox.addLayout(form)
+        vbox.addWidget(self.table)
+        vbox.addLayout(buttons)
+        self._update_fields()
+
+    def _update_fields(self):
+        job = self.job_box.currentIndex()
+        self.pin_edit.setEnabled(job != 0)
+        self.new_pin_edit.setEnabled(job == 1)
+
+    def _make_job(self):
+        job = self.job_box.currentIndex()
+        pin = self.pin_edit.text()
+        if job == 0:
+            return collect_info
+        if job == 1:
+            if not self.new_pin_edit.text():
+                raise ValueError("Enter the new PIN.")
+            return set_pin(self.new_pin_edit.text(), pin or None)
+        if not pin:
+            raise ValueError("Enter the PIN of the keys.")
+        return list_fingerprints(pin)
+
+    def on_run(self):
+        try:
+            job = self._make_job()
+        except Exception as e:
+            QMessageBox.critical(self, "Provision", str(e))
+            return
+        self.run_btn.setEnabled(False)
+        self.discovery.submit(
+            lambda m: m.discover(), lambda devices: self._start(job, devices), self._discover_failed)
+
+    def _discover_failed(self, error: Exception):
+        self.run_btn.setEnabled(True)
+        if not self._closed:
+            QMessageBox.critical(self, "Provision", str(error))
+
+    def _start(self, job, devices):
+        if self._closed:
+            return
+        if not devices:
+            self.run_btn.setEnabled(True)
+            QMessageBox.information(self, "Provision", "No devices connected.")
+            return
+
+        self.rows = {}
+        self.table.setRowCount(len(devices))
+        for row, d in enumerate(devices):
+            self.rows[d["path"]] = row
+            self.table.setItem(row, 0, QTableWidgetItem(
+                f"{d.get('product_string') or 'Unknown'} ({d['path']})"))
+            self.table.setItem(row, 1, QTableWidgetItem("queued"))
+            self.table.setItem(row, 2, QTableWidgetItem(""))
+        self.progress_bar.setRange(0, len(devices))
+        self.progress_bar.setValue(0)
+
+        paths = list(self.rows)
+        self.thread = threading.Thread(
+            target=self._run, args=(job, paths), name="provision-dialog", daemon=True)
+        self.thread.start()
+
+    def _run(self, job, paths):
+        try:
+            self.engine.run(job, paths, self.progress.emit)
+        finally:
+            self.run_finished.emit()
+
+    def on_progress(self, result: DeviceResult):
+        row = self.rows.get(result.path)
+        if row is None:
+            return
+        self.table.item(row, 1).setText(result.state)
+        if result.state == FAILED:
+            self.table.item(row, 2).setText(str(result.error))
+        elif result.state == DONE:
+            self.table.item(row, 2).setText(_summary(result.value))
+        if result.state != STARTED:
+            self.progress_bar.setValue(self.progress_bar.value() + 1)
+
+    def on_finished(self):
+        self.run_btn.setEnabled(True)
+        self.thread = None
+
+    def closeEvent(self, event):
+        # Keys not started yet are skipped; the running jobs finish in the background.
+        self._closed = True
+        if self.thread:
+            self.engine.cancel()
+        super().closeEvent(event)
+
+
+def _summary(value) -> str:
+    if value is True:
+        return "ok"
+    if isinstance(value, dict) and "aaguid" in value:
+        return f"AAGUID {value['aaguid']}, PIN {'set' if value.get('has_pin') else 'not set'}"
+    if isinstance(value, dict):
+        return ", ".join(str(v) for v in value.values()) or "no fingerprints"
+    return str(value)
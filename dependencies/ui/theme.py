@@ -1,8 +1,10 @@
 import sys
 import os
+from typing import Dict, Optional
 from PyQt5.QtGui import QPalette, QColor
-from PyQt5.QtCore import Qt, QObject, QEvent
-from PyQt5.QtWidgets import QApplication, QStyleFactory
+from PyQt5.QtCore import Qt, QObject, QEvent, QSettings
+from PyQt5.QtWidgets import QApplication, QStyle, QStyleFactory
+from ..inventory import data_dir
 
 
 class DarkTitleBarApplier(QObject):
@@ -21,57 +23,124 @@ class DarkTitleBarApplier(QObject):
         return super().eventFilter(obj, event)
 
 
+THEME_KEY = "theme"
+DARK = "dark"
+SYSTEM = "system"
+
+
+def default_settings() -> QSettings:
+    """The GUI preferences file, next to the inventory (see inventory.data_dir)."""
+    return QSettings(os.path.join(data_dir(), "settings.ini"), QSettings.IniFormat)
+
+
+def dark_palette() -> QPalette:
+    palette = QPalette()
+    palette.setColor(QPalette.Window, QColor(53, 53, 53))
+    palette.setColor(QPalette.WindowText, Qt.white)
+    palette.setColor(QPalette.Base, QColor(35, 35, 35))
+    palette.setColor(QPalette.AlternateBase, QColor(53, 53, 53))
+    palette.setColor(QPalette.ToolTipBase, Qt.white)
+    palette.setColor(QPalette.ToolTipText, Qt.white)
+    palette.setColor(QPalette.Text, Qt.white)
+    palette.setColor(QPalette.Button, QColor(53, 53, 53))
+    palette.setColor(QPalette.ButtonText, Qt.white)
+    palette.setColor(QPalette.BrightText, Qt.red)
+    palette.setColor(QPalette.Link, QColor(42, 130, 218))
+    palette.setColor(QPalette.Highlight, QColor(42, 130, 218))
+    palette.setColor(QPalette.HighlightedText, Qt.black)
+    return palette
+
+
 class ThemeManager:
-    def __init__(self, app: QApplication):
+    """Switches the application between the dark theme and the system one.
+
+    Palettes and styles are built once and reused, and the Windows title
+    bar filter is a single object installed only while the dark theme is
+    on, so a switch costs the same however often the theme was toggled.
+    set_dark() remembers the choice in settings; call apply_saved() before
+    the first window is shown to start with it.
+    """
+
+    def __init__(self, app: QApplication, settings: Optional[QSettings] = None):
         self.app = app
+        self.settings = settings
         self.original_style_name = app.style().objectName()
         self.original_palette = QPalette(app.palette())
+        self.dark = False
+        self._dark_palette: Optional[QPalette] = None
+        self._styles: Dict[str, QStyle] = {}
+        # Keeps cached styles alive: QApplication deletes a replaced style it owns.
+        self._style_owner = QObject()
+        self._titlebar = DarkTitleBarApplier(True)
+        self._titlebar_on = False
 
     def apply_dark(self):
-        dark_palette = QPalette()
-        dark_palette.setColor(QPalette.Window, QColor(53, 53, 53))
-        dark_palette.setColor(QPalette.WindowText, Qt.white)
-        dark_palette.setColor(QPalette.Base, QColor(35, 35, 35))
-        dark_palette.setColor(QPalette.AlternateBase, QColor(53, 53, 53))
-        dark_palette.setColor(QPalette.ToolTipBase, Qt.white)
-        dark_palette.setColor(QPalette.ToolTipText, Qt.white)
-        dark_palette.setColor(QPalette.Text, Qt.white)
-        dark_palette.setColor(QPalette.Button, QColor(53, 53, 53))
-        dark_palette.setColor(QPalette.ButtonText, Qt.white)
-        dark_palette.setColor(QPalette.BrightText, Qt.red)
-        dark_palette.setColor(QPalette.Link, QColor(42, 130, 218))
-        dark_palette.setColor(QPalette.Highlight, QColor(42, 130, 218))
-        dark_palette.setColor(QPalette.HighlightedText, Qt.black)
-
-        try:
-            fusion = QStyleFactory.create("Fusion")
-            if fusion is not None:
-                self.app.setStyle(fusion)
-        except Exception:
-            pass
-
-        self.app.setPalette(dark_palette)
-        enable_dark_titlebar_globally(self.app, True)
+        if self._dark_palette is None:
+            self._dark_palette = dark_palette()
+        self._set_style(self._style("Fusion"))
+        self.app.setPalette(self._dark_palette)
+        self._set_titlebars(True)
+        self.dark = True
 
     def restore_system(self):
-        self.app.setPalette(QPalette(self.original_palette))
-        enable_dark_titlebar_globally(self.app, False)
-        try:
-            if self.original_style_name:
-                style = QStyleFactory.create(self.original_style_name)
-                if style is not None:
-                    self.app.setStyle(style)
-                else:
-                    self.app.setStyle(QStyleFactory.create("WindowsVista") or QStyleFactory.create(
-                        "Windows") or QStyleFactory.create("Fusion"))
-            else:
-                self.app.setStyle(QStyleFactory.create("WindowsVista") or QStyleFactory.create(
-                    "Windows") or QStyleFactory.create("Fusion"))
-        except Exception:
-            try:
-                self.app.setStyle(QStyleFactory.create("Fusion"))
-            except Exception:
-                pass
+        self.app.setPalette(self.original_palette)
+        self._set_titlebars(False)
+        self._set_style(self._style(self.original_style_name, "WindowsVista", "Windows", "Fusion"))
+        self.dark = False
+
+    def set_dark(self, dark: bool):
+        """Switch theme and remember the choice for the next start."""
+        if dark:
+            self.apply_dark()
+        else:
+            self.restore_system()
+        settings = self._settings()
+        settings.setValue(THEME_KEY, DARK if dark else SYSTEM)
+        settings.sync()
+
+    def apply_saved(self):
+        """Apply the remembered theme; the system one needs no work."""
+        if self._settings().value(THEME_KEY, SYSTEM) == DARK:
+            self.apply_dark()
+
+    def _settings(self) -> QSettings:
+        if self.settings is None:
+            self.settings = default_settings()
+        return self.settings
+
+    def _style(self, *names: str) -> Optional[QStyle]:
+        """The first of the named styles that exists, created on first use."""
+        for name in names:
+            if not name:
+                continue
+            style = self._styles.get(name.lower())
+            if style is None:
+                style = QStyleFactory.create(name)
+                if style is None:
+                    continue
+                self._styles[name.lower()] = style
+            return style
+        return None
+
+    def _set_style(self, style: Optional[QStyle]):
+        current = self.app.style()
+        if style is None or current is style:
+            return
+        if any(current is cached for cached in self._styles.values()):
+            current.setParent(self._style_owner)
+        self.app.setStyle(style)
+
+    def _set_titlebars(self, enable: bool):
+        if not is_windows() or enable == self._titlebar_on:
+            return
+        self._titlebar_on = enable
+        for widget in self.app.topLevelWidgets():
+            set_windows_dark_titlebar(widget, enable)
+        # Windows shown later start light anyway, so the filter is only needed while dark.
+        if enable:
+            self.app.installEventFilter(self._titlebar)
+        else:
+            self.app.removeEventFilter(self._titlebar)
 
 
 def is_windows():
@@ -97,15 +166,3 @@ def set_windows_dark_titlebar(window, enable=True):
                                  ctypes.byref(value), ctypes.sizeof(value))
     except Exception as e:
         pass
-
-
-def enable_dark_titlebar_globally(app: QApplication, enable=True):
-    if not is_windows():
-        return
-
-    for widget in app.topLevelWidgets():
-        set_windows_dark_titlebar(widget, enable)
-
-    filter_ = DarkTitleBarApplier(enable)
-    app.installEventFilter(filter_)
-    return filter_
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable, Optional, Set
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from ..scheduler import PRIORITY_COMMAND
+
+if TYPE_CHECKING:
+    from ..manager import Fido2Manager
+
+
+class _Command:
+    def __init__(self, on_result, on_error):
+        self.on_result = on_result
+        self.on_error = on_error
+        self.future: Optional[Future] = None
+
+
+class DeviceCommandWorker(QObject):
+    """Runs manager calls for one key on the manager's command queue of that key.
+
+    submit() takes a callable receiving a Fido2Manager bound to the key (or
+    the shared manager when path is None, for discovery) and delivers its
+    result or exception to on_result/on_error on the GUI thread. The queue is
+    shared with every other user of the key, see scheduler.py. busy_changed
+    reports when the worker starts and stops having work queued.
+    """
+    busy_changed = pyqtSignal(bool)
+    _done = pyqtSignal(object)
+
+    def __init__(self, manager: Fido2Manager, path=None, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.path = path
+        self.pending = 0
+        self._commands: Set[_Command] = set()
+        self._stopped = False
+        self._done.connect(self._on_done)
+
+    def submit(self, fn: Callable[[Fido2Manager], Any],
+               on_result: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               priority: int = PRIORITY_COMMAND, event: Optional[threading.Event] = None):
+        """Queue fn with a scheduler priority; event is set if the key's commands are cancelled."""
+        self._watch(self.manager.submit(self.path, fn, priority, event=event), on_result, on_error)
+
+    def request_info(self, on_result: Optional[Callable[[Any], None]] = None,
+                     on_error: Optional[Callable[[Exception], None]] = None, refresh: bool = False):
+        """Deliver the key's get_info(); concurrent requests share one getInfo, see Fido2Manager.request_info."""
+        self._watch(self.manager.request_info(self.path, refresh), on_result, on_error)
+
+    def _watch(self, future: Future, on_result, on_error):
+        command = _Command(on_result, on_error)
+        self.pending += 1
+        if self.pending == 1:
+            self.busy_changed.emit(True)
+        self._commands.add(command)
+        command.future = future
+        future.add_done_callback(lambda _: self._emit_done(command))
+
+    def _emit_done(self, command: _Command):
+        # Called on the queue's thread, the signal hands the command to the GUI thread.
+        try:
+            self._done.emit(command)
+        except RuntimeError:
+            pass  # The worker was stopped and deleted meanwhile.
+
+    def cancel(self) -> int:
+        """Interrupt the key's running command and drop its queued user presence ones."""
+        return self.manager.cancel(self.path)
+
+    def _on_done(self, command: _Command):
+        self._commands.discard(command)
+        self.pending -= 1
+        if self.pending == 0:
+            self.busy_changed.emit(False)
+        if self._stopped:
+            return
+        if command.future.cancelled():
+            error = concurrent.futures.CancelledError("Cancelled")
+        else:
+            error = command.future.exception()
+        if error is not None:
+            if command.on_error:
+                command.on_error(error)
+        elif command.on_result:
+            command.on_result(command.future.result())
+
+    def stop(self, wait: bool = True):
+        """Drop the commands that have not started; with wait, also wait for the running one."""
+        self._stopped = True
+        commands = list(self._commands)
+        for command in commands:
+            command.future.cancel()
+        if wait:
+            concurrent.futures.wait([c.future for c in commands])
+
+
+class EventLoopMonitor(QObject):
+    """Measures how late the GUI event loop runs a short periodic timer.
+
+    max_stall_ms is the worst delay seen since the last reset(); it bounds how
+    long the window was unresponsive.
+    """
+
+    def __init__(self, interval_ms: int = 10, parent=None):
+        super().__init__(parent)
+        self.interval_ms = interval_ms
+        self.max_stall_ms = 0.0
+        self.samples = 0
+        self._last = None
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        self.reset()
+        self._timer.start(self.interval_ms)
+
+    def stop(self):
+        self._timer.stop()
+
+    def reset(self):
+        self.max_stall_ms = 0.0
+        self.samples = 0
+        self._last = time.perf_counter()
+
+    def _tick(self):
+        now = time.perf_counter()
+        stall = (now - self._last) * 1000 - self.interval_ms
+        self._last = now
+        self.samples += 1
+        if stall > self.max_stall_ms:
+            self.max_stall_ms = stall
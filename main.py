@@ -1,30 +1,25 @@
-from PyQt5.QtWidgets import QApplication, QMessageBox
+from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 import sys
-from dependencies.manager import Fido2Manager
+from dependencies.inventory import open_default_inventory
 from dependencies.ui.mainwindow import MainWindow
 from dependencies.ui.theme import ThemeManager
 
 
-def main():
-    app = QApplication(sys.argv)
+def create_window(app: QApplication) -> MainWindow:
+    """Build the main window; python-fido2 is only loaded once it has painted."""
     font = app.font()
     font.setPointSize(10)
     app.setFont(font)
+    theme = ThemeManager(app)
+    # Before the window exists, so that it never paints in the wrong theme.
+    theme.apply_saved()
+    return MainWindow(None, theme, inventory=open_default_inventory())
 
-    try:
-        manager = Fido2Manager()
-        theme = ThemeManager(app)
-    except Exception:
-        dlg = QMessageBox()
-        dlg.setWindowTitle("Missing dependency")
-        dlg.setText(
-            "python-fido2 is required. Install with: pip install python-fido2")
-        dlg.setIcon(QMessageBox.Critical)
-        dlg.exec_()
-        sys.exit(1)
 
-    win = MainWindow(manager, theme)
+def main():
+    app = QApplication(sys.argv)
+    win = create_window(app)
     win.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dependencies.emulator import VirtualDeviceProvider  # noqa: E402
+from dependencies.hotplug import HotplugMonitor  # noqa: E402
+from dependencies.manager import Fido2Manager  # noqa: E402
+
+
+@pytest.fixture
+def provider():
+    return VirtualDeviceProvider(1)
+
+
+@pytest.fixture
+def manager(provider):
+    manager = Fido2Manager(provider=provider)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def monitor(provider):
+    monitor = HotplugMonitor(provider.event_source())
+    monitor.start()
+    assert monitor.wait_for_scan(5)
+    yield monitor
+    monitor.stop()
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+from fido2.ctap2 import Ctap2
+
+from dependencies.emulator import VirtualDeviceProvider
+from dependencies.manager import Fido2Manager
+
+PIN = "123456"
+RPS = ["a.example", "b.example", "c.example"]
+
+
+@pytest.fixture
+def provider():
+    return VirtualDeviceProvider(1, pin=PIN, credentials={rp: ["alice", "bob"] for rp in RPS})
+
+
+def test_enumeration_survives_token_expiry(provider):
+    manager = Fido2Manager(provider=provider, token_ttl=0.05)
+    try:
+        path = manager.discover()[0]["path"]
+        authenticator = provider.authenticators[path]
+
+        def run(m):
+            rps = []
+            for rp in m.iter_relying_parties(PIN):
+                rps.append(rp["id"])
+                if len(rps) == 1:
+                    pins = authenticator.calls.get(Ctap2.CMD.CLIENT_PIN, 0)
+                # Longer than the token lives.
+                time.sleep(0.1)
+            assert authenticator.calls.get(Ctap2.CMD.CLIENT_PIN, 0) == pins
+            return rps
+
+        assert sorted(manager.submit(path, run).result(5)) == RPS
+    finally:
+        manager.close()
+
+
+def test_credentials_are_enumerated_and_cached(provider, manager):
+    path = manager.discover()[0]["path"]
+    authenticator = provider.authenticators[path]
+
+    def run(m):
+        rp = next(r for r in m.iter_relying_parties(PIN) if r["id"] == "b.example")
+        return [c["user_name"] for c in m.iter_credentials(PIN, rp["rp_id_hash"])], rp["rp_id_hash"]
+
+    users, rp_id_hash = manager.submit(path, run).result(5)
+    assert sorted(users) == ["alice", "bob"]
+
+    calls = sum(authenticator.calls.values())
+    cached = manager.submit(path, lambda m: list(m.iter_credentials(PIN, rp_id_hash))).result(5)
+    assert len(cached) == 2
+    assert sum(authenticator.calls.values()) == calls
@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+from fido2.ctap import CtapError
+
+from dependencies.emulator import VirtualDeviceProvider
+
+PIN = "123456"
+
+
+@pytest.fixture
+def provider():
+    return VirtualDeviceProvider(1, pin=PIN)
+
+
+def _enroll(manager, path, event=None, on_sample=None):
+    return manager.submit(
+        path, lambda m: m.enroll_fingerprint(PIN, on_sample, event), event=event)
+
+
+def test_enrollment_adds_template(provider, manager):
+    path = manager.discover()[0]["path"]
+    remaining = []
+
+    template_id = _enroll(manager, path, on_sample=lambda status, left: remaining.append(left)).result(5)
+
+    assert provider.authenticators[path].templates == {template_id: ""}
+    assert remaining == [3, 2, 1, 0]
+
+
+@pytest.mark.parametrize("samples_before_cancel", [0, 2])
+def test_cancelled_capture_discards_unfinished_template(provider, manager, samples_before_cancel):
+    path = manager.discover()[0]["path"]
+    authenticator = provider.authenticators[path]
+    event = threading.Event()
+    samples = []
+
+    def on_sample(status, remaining):
+        samples.append(remaining)
+        if len(samples) == samples_before_cancel:
+            authenticator.touch_delay = 30
+            threading.Timer(0.05, event.set).start()
+    if not samples_before_cancel:
+        authenticator.touch_delay = 30
+        threading.Timer(0.05, event.set).start()
+
+    with pytest.raises(CtapError) as error:
+        _enroll(manager, path, event, on_sample).result(5)
+
+    assert error.value.code == CtapError.ERR.KEEPALIVE_CANCEL
+    assert len(samples) == samples_before_cancel
+    assert authenticator._enrollment is None
+    assert authenticator.templates == {}
+
+    authenticator.touch_delay = 0
+    assert _enroll(manager, path).result(5) in authenticator.templates
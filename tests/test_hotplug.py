@@ -0,0 +1,56 @@
+import queue
+import struct
+
+from dependencies.hotplug import (
+    FakeEventSource, HotplugMonitor, DEVICE_ADDED, DEVICE_REMOVED, parse_uevent,
+)
+
+
+def _events(monitor):
+    events = queue.Queue()
+    unsubscribe = monitor.subscribe(lambda e: events.put((e.kind, e.path)))
+    return events, unsubscribe
+
+
+def test_monitor_reports_present_devices_then_changes():
+    source = FakeEventSource(["a"])
+    monitor = HotplugMonitor(source)
+    events, _ = _events(monitor)
+    monitor.start()
+    try:
+        assert events.get(timeout=5) == (DEVICE_ADDED, "a")
+        source.plug("b")
+        assert events.get(timeout=5) == (DEVICE_ADDED, "b")
+        source.unplug("a")
+        assert events.get(timeout=5) == (DEVICE_REMOVED, "a")
+        assert monitor.present == {"b"}
+    finally:
+        monitor.stop()
+
+
+def test_unsubscribed_callback_gets_no_events():
+    source = FakeEventSource()
+    monitor = HotplugMonitor(source)
+    events, unsubscribe = _events(monitor)
+    others, _ = _events(monitor)
+    unsubscribe()
+    monitor.start()
+    try:
+        source.plug("a")
+        assert others.get(timeout=5) == (DEVICE_ADDED, "a")
+        assert events.empty()
+    finally:
+        monitor.stop()
+
+
+def test_parse_kernel_uevent():
+    data = b"add@/devices/hidraw/hidraw3\0ACTION=add\0SUBSYSTEM=hidraw\0DEVNAME=hidraw3\0"
+    assert parse_uevent(data) == {"ACTION": "add", "SUBSYSTEM": "hidraw", "DEVNAME": "hidraw3"}
+
+
+def test_parse_udev_uevent():
+    props = b"ACTION=remove\0SUBSYSTEM=hidraw\0"
+    header = b"libudev\0" + struct.pack("!I", 0xFEEDCAFE) + struct.pack("=III", 40, 40, len(props))
+    data = header.ljust(40, b"\0") + props
+    assert parse_uevent(data) == {"ACTION": "remove", "SUBSYSTEM": "hidraw"}
+    assert parse_uevent(data.replace(struct.pack("!I", 0xFEEDCAFE), b"\0\0\0\0")) == {}
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from dependencies.emulator import VirtualDeviceProvider
+from dependencies.pool import SessionPool
+
+
+@pytest.fixture
+def provider():
+    return VirtualDeviceProvider(3)
+
+
+def test_idle_sessions_are_evicted_after_ttl(provider):
+    pool = SessionPool(provider.open, idle_ttl=10)
+    a, b, _ = provider.list_descriptors()
+    pool.acquire(a)
+    pool.acquire(b)
+
+    assert pool.evict_idle() == []
+    assert sorted(pool.evict_idle(time.monotonic() + 11)) == sorted([a.path, b.path])
+    assert len(pool) == 0
+    assert pool.stats()["evicted_idle"] == 2
+
+
+def test_least_recently_used_session_goes_when_full(provider):
+    pool = SessionPool(provider.open, max_size=2)
+    a, b, c = provider.list_descriptors()
+    first = pool.acquire(a)
+    pool.acquire(b)
+    assert pool.acquire(a) is first
+
+    pool.acquire(c)
+
+    assert a.path in pool and c.path in pool and b.path not in pool
+    assert pool.stats()["evicted_lru"] == 1
+
+
+def test_broken_session_is_reopened(provider):
+    pool = SessionPool(provider.open, health_interval=None)
+    a = provider.list_descriptors()[0]
+    session = pool.acquire(a)
+    session.ctap
+    provider.unplug(a.path)
+    provider.plug(a.path)
+
+    with pytest.raises(OSError):
+        session.ctap.get_info()
+    assert session.broken
+
+    fresh = pool.acquire(a)
+    assert fresh is not session
+    assert fresh.ctap.get_info().versions
+    assert pool.stats()["reopened"] == 1
+
+
+def test_idle_session_that_fails_ping_is_reopened(provider):
+    pool = SessionPool(provider.open, health_interval=0)
+    a = provider.list_descriptors()[0]
+    session = pool.acquire(a)
+    assert pool.acquire(a) is session
+
+    provider.unplug(a.path)
+    provider.plug(a.path)
+
+    assert pool.acquire(a) is not session
+    stats = pool.stats()
+    assert (stats["health_checks"], stats["reopened"]) == (2, 1)
@@ -0,0 +1,105 @@
+import time
+
+from dependencies.reset_flow import (
+    ResetSession, ResetTarget, DONE, FAILED, RESETTING, WAITING_INSERTION, WAITING_REMOVAL,
+)
+
+
+def _arm(manager, monitor, timeout=5.0):
+    changes = []
+    session = ResetSession(manager, monitor, on_change=lambda t: changes.append((t.state, t.error)),
+                           timeout=timeout)
+    session.arm(manager.discover())
+    session.start()
+    return session, changes
+
+
+def test_replugged_key_is_reset(provider, manager, monitor):
+    path = next(iter(provider.authenticators))
+    provider.authenticators[path].templates[b"\1"] = "finger"
+    session, changes = _arm(manager, monitor)
+    assert session.targets[0].state == WAITING_REMOVAL
+
+    provider.unplug(path)
+    _wait_for(lambda: session.targets[0].state == WAITING_INSERTION)
+    provider.plug(path)
+
+    assert session.wait(5)
+    assert session.targets[0].state == DONE
+    assert not provider.authenticators[path].templates
+    assert [state for state, _ in changes][-1] == DONE
+
+
+def test_other_key_at_same_path_is_not_reset(provider, manager, monitor):
+    path = next(iter(provider.authenticators))
+    session, changes = _arm(manager, monitor, timeout=0.5)
+
+    provider.unplug(path)
+    _wait_for(lambda: session.targets[0].state == WAITING_INSERTION)
+    # The OS hands the freed node to another key before ours comes back.
+    provider.swap(path, templates={b"\1": "finger"})
+
+    assert session.wait(5)
+    target = session.targets[0]
+    assert target.state == FAILED
+    assert "not reconnected" in target.error
+    assert (WAITING_INSERTION, "Wrong device reconnected, waiting for the right one") in changes
+    assert provider.authenticators[path].templates == {b"\1": "finger"}
+
+
+def test_key_not_removed_times_out(provider, manager, monitor):
+    session, _ = _arm(manager, monitor, timeout=0.2)
+
+    assert session.wait(5)
+    assert session.targets[0].state == FAILED
+    assert "not disconnected" in session.targets[0].error
+
+
+def test_cancel_while_waiting(provider, manager, monitor):
+    path = next(iter(provider.authenticators))
+    session, _ = _arm(manager, monitor)
+    provider.unplug(path)
+    _wait_for(lambda: session.targets[0].state == WAITING_INSERTION)
+
+    session.cancel()
+
+    assert session.wait(1)
+    assert (session.targets[0].state, session.targets[0].error) == (FAILED, "Cancelled")
+
+
+def test_cancel_stops_reset_waiting_for_touch(provider, manager, monitor):
+    path = next(iter(provider.authenticators))
+    authenticator = provider.authenticators[path]
+    authenticator.touch_delay = 30
+    authenticator.templates[b"\1"] = "finger"
+    session, _ = _arm(manager, monitor)
+    provider.unplug(path)
+    _wait_for(lambda: session.targets[0].state == WAITING_INSERTION)
+    provider.plug(path)
+    _wait_for(lambda: session.targets[0].state == RESETTING)
+
+    session.cancel()
+
+    assert session.wait(5)
+    assert (session.targets[0].state, session.targets[0].error) == (FAILED, "Cancelled")
+    assert authenticator.templates == {b"\1": "finger"}
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+def test_serial_decides_over_path():
+    target = ResetTarget({"path": "hid0", "vendor_id": 1, "product_id": 2, "serial_number": "A"})
+    assert target.matches({"path": "hid3", "vendor_id": 1, "product_id": 2, "serial_number": "A"})
+    assert not target.matches({"path": "hid0", "vendor_id": 3, "product_id": 4, "serial_number": "B"})
+    assert not target.matches({"path": "hid0", "vendor_id": 1, "product_id": 2, "serial_number": "B"})
+
+
+def test_path_is_proof_only_without_serial():
+    target = ResetTarget({"path": "hid0", "vendor_id": 1, "product_id": 2})
+    assert target.matches({"path": "hid0", "vendor_id": 1, "product_id": 2, "serial_number": "A"})
+    assert not target.matches({"path": "hid3", "vendor_id": 1, "product_id": 2})
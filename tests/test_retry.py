@@ -0,0 +1,92 @@
+import pytest
+from fido2.ctap import CtapError
+from fido2.ctap2 import Ctap2
+
+from dependencies.manager import Fido2Manager
+from dependencies.retry import RetryPolicy, RetryStats
+
+ERR = CtapError.ERR
+
+
+def _failing(*errors):
+    """A callable that raises errors in turn, then returns "ok"; counts its calls."""
+    errors = list(errors)
+
+    def fn():
+        fn.calls += 1
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    fn.calls = 0
+    return fn
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(attempts=3, initial_delay=0, deadline=None)
+
+
+@pytest.mark.parametrize("error", [OSError("unplugged"), CtapError(ERR.TIMEOUT)])
+def test_idempotent_call_retries_transient_errors(policy, error):
+    stats = RetryStats()
+    fn = _failing(error)
+
+    assert policy.run(fn, "getInfo", stats) == "ok"
+    assert fn.calls == 2
+    assert stats.snapshot()["getInfo"] == {"calls": 1, "retries": 1, "recovered": 1, "failed": 0}
+
+
+def test_non_idempotent_call_retries_only_unprocessed_errors(policy):
+    fn = _failing(CtapError(ERR.CHANNEL_BUSY))
+    assert policy.run(fn, "setPin", idempotent=False) == "ok"
+    assert fn.calls == 2
+
+    # The key may have acted on a command whose answer was lost.
+    fn = _failing(OSError("unplugged"))
+    with pytest.raises(OSError):
+        policy.run(fn, "setPin", idempotent=False)
+    assert fn.calls == 1
+
+
+def test_fatal_errors_and_exhausted_attempts_are_raised(policy):
+    stats = RetryStats()
+    fn = _failing(CtapError(ERR.PIN_INVALID))
+    with pytest.raises(CtapError):
+        policy.run(fn, "getPinToken", stats)
+    assert fn.calls == 1
+
+    fn = _failing(*[CtapError(ERR.CHANNEL_BUSY)] * 3)
+    with pytest.raises(CtapError):
+        policy.run(fn, "getInfo", stats)
+    assert fn.calls == 3
+    assert stats.snapshot()["getInfo"]["failed"] == 1
+
+
+def test_manager_retries_reset_refused_by_busy_key(provider, policy):
+    manager = Fido2Manager(provider=provider, retry_policy=policy)
+    try:
+        path = manager.discover()[0]["path"]
+        authenticator = provider.authenticators[path]
+        authenticator.templates[b"\1"] = "finger"
+        authenticator.inject_failure(ERR.CHANNEL_BUSY, Ctap2.CMD.RESET)
+
+        manager.submit(path, lambda m: m.reset()).result(5)
+
+        assert not authenticator.templates
+        assert manager.retry_stats.snapshot()["reset"]["recovered"] == 1
+    finally:
+        manager.close()
+
+
+def test_manager_does_not_retry_failed_reset(provider, policy):
+    manager = Fido2Manager(provider=provider, retry_policy=policy)
+    try:
+        path = manager.discover()[0]["path"]
+        authenticator = provider.authenticators[path]
+        authenticator.inject_failure(ERR.OTHER, Ctap2.CMD.RESET)
+
+        with pytest.raises(CtapError):
+            manager.submit(path, lambda m: m.reset()).result(5)
+        assert authenticator.calls[Ctap2.CMD.RESET] == 1
+    finally:
+        manager.close()
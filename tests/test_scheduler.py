@@ -0,0 +1,73 @@
+import threading
+
+from dependencies.scheduler import (
+    PRIORITY_CANCEL, PRIORITY_COMMAND, PRIORITY_INFO, PRIORITY_PRESENCE,
+)
+
+
+def _block(manager, path):
+    """Occupy the queue of path until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def run(m):
+        started.set()
+        release.wait(5)
+    future = manager.submit(path, run, PRIORITY_COMMAND, event=release)
+    assert started.wait(5)
+    return release, future
+
+
+def test_commands_run_by_priority_then_submission_order(provider, manager):
+    path = manager.discover()[0]["path"]
+    order = []
+    release, _ = _block(manager, path)
+    futures = [manager.submit(path, lambda m, name=name: order.append(name), priority)
+               for name, priority in [("presence", PRIORITY_PRESENCE), ("command 1", PRIORITY_COMMAND),
+                                      ("info", PRIORITY_INFO), ("command 2", PRIORITY_COMMAND),
+                                      ("cancel", PRIORITY_CANCEL)]]
+    release.set()
+
+    for future in futures:
+        future.result(5)
+    assert order == ["cancel", "info", "command 1", "command 2", "presence"]
+
+
+def test_cancel_interrupts_drops_presence_and_queues_cleanup_first(provider, manager):
+    path = manager.discover()[0]["path"]
+    order = []
+    release, running = _block(manager, path)
+    presence = manager.submit(path, lambda m: order.append("presence"), PRIORITY_PRESENCE)
+    command = manager.submit(path, lambda m: order.append("command"), PRIORITY_COMMAND)
+
+    dropped = manager.scheduler.cancel(path, cleanup=lambda m: order.append("cleanup"))
+
+    assert dropped == 1
+    assert release.is_set()
+    running.result(5)
+    command.result(5)
+    assert presence.cancelled()
+    assert order == ["cleanup", "command"]
+
+
+def test_cancel_of_idle_key_queues_no_cleanup(provider, manager):
+    path = manager.discover()[0]["path"]
+    cleaned = []
+
+    assert manager.scheduler.cancel(path, cleanup=cleaned.append) == 0
+    manager.submit(path, lambda m: None).result(5)
+    assert cleaned == []
+
+
+def test_coalesced_requests_share_one_round_trip(provider, manager):
+    path = manager.discover()[0]["path"]
+    authenticator = provider.authenticators[path]
+    manager.submit(path, lambda m: m.get_info()).result(5)
+    release, _ = _block(manager, path)
+    before = sum(authenticator.calls.values())
+
+    futures = [manager.request_info(path, refresh=True) for _ in range(10)]
+    release.set()
+
+    assert len(set(futures)) == 1
+    assert futures[0].result(5)["versions"]
+    assert sum(authenticator.calls.values()) == before + 1